@@ -0,0 +1,246 @@
+"""
+Read-only JSON endpoints for bookings, booking status timelines, vehicles
+and service history, and the change feed that keeps a client's copy of
+them current (vehicle.changes).
+
+The collection endpoints answer conditional GETs. Before the view runs, one
+aggregate over the caller's rows (row count and newest ``updated_at`` /
+``updated_on`` of the rows and of every row whose fields they include:
+vehicle, customer, service center) gives a strong ETag; when the client
+already has that version Django's ``condition`` decorator returns 304 and
+nothing is fetched or serialized. There is no Last-Modified: the newest
+stamp doesn't move when a row is deleted, archived or leaves the scope,
+and an HTTP date can't tell two edits within a second apart. The count in
+the ETag catches the first, the full stamps the second.
+"""
+import hashlib
+from functools import wraps
+
+from django.db.models import Count, Max
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.http import condition, require_GET
+
+from . import changes, plates, scheduling
+from .models import ServiceBooking, ServiceCenter, ServiceHistory, ServiceStatus, Vehicle
+from .pagination import keyset_paginate
+from .roles import CUSTOMER, ROLES, SERVICE_CENTER
+from .views import BOOKING_KEYS, HISTORY_KEYS, VEHICLE_KEYS
+
+BOOKING_FIELDS = (
+    'id', 'booking_date', 'scheduled_date', 'status', 'description', 'updated_at',
+    'vehicle_id', 'vehicle__vehicle_number', 'customer__name', 'service_center__name',
+)
+STATUS_FIELDS = ('id', 'current_status', 'remarks', 'updated_on')
+VEHICLE_FIELDS = ('id', 'vehicle_number', 'model', 'manufacturer', 'year', 'fuel_type', 'updated_at')
+HISTORY_FIELDS = (
+    'id', 'service_date', 'details', 'cost', 'booking_id', 'updated_at',
+    'vehicle_id', 'vehicle__vehicle_number',
+)
+# the change stamps of every row each payload takes fields from
+BOOKING_STAMPS = ('updated_at', 'vehicle__updated_at', 'customer__updated_at', 'service_center__updated_at')
+HISTORY_STAMPS = ('updated_at', 'vehicle__updated_at')
+
+
+def api_login_required(view_func):
+    @wraps(view_func)
+    def _wrapped(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return JsonResponse({"error": "Authentication required."}, status=401)
+        return view_func(request, *args, **kwargs)
+    return _wrapped
+
+
+# ---------------------------
+# Scopes: the rows each endpoint may return for the current user
+# (None when the user has no access at all).
+# ---------------------------
+def booking_scope(request):
+    if request.role == CUSTOMER:
+        return ServiceBooking.objects.filter(customer=request.profile)
+    if request.role == SERVICE_CENTER:
+        return ServiceBooking.objects.filter(service_center=request.profile)
+    return None
+
+
+def status_scope(request, pk):
+    """
+    The booking's statuses; None when the user can't see the booking, so a
+    404 or 403 never gets an ETag and can't be turned into a 304. Checked
+    once per request: the ETag and the view both ask.
+    """
+    if not hasattr(request, '_status_scope'):
+        bookings = booking_scope(request)
+        visible = bookings is not None and bookings.filter(pk=pk).exists()
+        request._status_scope = ServiceStatus.objects.filter(booking_id=pk) if visible else None
+    return request._status_scope
+
+
+def vehicle_scope(request):
+    if request.role == CUSTOMER:
+        return Vehicle.objects.filter(customer=request.profile)
+    return None
+
+
+def history_scope(request):
+    if request.role == CUSTOMER:
+        return ServiceHistory.objects.filter(customer=request.profile)
+    return None
+
+
+def conditional(scope, *stamp_fields):
+    """
+    Wrap a view with ETag handling derived from one aggregate
+    over ``scope(request, ...)``: the row count and the newest value of each
+    of ``stamp_fields``. The query string is part of the ETag so each page
+    of a collection validates separately.
+    """
+    def state(request, *args, **kwargs):
+        if not hasattr(request, '_api_state'):
+            queryset = scope(request, *args, **kwargs)
+            request._api_state = None if queryset is None else queryset.aggregate(
+                count=Count('pk'), **{f'last_{i}': Max(field) for i, field in enumerate(stamp_fields)},
+            )
+        return request._api_state
+
+    def etag(request, *args, **kwargs):
+        current = state(request, *args, **kwargs)
+        if current is None:
+            return None
+        raw = '|'.join([request.get_full_path(), *(str(value) for value in current.values())])
+        return hashlib.sha1(raw.encode()).hexdigest()
+
+    return condition(etag_func=etag)
+
+
+def _forbidden():
+    return JsonResponse({"error": "Access denied."}, status=403)
+
+
+def _page(request, queryset, keys, fields, descending=True):
+    page = keyset_paginate(request, queryset.values(*fields), keys, descending=descending)
+    return JsonResponse({
+        "results": list(page),
+        "next": page.next_cursor,
+        "previous": page.previous_cursor,
+    })
+
+
+# ---------------------------
+# Endpoints
+# ---------------------------
+@require_GET
+@api_login_required
+@conditional(booking_scope, *BOOKING_STAMPS)
+def bookings(request):
+    queryset = booking_scope(request)
+    if queryset is None:
+        return _forbidden()
+    return _page(request, queryset, BOOKING_KEYS, BOOKING_FIELDS)
+
+
+@require_GET
+@api_login_required
+@conditional(status_scope, 'updated_on')
+def booking_statuses(request, pk):
+    if booking_scope(request) is None:
+        return _forbidden()
+    scope = status_scope(request, pk)
+    if scope is None:
+        return JsonResponse({"error": "Not found."}, status=404)
+    statuses = scope.order_by('updated_on', 'id').values(*STATUS_FIELDS)
+    return JsonResponse({"booking": pk, "results": list(statuses)})
+
+
+@require_GET
+@api_login_required
+@conditional(vehicle_scope, 'updated_at')
+def vehicles(request):
+    queryset = vehicle_scope(request)
+    if queryset is None:
+        return _forbidden()
+    return _page(request, queryset, VEHICLE_KEYS, VEHICLE_FIELDS, descending=False)
+
+
+@require_GET
+@api_login_required
+@conditional(history_scope, *HISTORY_STAMPS)
+def history(request):
+    queryset = history_scope(request)
+    if queryset is None:
+        return _forbidden()
+    return _page(request, queryset, HISTORY_KEYS, HISTORY_FIELDS)
+
+
+@require_GET
+@api_login_required
+def available_dates(request, pk):
+    """The next ``?count=`` days (default 5, at most 60) with a free slot, read from the slot index."""
+    center = get_object_or_404(ServiceCenter.objects.only('id', 'name', 'daily_capacity'), pk=pk)
+    try:
+        count = max(1, min(int(request.GET.get('count', 5)), 60))
+    except ValueError:
+        count = 5
+    days = scheduling.available_dates(center, count)
+    return JsonResponse({"service_center": pk, "results": [d.isoformat() for d in days]})
+
+
+@require_GET
+@api_login_required
+def plate_autocomplete(request):
+    """
+    ``?q=`` partial plate in any spacing or case; top ``?limit=`` (default
+    10, at most 25) matches in plate order with their open bookings.
+    """
+    try:
+        limit = max(1, min(int(request.GET.get('limit', 10)), plates.MAX_MATCHES))
+    except ValueError:
+        limit = 10
+    if request.role == CUSTOMER:
+        scope = {'customer': request.profile}
+    elif request.role == SERVICE_CENTER:
+        scope = {'service_center': request.profile}
+    else:
+        return _forbidden()
+    vehicles = plates.matching_vehicles(request.GET.get('q', ''), limit=limit, **scope)
+    return JsonResponse({"results": [
+        {
+            "id": v.id,
+            "vehicle_number": v.vehicle_number,
+            "model": v.model,
+            "manufacturer": v.manufacturer,
+            "open_bookings": [
+                {"id": b.id, "scheduled_date": b.scheduled_date, "status": b.status,
+                 "service_center": b.service_center.name}
+                for b in v.open_bookings
+            ],
+        }
+        for v in vehicles
+    ]})
+
+
+@require_GET
+@api_login_required
+def change_feed(request):
+    """
+    The caller's changes after ``?after=`` (a cursor from an earlier
+    response, 0 for everything), oldest first, at most ``?limit=``
+    (default 100, at most 500) per response. Keep requesting with the
+    returned cursor while ``has_more`` is true.
+    """
+    if request.role not in ROLES:
+        return _forbidden()
+    try:
+        after = max(0, int(request.GET.get('after', 0)))
+        limit = max(1, min(int(request.GET.get('limit', changes.DEFAULT_LIMIT)), changes.MAX_LIMIT))
+    except ValueError:
+        return JsonResponse({"error": "after and limit must be integers."}, status=400)
+    entries, has_more = changes.feed(changes.owner_token(request.role, request.profile.id), after, limit)
+    return JsonResponse({
+        "results": [
+            {"cursor": e.id, "kind": e.kind, "id": e.object_id, "action": e.action, "at": e.created_at, "data": e.data}
+            for e in entries
+        ],
+        "cursor": entries[-1].id if entries else after,
+        "has_more": has_more,
+    })
@@ -0,0 +1,106 @@
+"""
+Cold storage for closed bookings.
+
+ServiceBooking and the rows hanging off it (statuses, job assignments, the
+invoice, service history) only ever grow, and the dashboards and lists
+scan them. ``manage.py archive_bookings`` moves bookings that were closed
+(Completed / Cancelled) and last changed more than ``ARCHIVE_AFTER_DAYS``
+ago, with all of those rows, into the Archived* tables, keeping their ids.
+A booking whose invoice is still unpaid stays: it is open work for the
+center. The hot tables therefore hold the active work plus the recent past.
+
+Bookings move in batches of ``batch_size``, one short transaction per
+batch (copy, then delete), so other writers wait for one batch at most.
+The dashboard counters and the daily rollups count archived rows too, so
+archiving changes neither; the full-text search covers the hot tables only.
+``view_history`` and the exports read the archive instead when asked to
+(``?archived=1``).
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .counters import CLOSED_STATUSES
+from .models import (
+    ArchivedAssignment, ArchivedBooking, ArchivedHistory, ArchivedInvoice, ArchivedStatus, Invoice, JobAssignment,
+    ServiceBooking, ServiceHistory, ServiceStatus,
+)
+
+# hot model -> archive model, parents first; the archive has the same columns
+ARCHIVED = {
+    ServiceBooking: ArchivedBooking,
+    ServiceStatus: ArchivedStatus,
+    JobAssignment: ArchivedAssignment,
+    Invoice: ArchivedInvoice,
+    ServiceHistory: ArchivedHistory,
+}
+DEFAULT_DAYS = 365
+BATCH_SIZE = 500
+
+
+def retention_days():
+    return getattr(settings, 'ARCHIVE_AFTER_DAYS', DEFAULT_DAYS)
+
+
+def archivable(before):
+    """Bookings closed and untouched since before ``before``, without an unpaid invoice."""
+    return (
+        ServiceBooking.objects.filter(status__in=CLOSED_STATUSES, updated_at__lt=before)
+        .exclude(invoice__payment_status='Unpaid')
+    )
+
+
+def _rows(model, booking_ids):
+    key = 'id__in' if model is ServiceBooking else 'booking_id__in'
+    return model.objects.filter(**{key: booking_ids})
+
+
+def _copy(model, booking_ids, **extra):
+    target = ARCHIVED[model]
+    fields = [field.attname for field in model._meta.concrete_fields]
+    rows = _rows(model, booking_ids).values(*fields)
+    return len(target.objects.bulk_create(target(**row, **extra) for row in rows))
+
+
+def archive_batch(booking_ids, before):
+    """
+    Move the given bookings, if they are still archivable, and their rows;
+    returns {label: rows moved}.
+    """
+    with transaction.atomic():
+        # re-check inside the transaction and lock what passes: a booking may have been reopened
+        # meanwhile, and must not be reopened between the check and the delete (on SQLite the
+        # transaction holds the database write lock instead, see settings.DATABASES)
+        ids = list(
+            archivable(before).select_for_update(of=('self',)).filter(id__in=booking_ids)
+            .order_by('id').values_list('id', flat=True)
+        )
+        if not ids:
+            return {}
+        moved = {ArchivedBooking._meta.label: _copy(ServiceBooking, ids, archived_at=timezone.now())}
+        for model in list(ARCHIVED)[1:]:
+            moved[ARCHIVED[model]._meta.label] = _copy(model, ids)
+        for model in reversed(ARCHIVED):
+            # a booking's delete signal drops its owners' cached dashboard fragments
+            _rows(model, ids).delete()
+    return moved
+
+
+def archive(days=None, batch_size=BATCH_SIZE, progress=None):
+    """Archive everything that is due; returns {label: rows moved}."""
+    before = timezone.now() - timedelta(days=retention_days() if days is None else days)
+    totals = {}
+    last_id = 0
+    while True:
+        ids = list(
+            archivable(before).filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            return totals
+        for label, n in archive_batch(ids, before).items():
+            totals[label] = totals.get(label, 0) + n
+        last_id = ids[-1]
+        if progress:
+            progress(totals)
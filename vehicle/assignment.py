@@ -0,0 +1,88 @@
+"""
+Automatic job assignment.
+
+Each staff member's open workload (assignments on bookings that are not
+completed or cancelled) comes from one aggregate query. Unassigned pending
+bookings are then handed out in booking order to the least-loaded staff
+member, preferring workshop roles, by popping a heap in memory, and the
+assignments are written with ``bulk_create`` (and logged for the change
+feed, vehicle.changes, with another). However many bookings are
+assigned, the query count stays fixed (apart from the insert batches the
+database backend's parameter limit imposes).
+"""
+import heapq
+
+from django.db import transaction
+from django.db.models import Count, Exists, OuterRef, Q
+
+from . import changes, counters
+from .models import JobAssignment, ServiceBooking, Staff
+
+# staff whose role mentions one of these get work before everyone else
+WORKSHOP_ROLES = ('mechanic', 'technician', 'electrician', 'painter', 'washer')
+AUTO_NOTE = "Auto-assigned"
+
+
+def role_rank(role):
+    role = (role or '').lower()
+    return 0 if any(word in role for word in WORKSHOP_ROLES) else 1
+
+
+def staff_workloads(service_center):
+    """The center's staff, each annotated with ``open_jobs``, in one query."""
+    return list(
+        Staff.objects.filter(service_center=service_center)
+        .annotate(open_jobs=Count(
+            'jobassignment',
+            filter=~Q(jobassignment__booking__status__in=counters.CLOSED_STATUSES),
+        ))
+        .only('id', 'name', 'role')
+        .order_by('id')
+    )
+
+
+def plan(bookings, staff):
+    """
+    Pair each booking with a staff member: lowest role rank first, then
+    fewest open jobs, then lowest id. Returns [(booking, staff), ...].
+    """
+    heap = [(role_rank(s.role), s.open_jobs, s.id, s) for s in staff]
+    heapq.heapify(heap)
+    pairs = []
+    for booking in bookings:
+        rank, load, staff_id, member = heap[0]
+        pairs.append((booking, member))
+        heapq.heapreplace(heap, (rank, load + 1, staff_id, member))
+    return pairs
+
+
+def auto_assign(service_center, booking_ids=None):
+    """
+    Assign every unassigned Pending booking of ``service_center`` (or only
+    those in ``booking_ids``) in one transaction. Returns the new
+    JobAssignment objects; empty when there is nothing to do or no staff.
+    """
+    with transaction.atomic():
+        bookings = (
+            ServiceBooking.objects.select_for_update()
+            .filter(service_center=service_center, status='Pending')
+            .exclude(Exists(JobAssignment.objects.filter(booking=OuterRef('pk'))))
+            .only('id', 'customer_id', 'service_center_id')
+            .order_by('scheduled_date', 'id')
+        )
+        if booking_ids is not None:
+            bookings = bookings.filter(id__in=booking_ids)
+        bookings = list(bookings)
+        if not bookings:
+            return []
+        staff = staff_workloads(service_center)
+        if not staff:
+            return []
+        counters.ensure_rows([service_center.id])
+
+        jobs = JobAssignment.objects.bulk_create(
+            JobAssignment(booking=booking, staff=member, notes=AUTO_NOTE) for booking, member in plan(bookings, staff)
+        )
+        counters.apply_deltas(service_center.id, open_assignments=len(jobs))
+        changes.record_many(jobs, changes.CREATED)
+    return jobs
@@ -0,0 +1,21 @@
+"""
+The vehicle routes with the read-heavy views swapped for their async
+versions. Used for ASGI requests via vehicle_service.asgi_urls.
+"""
+from django.urls import URLPattern, path
+
+from . import async_views, urls
+
+ASYNC_VIEWS = {
+    'customer_dashboard': async_views.customer_dashboard,
+    'servicecenter_dashboard': async_views.servicecenter_dashboard,
+    'view_vehicle': async_views.view_vehicle,
+    'view_bookings': async_views.view_bookings,
+    'view_history': async_views.view_history,
+}
+
+urlpatterns = [
+    path(str(p.pattern), ASYNC_VIEWS.get(p.name, p.callback), name=p.name)
+    if isinstance(p, URLPattern) else p
+    for p in urls.urlpatterns
+]
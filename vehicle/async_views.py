@@ -0,0 +1,142 @@
+"""
+Async versions of the read-heavy views, served when the project runs under
+ASGI (see vehicle.middleware.asgi_urlconf). They use the async ORM, which
+runs every query in the single thread-sensitive executor, so the queries of
+one request are awaited one after another; the gain is that the event loop
+serves other requests while they run. The sync views in vehicle.views remain
+the WSGI path. Both render the same templates and cache fragments under the
+same keys.
+"""
+from asgiref.sync import sync_to_async
+from django.contrib import messages
+from django.contrib.auth.decorators import login_required
+from django.shortcuts import redirect, render
+from django.template.loader import render_to_string
+
+from . import counters
+from .dashboard_cache import DashboardFragments
+from .models import DashboardCounter, Staff
+from .pagination import akeyset_paginate
+from .roles import CUSTOMER, SERVICE_CENTER
+from .views import (
+    BOOKING_KEYS, HISTORY_KEYS, VEHICLE_KEYS,
+    booking_rows, history_rows, vehicle_rows, wants_archive,
+)
+
+
+def _profiles(request):
+    """The user's (customer, service center) profiles, set by the user_role middleware; at most one is not None."""
+    return (
+        request.profile if request.role == CUSTOMER else None,
+        request.profile if request.role == SERVICE_CENTER else None,
+    )
+
+
+def _customer(request):
+    return _profiles(request)[0]
+
+
+def _service_center(request):
+    return _profiles(request)[1]
+
+
+async def _fragment(fragments, name, template, load, vary_on=''):
+    """Return a cached fragment, or run ``load()`` and render ``template`` with its context."""
+    html = await fragments.alookup(name, vary_on)
+    if html is None:
+        html = await fragments.astore(name, render_to_string(template, await load()), vary_on)
+    return html
+
+
+async def _counters(service_center):
+    counter = await DashboardCounter.objects.filter(service_center=service_center).afirst()
+    return counter or await sync_to_async(counters.counters_for)(service_center)
+
+
+# ------------------------------------------------------------
+# DASHBOARDS
+# ------------------------------------------------------------
+@login_required
+async def customer_dashboard(request):
+    customer = _customer(request)
+    if customer is None:
+        messages.error(request, "Access denied.")
+        return redirect("home")
+
+    fragments = await DashboardFragments.acreate("customer", customer.id)
+
+    async def bookings():
+        return {"bookings": await akeyset_paginate(request, booking_rows(customer=customer), BOOKING_KEYS)}
+
+    async def vehicles():
+        return {"vehicles": [v async for v in vehicle_rows(customer=customer)]}
+
+    booking_table = await _fragment(
+        fragments, "bookings", "customer_booking_table.html", bookings, request.GET.urlencode())
+    vehicle_table = await _fragment(fragments, "vehicles", "vehicle_table.html", vehicles)
+    context = {"customer": customer, "booking_table": booking_table, "vehicle_table": vehicle_table}
+    return render(request, "customer_dashboard.html", context)
+
+
+@login_required
+async def servicecenter_dashboard(request):
+    service_center = _service_center(request)
+    if service_center is None:
+        messages.error(request, "Access denied.")
+        return redirect("login")
+
+    fragments = await DashboardFragments.acreate("servicecenter", service_center.id)
+
+    async def bookings():
+        return {"bookings": await akeyset_paginate(request, booking_rows(service_center=service_center), BOOKING_KEYS)}
+
+    async def staff():
+        return {"staff": [s async for s in Staff.objects.filter(service_center=service_center)]}
+
+    booking_table = await _fragment(
+        fragments, "bookings", "servicecenter_booking_table.html", bookings, request.GET.urlencode())
+    staff_table = await _fragment(fragments, "staff", "staff_table.html", staff)
+    center_counters = await _counters(service_center)
+    context = {
+        "service_center": service_center,
+        "booking_table": booking_table,
+        "staff_table": staff_table,
+        "counters": center_counters,
+    }
+    return render(request, "servicecenter_dashboard.html", context)
+
+
+# ------------------------------------------------------------
+# LISTS
+# ------------------------------------------------------------
+@login_required
+async def view_vehicle(request):
+    customer = _customer(request)
+    if customer is None:
+        messages.error(request, "Access denied.")
+        return redirect('home')
+    vehicles = await akeyset_paginate(request, vehicle_rows(customer=customer), VEHICLE_KEYS, descending=False)
+    return render(request, "vehicle_list.html", {"vehicles": vehicles})
+
+
+@login_required
+async def view_bookings(request):
+    customer, service_center = _profiles(request)
+    if customer is not None:
+        bookings = await akeyset_paginate(request, booking_rows(customer=customer), BOOKING_KEYS)
+    elif service_center is not None:
+        bookings = await akeyset_paginate(request, booking_rows(service_center=service_center), BOOKING_KEYS)
+    else:
+        bookings = []
+    return render(request, "booking_list.html", {"bookings": bookings})
+
+
+@login_required
+async def view_history(request):
+    customer = _customer(request)
+    if customer is None:
+        messages.error(request, "Access denied.")
+        return redirect("home")
+    archived = wants_archive(request)
+    histories = await akeyset_paginate(request, history_rows(archived, customer=customer), HISTORY_KEYS)
+    return render(request, "history_list.html", {"histories": histories, "archived": archived})
@@ -0,0 +1,349 @@
+"""
+End-to-end route benchmarks.
+
+``manage.py bench_routes`` seeds a throwaway database at a chosen scale,
+requests every named route in vehicle/urls.py through the test client as
+the users it serves, and records per route and user:
+
+- p50 / p95 latency over the timed requests (after one warm-up request);
+- the number of queries one request makes, on every database alias;
+- the peak memory Python allocates while handling one request (tracemalloc).
+
+Results are plain JSON. ``compare`` checks them against a stored baseline.
+Query counts and status codes are the strict gate: any extra query is a
+regression. Latency is timed on whatever machine runs the command, so every
+run also times a fixed pure-Python workload (``calibrate``) and the
+baseline's latencies are scaled by how much slower that workload ran before
+comparing; a route then only fails past a relative threshold *and* an
+absolute noise floor, and only if it does so again when measured a second
+time. Memory is compared the same way, unscaled.
+
+``--update-baseline --route NAME`` re-records just the named routes and
+merges them into the stored baseline (rescaled to its calibration), so a
+change re-records the routes it touched and nothing else.
+"""
+import gc
+import itertools
+import os
+import platform
+import statistics
+import tempfile
+import time
+import tracemalloc
+from collections import namedtuple
+from decimal import Decimal
+from contextlib import ExitStack, contextmanager
+
+import django
+from django.db import connection, connections
+from django.test import Client
+from django.test.utils import (
+    CaptureQueriesContext, override_settings, setup_test_environment, teardown_test_environment,
+)
+from django.urls import reverse
+
+from . import db_router, synthetic
+from .models import Invoice, ServiceBooking, Vehicle
+
+# bookings are per vehicle, vehicles per customer
+SCALES = {
+    'tiny': {'centers': 1, 'customers': 3, 'vehicles': 1, 'bookings': 2},
+    'small': {'centers': 3, 'customers': 50, 'vehicles': 2, 'bookings': 3},
+    'medium': {'centers': 10, 'customers': 500, 'vehicles': 2, 'bookings': 5},
+    'large': {'centers': 25, 'customers': 5000, 'vehicles': 2, 'bookings': 5},
+}
+# days of booking history in the dataset
+DAYS = 180
+THRESHOLD = 0.25
+# latency below this many milliseconds over the (calibrated) baseline is noise
+NOISE_MS = 5.0
+NOISE_KIB = 64
+
+CUSTOMER, CENTER = 'customer', 'center'
+BOTH = (CUSTOMER, CENTER)
+ANONYMOUS = (None,)
+
+Route = namedtuple('Route', 'name kwargs who method params', defaults=(None, BOTH, 'get', None))
+
+# Every named route in vehicle/urls.py must appear here. ``kwargs`` (and
+# ``params``, when callable) is called before every request, so
+# delete_vehicle gets a fresh vehicle each time; routes in LOGS_OUT are
+# logged back into before every request.
+ROUTES = [
+    Route('home', who=ANONYMOUS),
+    Route('register_customer', who=ANONYMOUS),
+    Route('register_servicecenter', who=ANONYMOUS),
+    Route('login', who=ANONYMOUS),
+    Route('logout'),
+    Route('customer_dashboard', who=(CUSTOMER,)),
+    Route('servicecenter_dashboard', who=(CENTER,)),
+    Route('dashboard_cache_stats', who=ANONYMOUS),
+    Route('view_vehicle', who=(CUSTOMER,)),
+    Route('add_vehicle', who=(CUSTOMER,)),
+    Route('edit_vehicle', lambda d: {'pk': d.vehicle.pk}, who=(CUSTOMER,)),
+    Route('delete_vehicle', lambda d: {'pk': d.spare_vehicle().pk}, who=(CUSTOMER,)),
+    Route('booking_service', who=(CUSTOMER,)),
+    Route('view_bookings'),
+    Route('booking_detail', lambda d: {'pk': d.booking.pk}),
+    Route('booking_details', params=lambda d: {'ids': ','.join(str(pk) for pk in d.detail_ids)}),
+    Route('add_staff', who=(CENTER,)),
+    Route('assign_job', lambda d: {'booking_id': d.booking.pk}, who=(CENTER,)),
+    Route('auto_assign', lambda d: {'booking_id': d.booking.pk}, who=(CENTER,), method='post'),
+    Route('auto_assign_pending', who=(CENTER,), method='post'),
+    Route('update_booking_status', lambda d: {'pk': d.booking.pk}, who=(CENTER,)),
+    Route('bulk_update_status', who=(CENTER,)),
+    Route('generate_invoice', lambda d: {'booking_id': d.booking.pk}, who=(CENTER,)),
+    Route('send_reminders', who=(CENTER,)),
+    Route('revenue_report', who=(CENTER,)),
+    Route('view_history', who=(CUSTOMER,)),
+    Route('record_history', who=(CUSTOMER,)),
+    Route('record_history_booking', lambda d: {'booking_id': d.booking.pk}, who=(CUSTOMER,)),
+    Route('export_history', who=(CUSTOMER,)),
+    Route('export_invoices', who=(CENTER,)),
+    Route('invoice_document', lambda d: {'pk': d.invoice.pk}, who=(CENTER,), params={'format': 'pdf'}),
+    Route('search_records', params={'q': 'service'}),
+    Route('api_bookings'),
+    Route('api_booking_statuses', lambda d: {'pk': d.booking.pk}),
+    Route('api_vehicles', who=(CUSTOMER,)),
+    Route('api_plate_autocomplete', params={'q': 'KA0'}),
+    Route('api_history', who=(CUSTOMER,)),
+    Route('api_available_dates', lambda d: {'pk': d.center.pk}, who=(CUSTOMER,)),
+    Route('api_changes'),
+]
+LOGS_OUT = {'logout'}
+
+
+class Dataset:
+    """The seeded rows the routes are requested for: one center, one of its customers and one of its invoices."""
+
+    def __init__(self, scale, seed, center, booking, invoice):
+        self.scale = scale
+        self.seed = seed
+        self.center = center
+        self.booking = booking
+        self.invoice = invoice
+        self.customer = booking.customer
+        self.vehicle = booking.vehicle
+        self.users = {CUSTOMER: self.customer.user, CENTER: center.user}
+        # bookings of this center and customer for booking_details
+        self.detail_ids = list(
+            ServiceBooking.objects.filter(service_center=center, customer=self.customer).order_by('id')
+            .values_list('id', flat=True)[:10]
+        )
+        self._spares = itertools.count()
+
+    def spare_vehicle(self):
+        number = f'SPARE{next(self._spares):06d}'
+        return Vehicle.objects.create(
+            customer=self.customer, vehicle_number=number, model='Swift', manufacturer='Maruti',
+            year=2020, fuel_type='Petrol',
+        )
+
+
+def seed(centers, customers, vehicles, bookings, seed=0):
+    """
+    Generate the dataset with vehicle.synthetic (the same ``seed`` gives the
+    same data) and return the Dataset the routes are requested for: the
+    first center, one of its bookings, open if it has any, and one of its
+    invoices (added if the data has none).
+    """
+    plan = synthetic.Plan(centers, customers, vehicles, bookings, seed=seed, days=DAYS)
+    synthetic.generate(plan)
+    booking = (
+        ServiceBooking.objects.filter(service_center_id=plan.center_ids[0])
+        .select_related('service_center__user', 'customer__user', 'vehicle').order_by('-status', 'id').first()
+    )
+    invoice = Invoice.objects.filter(service_center_id=plan.center_ids[0]).order_by('id').first()
+    if invoice is None:
+        invoice = Invoice.objects.create(
+            booking=booking, service_center=booking.service_center, total_amount=Decimal('1500.00'),
+            payment_status='Paid',
+        )
+    scale = {'centers': centers, 'customers': customers, 'vehicles': vehicles, 'bookings': bookings}
+    return Dataset(scale, seed, booking.service_center, booking, invoice)
+
+
+@contextmanager
+def throwaway_database():
+    """
+    A freshly migrated test database in a temporary file for the duration
+    of the block, with rendered invoice documents kept next to it.
+    """
+    setup_test_environment()
+    # a file rather than shared-cache memory, so connections from other threads don't lock each other
+    workdir = tempfile.TemporaryDirectory()
+    documents = override_settings(INVOICE_DOCUMENT_DIR=os.path.join(workdir.name, 'invoice_documents'))
+    documents.enable()
+    old_name, old_test_name = connection.settings_dict['NAME'], connection.settings_dict['TEST'].get('NAME')
+    connection.settings_dict['TEST']['NAME'] = os.path.join(workdir.name, 'bench.sqlite3')
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    # alias -> NAME before it was pointed at this database
+    redirected = {}
+    if db_router.replica_alias():
+        # GET requests read through the replica alias; serve those from this database too
+        replica = connections[db_router.replica_alias()]
+        redirected[replica.alias] = replica.settings_dict['NAME']
+        replica.close()
+        replica.settings_dict['NAME'] = connection.settings_dict['NAME']
+    try:
+        yield
+    finally:
+        connections.close_all()
+        for alias, name in redirected.items():
+            connections[alias].settings_dict['NAME'] = name
+        # puts the default alias back on ``old_name``
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        connection.settings_dict['TEST']['NAME'] = old_test_name
+        documents.disable()
+        teardown_test_environment()
+        workdir.cleanup()
+
+
+def percentile(latencies, fraction):
+    ordered = sorted(latencies)
+    return ordered[max(0, int(len(ordered) * fraction + 0.5) - 1)]
+
+
+def _request(client, route, url, params):
+    started = time.perf_counter()
+    response = getattr(client, route.method)(url, params)
+    if response.streaming:
+        b''.join(response.streaming_content)
+    return response, time.perf_counter() - started
+
+
+def measure(dataset, route, role, requests):
+    """Latency percentiles, query count and peak memory for ``route`` as ``role``."""
+    client = Client(raise_request_exception=False)
+    user = dataset.users.get(role)
+
+    def prepare():
+        # untimed: log in again after a logout, build the URL (delete_vehicle creates its target)
+        if user is not None and route.name in LOGS_OUT:
+            client.force_login(user)
+        url = reverse(route.name, kwargs=route.kwargs(dataset) if route.kwargs else None)
+        return url, route.params(dataset) if callable(route.params) else route.params
+
+    if user is not None:
+        client.force_login(user)
+    response, _ = _request(client, route, *prepare())  # warm up caches and connections
+
+    request = prepare()
+    with ExitStack() as stack:
+        # every alias the warm-up request read from or wrote to is open by now
+        opened = [conn for conn in connections.all(initialized_only=True) if conn.connection is not None]
+        captures = [stack.enter_context(CaptureQueriesContext(conn)) for conn in opened]
+        tracemalloc.start()
+        try:
+            _request(client, route, *request)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    # count now: the next request clears the connections' query logs
+    queries = sum(len(capture) for capture in captures)
+
+    # like timeit: a collector pause landing in one request is noise, not the route's cost
+    gc.collect()
+    gc.disable()
+    try:
+        latencies = [_request(client, route, *prepare())[1] for _ in range(requests)]
+    finally:
+        gc.enable()
+    return {
+        'status': response.status_code,
+        'p50_ms': round(statistics.median(latencies) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 2),
+        'queries': queries,
+        'peak_kib': round(peak / 1024, 1),
+    }
+
+
+def _workload():
+    return sorted(str(i * 7919 % 10007) for i in range(50_000))
+
+
+def calibrate(rounds=7):
+    """Median milliseconds this machine takes for a fixed pure-Python workload right now."""
+    timings = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        _workload()
+        timings.append(time.perf_counter() - started)
+    return round(statistics.median(timings) * 1000, 2)
+
+
+def route_key(route, role):
+    return f'{route.name}[{role or "anonymous"}]'
+
+
+def run(dataset, requests=20, routes=ROUTES):
+    """Measure every route for every user it serves; the JSON-ready results."""
+    results = {}
+    for route in routes:
+        for role in route.who:
+            results[route_key(route, role)] = measure(dataset, route, role, requests)
+    return {
+        'meta': {
+            'scale': dataset.scale,
+            'seed': dataset.seed,
+            'requests': requests,
+            'calibration_ms': calibrate(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+        },
+        'routes': results,
+    }
+
+
+def speed_ratio(results, baseline):
+    """How much slower the machine behind ``results`` ran than the one behind ``baseline`` (1 if unknown)."""
+    before = baseline.get('meta', {}).get('calibration_ms')
+    after = results.get('meta', {}).get('calibration_ms')
+    return after / before if before and after else 1
+
+
+def compare(results, baseline, threshold=THRESHOLD):
+    """Regressions of ``results`` against ``baseline`` as readable lines; empty when there are none."""
+    ratio = speed_ratio(results, baseline)
+    regressions = []
+    for key, before in baseline['routes'].items():
+        after = results['routes'].get(key)
+        if after is None:
+            regressions.append(f'{key}: not measured')
+            continue
+        if after['status'] != before['status']:
+            regressions.append(f"{key}: status {before['status']} -> {after['status']}")
+        if after['queries'] > before['queries']:
+            regressions.append(f"{key}: queries {before['queries']} -> {after['queries']}")
+        for field, noise, scale in (
+            ('p50_ms', NOISE_MS, ratio), ('p95_ms', NOISE_MS, ratio), ('peak_kib', NOISE_KIB, 1),
+        ):
+            expected = before[field] * scale
+            if after[field] > expected * (1 + threshold) and after[field] - expected > noise:
+                regressions.append(f'{key}: {field} {before[field]} -> {after[field]}')
+    return regressions
+
+
+def remeasure(dataset, results, baseline, threshold=THRESHOLD):
+    """
+    ``results`` with every route that regressed against ``baseline`` measured
+    once more, so only a slowdown that shows up twice in a row fails: one
+    stalled request can move the p95 of a short run on its own.
+    """
+    keys = {line.split(':', 1)[0] for line in compare(results, baseline, threshold)}
+    routes = [route for route in ROUTES if any(route_key(route, role) in keys for role in route.who)]
+    if not routes:
+        return results
+    again = run(dataset, results['meta']['requests'], routes)['routes']
+    return {**results, 'routes': {**results['routes'], **{key: again[key] for key in keys & again.keys()}}}
+
+
+def merge(results, baseline):
+    """``baseline`` with the routes in ``results`` replaced, their latencies rescaled to the baseline's machine."""
+    ratio = speed_ratio(results, baseline)
+    routes = dict(baseline['routes'])
+    for key, row in results['routes'].items():
+        routes[key] = {
+            **row, 'p50_ms': round(row['p50_ms'] / ratio, 2), 'p95_ms': round(row['p95_ms'] / ratio, 2),
+        }
+    return {'meta': baseline['meta'], 'routes': routes}
@@ -0,0 +1,302 @@
+"""
+Streaming bulk import of customers, vehicles and bookings.
+
+Rows are read lazily from CSV or NDJSON and handled one batch at a time, so
+memory stays flat however large the file is. Each batch is validated with
+the same form rules the views use, its foreign keys and unique columns are
+resolved with one query per column, and the valid rows are written with
+``bulk_create`` inside a short transaction. Bookings go through the same
+per-day capacity as the booking form: rows past a center's free slots are
+rejected, and the slots are taken with the conditional update of
+vehicle.scheduling. A row that still conflicts when written (someone else
+created the same record, or filled the day, since the batch was checked)
+sends the batch down a row-by-row retry, so only the conflicting rows are
+rejected. Rejected rows are written to an NDJSON error file with the
+reason.
+
+Rows refer to other records by natural key:
+
+    customers  username, name, address, phone, email[, password]
+    vehicles   customer_email, vehicle_number, model, manufacturer, year, fuel_type
+    bookings   customer_email, vehicle_number, service_center_email, scheduled_date, description
+
+A customer's ``password`` must already be a Django password hash (as
+exported from another Django site, or made offline with make_password);
+it is stored as it is. Hashing plaintext here would cost a full PBKDF2 run
+per row and make a large import CPU-bound, so plaintext is rejected, and
+customers imported without a password get an unusable one and reset it.
+"""
+import csv
+import json
+from abc import ABC, abstractmethod
+from collections import Counter
+from itertools import islice
+
+from django import forms
+from django.contrib.auth.hashers import identify_hasher, make_password
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+
+from . import counters, dashboard_cache, scheduling
+from .forms import CustomerForm, ServiceBookingForm, VehicleForm
+from .models import BookingSlot, Customer, ServiceBooking, ServiceCenter, Vehicle, normalize_plate
+
+# raised by ``create`` when a row was checked but can no longer be written
+CONFLICTS = (IntegrityError, scheduling.SlotUnavailable)
+
+
+# ---------------------------
+# Row-level forms: field rules come from the view forms; uniqueness and
+# foreign keys are checked once per batch instead of once per row.
+# ---------------------------
+class CustomerImportForm(CustomerForm):
+    def validate_unique(self):
+        pass
+
+
+class VehicleImportForm(VehicleForm):
+    def validate_unique(self):
+        pass
+
+
+class BookingImportForm(forms.ModelForm):
+    class Meta:
+        model = ServiceBooking
+        fields = ['scheduled_date', 'description']
+
+    clean_scheduled_date = ServiceBookingForm.clean_scheduled_date
+
+
+def read_rows(path, fmt=None):
+    """Yield (line_number, row dict) from a CSV or NDJSON file without loading it."""
+    fmt = fmt or ('ndjson' if str(path).endswith(('.ndjson', '.jsonl')) else 'csv')
+    with open(path, newline='', encoding='utf-8') as fh:
+        if fmt == 'csv':
+            reader = csv.DictReader(fh)
+            for row in reader:
+                yield reader.line_num, row
+        else:
+            for line_number, line in enumerate(fh, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError as exc:
+                    row = {'_raw': line.rstrip('\n'), '_error': str(exc)}
+                if not isinstance(row, dict):
+                    row = {'_raw': line.rstrip('\n'), '_error': "Expected a JSON object."}
+                yield line_number, row
+
+
+def batches(rows, size):
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _form_errors(form):
+    return {field: [str(e) for e in errors] for field, errors in form.errors.items()}
+
+
+class Importer(ABC):
+    """Validate and create one batch of rows; subclasses handle one model."""
+
+    def __init__(self):
+        self.rejected = []
+        self.created = 0
+
+    def reject(self, line_number, row, errors):
+        self.rejected.append({'line': line_number, 'row': row, 'errors': errors})
+
+    @abstractmethod
+    def clean_batch(self, batch):
+        """Return (line_number, row, object to create) for the valid rows of ``batch``, rejecting the rest."""
+
+    @abstractmethod
+    def create(self, objects):
+        """Write ``objects`` (from clean_batch); raise one of CONFLICTS if that is no longer possible."""
+
+    def import_batch(self, batch):
+        self.rejected = []
+        parsed = []
+        for line_number, row in batch:
+            if '_error' in row:
+                self.reject(line_number, row, {'__all__': [row['_error']]})
+            else:
+                parsed.append((line_number, row))
+        cleaned = self.clean_batch(parsed)
+        if cleaned:
+            try:
+                with transaction.atomic():
+                    self.create([obj for _, _, obj in cleaned])
+                self.created += len(cleaned)
+            except CONFLICTS:
+                self.create_one_by_one(cleaned)
+        return sorted(self.rejected, key=lambda r: r['line'])
+
+    def create_one_by_one(self, cleaned):
+        for line_number, row, obj in cleaned:
+            for instance in obj if isinstance(obj, tuple) else (obj,):
+                instance.pk = None  # bulk_create set it before the batch rolled back
+            try:
+                with transaction.atomic():
+                    self.create([obj])
+            except CONFLICTS as exc:
+                self.reject(line_number, row, {'__all__': [str(exc)]})
+            else:
+                self.created += 1
+
+
+class CustomerImporter(Importer):
+
+    def clean_batch(self, batch):
+        usernames = {row.get('username') for _, row in batch}
+        emails = {row.get('email') for _, row in batch}
+        taken_usernames = set(User.objects.filter(username__in=usernames).values_list('username', flat=True))
+        taken_emails = set(Customer.objects.filter(email__in=emails).values_list('email', flat=True))
+
+        objects = []
+        for line_number, row in batch:
+            form = CustomerImportForm(row)
+            errors = {} if form.is_valid() else _form_errors(form)
+            username = row.get('username') or ''
+            try:
+                User._meta.get_field('username').clean(username, None)
+            except ValidationError as exc:
+                errors['username'] = exc.messages
+            if username in taken_usernames:
+                errors['username'] = ["A user with that username already exists."]
+            if row.get('email') in taken_emails:
+                errors['email'] = ["Customer with this Email already exists."]
+            password = row.get('password') or None
+            if password:
+                try:
+                    identify_hasher(password)
+                except ValueError:
+                    errors['password'] = ["Expected a password hash, not a plaintext password."]
+            if errors:
+                self.reject(line_number, row, errors)
+                continue
+            taken_usernames.add(username)
+            taken_emails.add(row['email'])
+            user = User(username=username, email=form.cleaned_data['email'],
+                        password=password or make_password(None))
+            objects.append((line_number, row, (user, form.instance)))
+        return objects
+
+    def create(self, objects):
+        users = User.objects.bulk_create([user for user, _ in objects])
+        customers = []
+        for user, customer in zip(users, (c for _, c in objects)):
+            customer.user = user
+            customers.append(customer)
+        Customer.objects.bulk_create(customers)
+
+
+class VehicleImporter(Importer):
+
+    def clean_batch(self, batch):
+        emails = {row.get('customer_email') for _, row in batch}
+        numbers = {row.get('vehicle_number') for _, row in batch}
+        customers = dict(Customer.objects.filter(email__in=emails).values_list('email', 'id'))
+        taken = set(Vehicle.objects.filter(vehicle_number__in=numbers).values_list('vehicle_number', flat=True))
+
+        objects = []
+        for line_number, row in batch:
+            form = VehicleImportForm(row)
+            errors = {} if form.is_valid() else _form_errors(form)
+            customer_id = customers.get(row.get('customer_email'))
+            if customer_id is None:
+                errors['customer_email'] = ["No customer with this email."]
+            if row.get('vehicle_number') in taken:
+                errors['vehicle_number'] = ["Vehicle with this Vehicle number already exists."]
+            if errors:
+                self.reject(line_number, row, errors)
+                continue
+            taken.add(row['vehicle_number'])
+            vehicle = form.instance
+            vehicle.customer_id = customer_id
+            vehicle.plate_key = normalize_plate(vehicle.vehicle_number)  # bulk_create skips save()
+            objects.append((line_number, row, vehicle))
+        return objects
+
+    def create(self, objects):
+        Vehicle.objects.bulk_create(objects)
+        for customer_id in {v.customer_id for v in objects}:
+            dashboard_cache.invalidate('customer', customer_id)
+
+
+class BookingImporter(Importer):
+
+    def clean_batch(self, batch):
+        emails = {row.get('customer_email') for _, row in batch}
+        center_emails = {row.get('service_center_email') for _, row in batch}
+        numbers = {row.get('vehicle_number') for _, row in batch}
+        customers = dict(Customer.objects.filter(email__in=emails).values_list('email', 'id'))
+        centers = {
+            email: (center_id, capacity) for email, center_id, capacity in
+            ServiceCenter.objects.filter(email__in=center_emails).values_list('email', 'id', 'daily_capacity')
+        }
+        vehicles = {
+            number: (vehicle_id, owner_id)
+            for number, vehicle_id, owner_id in
+            Vehicle.objects.filter(vehicle_number__in=numbers).values_list('vehicle_number', 'id', 'customer_id')
+        }
+
+        checked = [(line_number, row, BookingImportForm(row)) for line_number, row in batch]
+        days = {form.cleaned_data['scheduled_date'] for _, _, form in checked if form.is_valid()}
+        # slots already taken on the days this batch asks for, counted up as rows are accepted
+        booked = Counter({
+            (center_id, day): n for center_id, day, n in BookingSlot.objects.filter(
+                service_center_id__in=[center_id for center_id, _ in centers.values()], date__in=days,
+            ).values_list('service_center_id', 'date', 'booked')
+        })
+
+        objects = []
+        for line_number, row, form in checked:
+            errors = {} if form.is_valid() else _form_errors(form)
+            customer_id = customers.get(row.get('customer_email'))
+            service_center_id, capacity = centers.get(row.get('service_center_email'), (None, None))
+            vehicle_id, owner_id = vehicles.get(row.get('vehicle_number'), (None, None))
+            if customer_id is None:
+                errors['customer_email'] = ["No customer with this email."]
+            if service_center_id is None:
+                errors['service_center_email'] = ["No service center with this email."]
+            # same rule as ServiceBookingForm: only the customer's own vehicles
+            if vehicle_id is None or owner_id != customer_id:
+                errors['vehicle_number'] = ["Select a valid choice. That choice is not one of the available choices."]
+            day = form.cleaned_data.get('scheduled_date')
+            if service_center_id is not None and day and booked[service_center_id, day] >= capacity:
+                errors['scheduled_date'] = [f"{row['service_center_email']} is fully booked on {day:%d %b %Y}."]
+            if errors:
+                self.reject(line_number, row, errors)
+                continue
+            booked[service_center_id, day] += 1
+            booking = form.instance
+            booking.customer_id = customer_id
+            booking.vehicle_id = vehicle_id
+            booking.service_center_id = service_center_id
+            booking.status = "Pending"
+            objects.append((line_number, row, booking))
+        return objects
+
+    def create(self, objects):
+        counters.ensure_rows({b.service_center_id for b in objects})
+        ServiceBooking.objects.bulk_create(objects)
+        scheduling.reserve_bookings(objects)
+        for service_center_id, count in Counter(b.service_center_id for b in objects).items():
+            counters.apply_deltas(service_center_id, pending=count)
+            dashboard_cache.invalidate('servicecenter', service_center_id)
+        for customer_id in {b.customer_id for b in objects}:
+            dashboard_cache.invalidate('customer', customer_id)
+
+
+IMPORTERS = {
+    'customers': CustomerImporter,
+    'vehicles': VehicleImporter,
+    'bookings': BookingImporter,
+}
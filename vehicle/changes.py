@@ -0,0 +1,139 @@
+"""
+Incremental change feed for offline clients.
+
+Every write path in vehicle.views (and the bulk paths behind it:
+vehicle.transitions, vehicle.assignment) appends to ChangeLog inside the
+same transaction as the write it describes, so an entry exists exactly
+when its change was committed. An entry is written once per owner that
+may see the row: a booking and the rows hanging off it (statuses, job
+assignments, the invoice) go to the booking's customer and center, a
+history entry to its customer and, when set, its center, a vehicle to its
+customer. ``data`` is a snapshot of the row's FIELDS after the change, or
+just its id for a deletion, so a client applies entries as upserts and
+deletes without fetching anything else. A deleted booking takes its
+statuses, assignments, invoice and history with it; deleting a vehicle
+logs a deletion for each of its bookings, archived ones included.
+
+The entry id is the cursor: ids only grow (SQLite AUTOINCREMENT never
+reuses one, and SQLite commits one writer at a time), and ``feed`` reads
+the owner's entries after a cursor with a range scan of the
+(owner, id) index, so a sync costs O(changes since the last one).
+
+``manage.py compact_changes`` deletes entries superseded by a newer entry
+for the same owner and row. That is safe at any time: a client behind the
+removed entry gets the newer one instead. Rows written outside the views
+(the admin, ``import_records``, ``generate_data``) are not logged; the
+read-only API serves those in full.
+"""
+from django.db.models import Exists, OuterRef
+
+from .models import (
+    ArchivedBooking, ChangeLog, Invoice, JobAssignment, ServiceBooking, ServiceHistory, ServiceStatus, Vehicle,
+)
+from .roles import CUSTOMER, SERVICE_CENTER
+
+CREATED, UPDATED, DELETED = 'created', 'updated', 'deleted'
+# model -> (kind, fields snapshotted into ``data``)
+FIELDS = {
+    ServiceBooking: ('booking', (
+        'id', 'customer_id', 'vehicle_id', 'service_center_id', 'booking_date', 'scheduled_date',
+        'description', 'status', 'updated_at',
+    )),
+    ServiceStatus: ('status', ('id', 'booking_id', 'current_status', 'remarks', 'updated_on')),
+    JobAssignment: ('assignment', ('id', 'booking_id', 'staff_id', 'assigned_date', 'notes')),
+    Invoice: ('invoice', ('id', 'booking_id', 'service_center_id', 'total_amount', 'issue_date', 'payment_status')),
+    ServiceHistory: ('history', (
+        'id', 'booking_id', 'vehicle_id', 'service_center_id', 'service_date', 'details', 'cost', 'updated_at',
+    )),
+    Vehicle: ('vehicle', ('id', 'vehicle_number', 'model', 'manufacturer', 'year', 'fuel_type', 'updated_at')),
+}
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 500
+BATCH_SIZE = 1000
+
+
+def owner_token(role, profile_id):
+    return f"{role}:{profile_id}"
+
+
+def _owners(instance, bookings):
+    if isinstance(instance, ServiceBooking):
+        return [owner_token(CUSTOMER, instance.customer_id), owner_token(SERVICE_CENTER, instance.service_center_id)]
+    if isinstance(instance, Vehicle):
+        return [owner_token(CUSTOMER, instance.customer_id)]
+    if isinstance(instance, ServiceHistory):
+        owners = [owner_token(CUSTOMER, instance.customer_id)]
+        if instance.service_center_id is not None:
+            owners.append(owner_token(SERVICE_CENTER, instance.service_center_id))
+        return owners
+    booking = bookings[instance.booking_id] if bookings else instance.booking
+    return _owners(booking, None)
+
+
+def entries(instances, action, bookings=None):
+    """
+    Unsaved entries logging ``action`` on each of ``instances`` for everyone
+    who may see it. Rows hanging off a booking take their owners from
+    ``bookings`` ({id: booking}) when given, else from their loaded
+    ``booking``.
+    """
+    logged = []
+    for instance in instances:
+        kind, fields = FIELDS[type(instance)]
+        data = {'id': instance.pk} if action == DELETED else {f: getattr(instance, f) for f in fields}
+        logged += [
+            ChangeLog(owner=owner, kind=kind, object_id=instance.pk, action=action, data=data)
+            for owner in _owners(instance, bookings)
+        ]
+    return logged
+
+
+def write(logged):
+    """Insert ``logged`` entries in one statement; call inside the transaction of the write."""
+    ChangeLog.objects.bulk_create(logged)
+
+
+def record_many(instances, action, bookings=None):
+    write(entries(instances, action, bookings))
+
+
+def record(instance, action):
+    record_many([instance], action)
+
+
+def vehicle_deleted(vehicle):
+    """Log the deletion of ``vehicle`` and of its bookings, hot and archived; call before deleting it."""
+    fields = ('id', 'customer_id', 'service_center_id')
+    rows = ServiceBooking.objects.filter(vehicle=vehicle).values_list(*fields).union(
+        ArchivedBooking.objects.filter(vehicle=vehicle).values_list(*fields), all=True,
+    )
+    bookings = [ServiceBooking(id=pk, customer_id=c, service_center_id=s) for pk, c, s in rows]
+    record_many([*bookings, vehicle], DELETED)
+
+
+def feed(owner, after=0, limit=DEFAULT_LIMIT):
+    """(entries, more?): the owner's first ``limit`` entries with an id above ``after``, oldest first."""
+    entries = list(ChangeLog.objects.filter(owner=owner, id__gt=after).order_by('id')[:limit + 1])
+    return entries[:limit], len(entries) > limit
+
+
+def superseded():
+    """Entries with a newer entry for the same owner and row."""
+    newer = ChangeLog.objects.filter(
+        owner=OuterRef('owner'), kind=OuterRef('kind'), object_id=OuterRef('object_id'), id__gt=OuterRef('id'),
+    )
+    return ChangeLog.objects.filter(Exists(newer))
+
+
+def compact(batch_size=BATCH_SIZE, progress=None):
+    """Delete superseded entries, ``batch_size`` at a time; returns how many were deleted."""
+    removed = 0
+    last_id = 0
+    while True:
+        ids = list(superseded().filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return removed
+        removed += ChangeLog.objects.filter(id__in=ids).delete()[0]
+        last_id = ids[-1]
+        if progress:
+            progress(removed)
@@ -0,0 +1,183 @@
+"""
+Per-service-center dashboard counters.
+
+DashboardCounter holds booking counts by status, open job assignments and
+unpaid invoice totals so the dashboard never aggregates the booking and
+invoice tables. Write paths call ``ensure_rows`` before their first write
+and the helpers below after it, inside the same transaction as the write
+they describe; ``manage.py rebuild_counters``
+recomputes everything from the source tables and reports drift. Archived
+bookings (vehicle.archive) are closed, paid and unassigned as far as the
+counters go, so they only add to the Completed / Cancelled counts.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db.models import Count, F, Sum
+
+from .models import ArchivedBooking, DashboardCounter, Invoice, JobAssignment, ServiceBooking
+
+STATUS_FIELDS = {
+    'Pending': 'pending',
+    'In Progress': 'in_progress',
+    'Completed': 'completed',
+    'Cancelled': 'cancelled',
+}
+CLOSED_STATUSES = ('Completed', 'Cancelled')
+COUNTER_FIELDS = list(STATUS_FIELDS.values()) + ['open_assignments', 'unpaid_invoices', 'unpaid_total']
+
+
+def is_open(status):
+    return status not in CLOSED_STATUSES
+
+
+def _zero_counts():
+    counts = {field: 0 for field in COUNTER_FIELDS}
+    counts['unpaid_total'] = Decimal('0')
+    return counts
+
+
+def compute_counts(service_center_ids=None, booking_ids=None):
+    """
+    Recompute counters from the source tables: {service_center_id: {field: value}},
+    optionally limited to some centers or some (hot) bookings. Four grouped
+    queries regardless of how many centers are covered.
+    """
+    bookings = ServiceBooking.objects.all()
+    archived = ArchivedBooking.objects.all()
+    assignments = JobAssignment.objects.exclude(booking__status__in=CLOSED_STATUSES)
+    invoices = Invoice.objects.filter(payment_status='Unpaid')
+    if service_center_ids is not None:
+        bookings = bookings.filter(service_center_id__in=service_center_ids)
+        archived = archived.filter(service_center_id__in=service_center_ids)
+        assignments = assignments.filter(booking__service_center_id__in=service_center_ids)
+        invoices = invoices.filter(service_center_id__in=service_center_ids)
+    if booking_ids is not None:
+        bookings = bookings.filter(id__in=booking_ids)
+        archived = archived.none()  # the ids are of hot bookings
+        assignments = assignments.filter(booking_id__in=booking_ids)
+        invoices = invoices.filter(booking_id__in=booking_ids)
+
+    counts = defaultdict(_zero_counts)
+    for statuses in (bookings, archived):
+        for row in statuses.values('service_center_id', 'status').annotate(n=Count('id')).order_by():
+            field = STATUS_FIELDS.get(row['status'])
+            if field:
+                counts[row['service_center_id']][field] += row['n']
+    for row in (assignments.values('booking__service_center_id')
+                .annotate(n=Count('id')).order_by()):
+        counts[row['booking__service_center_id']]['open_assignments'] = row['n']
+    for row in invoices.values('service_center_id').annotate(n=Count('id'), total=Sum('total_amount')).order_by():
+        counts[row['service_center_id']]['unpaid_invoices'] = row['n']
+        counts[row['service_center_id']]['unpaid_total'] = row['total']
+    return counts
+
+
+def apply_deltas(service_center_id, **deltas):
+    """
+    Add ``deltas`` to a center's counters with a single UPDATE.
+
+    Call this after the write it describes, with the row made by
+    ensure_rows() before that write. A center still without a row is
+    initialised from the source tables, which already include the write;
+    any later delta in the same transaction would then be counted twice.
+    """
+    deltas = {field: delta for field, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    updated = DashboardCounter.objects.filter(service_center_id=service_center_id).update(
+        **{field: F(field) + delta for field, delta in deltas.items()}
+    )
+    if not updated:
+        DashboardCounter.objects.get_or_create(
+            service_center_id=service_center_id,
+            defaults=compute_counts([service_center_id])[service_center_id],
+        )
+
+
+def ensure_rows(service_center_ids):
+    """
+    Create the missing counter rows of ``service_center_ids`` from the
+    source tables, as they are before the caller writes anything, so every
+    delta of the transaction lands on a row that doesn't count it yet.
+    One query when the rows exist.
+    """
+    service_center_ids = set(service_center_ids)
+    missing = service_center_ids - set(
+        DashboardCounter.objects.filter(service_center_id__in=service_center_ids)
+        .values_list('service_center_id', flat=True)
+    )
+    if missing:
+        counts = compute_counts(missing)
+        DashboardCounter.objects.bulk_create(
+            [DashboardCounter(service_center_id=center_id, **counts[center_id]) for center_id in missing],
+            ignore_conflicts=True,
+        )
+
+
+def status_deltas(old_status, new_status, assignment_count=0):
+    deltas = defaultdict(int)
+    if old_status == new_status:
+        return deltas
+    if old_status in STATUS_FIELDS:
+        deltas[STATUS_FIELDS[old_status]] -= 1
+    if new_status in STATUS_FIELDS:
+        deltas[STATUS_FIELDS[new_status]] += 1
+    if is_open(old_status) != is_open(new_status):
+        deltas['open_assignments'] += assignment_count if is_open(new_status) else -assignment_count
+    return deltas
+
+
+def booking_created(booking):
+    apply_deltas(booking.service_center_id, **status_deltas(None, booking.status))
+
+
+def booking_status_changed(booking, old_status):
+    """``booking.status`` already holds the new status."""
+    if old_status == booking.status:
+        return
+    count = 0
+    if is_open(old_status) != is_open(booking.status):
+        count = booking.assignments.count()
+    apply_deltas(booking.service_center_id, **status_deltas(old_status, booking.status, count))
+
+
+def assignment_created(booking):
+    if is_open(booking.status):
+        apply_deltas(booking.service_center_id, open_assignments=1)
+
+
+def invoice_created(invoice):
+    if invoice.payment_status == 'Unpaid':
+        apply_deltas(invoice.service_center_id, unpaid_invoices=1, unpaid_total=invoice.total_amount)
+
+
+def bookings_removed(bookings):
+    """
+    Subtract the contribution of ``bookings`` (a queryset about to be
+    deleted, e.g. by a vehicle cascade) from their centers' counters.
+    """
+    ids = list(bookings.values_list('id', flat=True))
+    if not ids:
+        return
+    removed = compute_counts(booking_ids=ids)
+    for service_center_id, counts in removed.items():
+        apply_deltas(service_center_id, **{field: -value for field, value in counts.items()})
+
+
+def archived_bookings_removed(bookings):
+    """bookings_removed() for a queryset of ArchivedBooking rows: only their status counts."""
+    rows = bookings.values('service_center_id', 'status').annotate(n=Count('id')).order_by()
+    for row in rows:
+        apply_deltas(row['service_center_id'], **{STATUS_FIELDS[row['status']]: -row['n']})
+
+
+def counters_for(service_center):
+    """The center's counter row, created from the source tables on first use."""
+    counter = DashboardCounter.objects.filter(service_center=service_center).first()
+    if counter is None:
+        counter, _ = DashboardCounter.objects.get_or_create(
+            service_center=service_center,
+            defaults=compute_counts([service_center.id])[service_center.id],
+        )
+    return counter
@@ -0,0 +1,148 @@
+"""
+Per-owner cache of rendered dashboard fragments.
+
+Each owner (a customer or a service center) has a generation token. Fragment
+keys include it, so invalidating an owner is a single write that orphans
+every cached fragment and page of that owner; the orphans expire on their
+own. The token is random rather than a counter so an evicted token can never
+bring stale fragments back.
+
+Signal handlers in vehicle.signals call ``invalidate`` for the owners a
+model change affects. The new token is only set once the writer's
+transaction commits: set earlier, a dashboard rendered in between from the
+not-yet-committed (old) rows would be cached under the new token and stay
+stale until it expired. For the same reason a fragment rendered from the
+read replica (vehicle.db_router) is not stored while its token is younger
+than ``STICKY_PRIMARY_SECONDS``: the replica may not have the write that
+bumped it yet. A bumped token records when it was set for that check.
+"""
+import hashlib
+import time
+import uuid
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.safestring import mark_safe
+
+from . import db_router
+
+HIT_KEY = 'dashboard:stats:hits'
+MISS_KEY = 'dashboard:stats:misses'
+
+
+def get_cache():
+    return caches[getattr(settings, 'DASHBOARD_CACHE_ALIAS', 'default')]
+
+
+def _generation_key(owner, owner_id):
+    return f'dashboard:gen:{owner}:{owner_id}'
+
+
+def _count(cache, key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, timeout=None)
+        cache.incr(key)
+
+
+async def _acount(cache, key):
+    try:
+        await cache.aincr(key)
+    except ValueError:
+        await cache.aadd(key, 0, timeout=None)
+        await cache.aincr(key)
+
+
+def _timeout():
+    return getattr(settings, 'DASHBOARD_CACHE_TIMEOUT', 300)
+
+
+def _new_generation(bumped=False):
+    # a bump records when it happened; a token made up for an owner without one never follows a write
+    return f'{uuid.uuid4().hex}-{time.time() if bumped else 0:.3f}'
+
+
+def _bump(owner, owner_id):
+    get_cache().set(_generation_key(owner, owner_id), _new_generation(bumped=True), timeout=None)
+
+
+def invalidate(owner, owner_id):
+    """Orphan the owner's cached fragments when the current transaction commits (right away outside one)."""
+    if owner_id is not None:
+        transaction.on_commit(lambda: _bump(owner, owner_id))
+
+
+def stats():
+    counts = get_cache().get_many([HIT_KEY, MISS_KEY])
+    hits, misses = counts.get(HIT_KEY, 0), counts.get(MISS_KEY, 0)
+    total = hits + misses
+    return {'hits': hits, 'misses': misses, 'hit_rate': hits / total if total else None}
+
+
+class DashboardFragments:
+    """
+    Rendered fragments for one owner, e.g. ``DashboardFragments('customer', customer.id)``.
+    Async views build one with ``await DashboardFragments.acreate(...)`` and
+    use ``alookup``/``astore`` so they only query for the fragments they miss.
+    """
+
+    def __init__(self, owner, owner_id, generation=None):
+        self.cache = get_cache()
+        if generation is None:
+            key = _generation_key(owner, owner_id)
+            generation = self.cache.get(key)
+            if generation is None:
+                generation = _new_generation()
+                if not self.cache.add(key, generation, timeout=None):
+                    generation = self.cache.get(key, generation)
+        self.prefix = f'dashboard:{owner}:{owner_id}:{generation}'
+        bumped_at = float(generation.rpartition('-')[2] or 0)
+        self.recent = time.time() - bumped_at < db_router.sticky_seconds()
+
+    def _storable(self):
+        # a young token may have been bumped by a write the replica hasn't replayed yet
+        return not (self.recent and db_router.reading_from_replica())
+
+    @classmethod
+    async def acreate(cls, owner, owner_id):
+        cache = get_cache()
+        key = _generation_key(owner, owner_id)
+        generation = await cache.aget(key)
+        if generation is None:
+            generation = _new_generation()
+            if not await cache.aadd(key, generation, timeout=None):
+                generation = await cache.aget(key, generation)
+        return cls(owner, owner_id, generation)
+
+    def key(self, name, vary_on=''):
+        key = f'{self.prefix}:{name}'
+        if vary_on:
+            key += ':' + hashlib.md5(vary_on.encode()).hexdigest()
+        return key
+
+    def get(self, name, build, vary_on=''):
+        """Return the cached fragment ``name`` or render it with ``build()`` and store it."""
+        key = self.key(name, vary_on)
+        html = self.cache.get(key)
+        if html is not None:
+            _count(self.cache, HIT_KEY)
+            return mark_safe(html)
+        _count(self.cache, MISS_KEY)
+        html = build()
+        if self._storable():
+            self.cache.set(key, str(html), _timeout())
+        return mark_safe(html)
+
+    async def alookup(self, name, vary_on=''):
+        """Return the cached fragment ``name`` or None, counting the hit or miss."""
+        html = await self.cache.aget(self.key(name, vary_on))
+        await _acount(self.cache, MISS_KEY if html is None else HIT_KEY)
+        return None if html is None else mark_safe(html)
+
+    async def astore(self, name, html, vary_on=''):
+        if await sync_to_async(self._storable)():
+            await self.cache.aset(self.key(name, vary_on), str(html), _timeout())
+        return mark_safe(html)
@@ -0,0 +1,142 @@
+"""
+Primary / read-replica routing.
+
+Reads go to the ``settings.REPLICA_DATABASE`` alias only while serving a
+GET or HEAD request (vehicle.middleware.replica_routing marks those), and
+only when none of the following holds, in which case they stay on the primary:
+
+- the client wrote something in the last ``STICKY_PRIMARY_SECONDS``, so
+  the page a form redirects to shows what was just saved even if the
+  replica lags. A signed-in user is pinned by an entry keyed on the user id
+  in their session, in the ``settings.STICKY_PRIMARY_CACHE_ALIAS`` cache,
+  so the client cannot drop it; anonymous clients get a cookie instead. The
+  cache is only consulted on the request's first read that could use the
+  replica. The pin only holds across processes if every web worker shares
+  that cache: in production point the alias at a shared backend (Redis,
+  Memcached, the database cache), never at a per-process LocMemCache;
+- the current request has already written;
+- the query runs inside a transaction on the primary;
+- the model is one whose reads must see the latest write (sessions).
+
+Everything else, including management commands, signals outside requests
+and streaming bodies consumed after the view returns, uses the primary.
+Writes always go to the primary.
+"""
+import contextvars
+
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connections
+
+STICKY_COOKIE = 'db_primary'
+STICKY_KEY = 'db_primary:user:{}'
+PRIMARY_ONLY_APPS = {'sessions'}
+
+_routing = contextvars.ContextVar('db_routing', default=None)
+
+
+class RequestRouting:
+    """Per-request routing state; mutated in place so ORM calls run in worker threads see it too."""
+
+    def __init__(self, request, may_use_replica):
+        self.request = request
+        self.may_use_replica = may_use_replica
+        self.pinned = None
+        self.wrote = False
+
+    def use_replica(self):
+        if not self.may_use_replica:
+            return False
+        if self.pinned is None:
+            # the session is read from the primary (PRIMARY_ONLY_APPS), so this cannot recurse
+            user_id = self.request.session.get(SESSION_KEY)
+            self.pinned = user_id is not None and bool(pin_cache().get(STICKY_KEY.format(user_id)))
+        return not self.pinned
+
+
+def replica_alias():
+    alias = getattr(settings, 'REPLICA_DATABASE', None)
+    return alias if alias and alias in settings.DATABASES else None
+
+
+def sticky_seconds():
+    return getattr(settings, 'STICKY_PRIMARY_SECONDS', 10)
+
+
+def pin_cache():
+    return caches[getattr(settings, 'STICKY_PRIMARY_CACHE_ALIAS', 'default')]
+
+
+def reading_from_replica():
+    """Whether reads in the current request go to the replica (barring an open transaction)."""
+    state = _routing.get()
+    return state is not None and not state.wrote and state.use_replica()
+
+
+def begin_request(request):
+    """Start routing for ``request``; returns the state and a token for end_request."""
+    may_use_replica = (
+        request.method in ('GET', 'HEAD')
+        and STICKY_COOKIE not in request.COOKIES
+        and replica_alias() is not None
+    )
+    state = RequestRouting(request, may_use_replica)
+    return state, _routing.set(state)
+
+
+def end_request(token):
+    _routing.reset(token)
+
+
+def _set_cookie(response):
+    response.set_cookie(STICKY_COOKIE, '1', max_age=sticky_seconds(), httponly=True, samesite='Lax')
+
+
+def pin_if_written(state, request, response):
+    if state.wrote:
+        user_id = request.session.get(SESSION_KEY)
+        if user_id is None:
+            _set_cookie(response)
+        else:
+            pin_cache().set(STICKY_KEY.format(user_id), True, sticky_seconds())
+    return response
+
+
+async def apin_if_written(state, request, response):
+    """pin_if_written() for async middleware."""
+    if state.wrote:
+        user_id = await request.session.aget(SESSION_KEY)
+        if user_id is None:
+            _set_cookie(response)
+        else:
+            await pin_cache().aset(STICKY_KEY.format(user_id), True, sticky_seconds())
+    return response
+
+
+class PrimaryReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        state = _routing.get()
+        if (
+            state is None or state.wrote
+            or model._meta.app_label in PRIMARY_ONLY_APPS
+            or connections[DEFAULT_DB_ALIAS].in_atomic_block
+            or not state.use_replica()
+        ):
+            return DEFAULT_DB_ALIAS
+        return replica_alias()
+
+    def db_for_write(self, model, **hints):
+        state = _routing.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # both aliases hold the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # the replica gets its schema by replication
+        return db == DEFAULT_DB_ALIAS
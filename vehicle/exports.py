@@ -0,0 +1,89 @@
+"""
+Streaming CSV / NDJSON exports of service history and invoices.
+
+Rows are read with ``QuerySet.iterator`` in fixed-size chunks and encoded one
+at a time into a ``StreamingHttpResponse``, so memory stays flat whatever the
+size of the export. Filters are applied in SQL before anything is fetched.
+With ``archived`` the rows come from the archive tables (vehicle.archive),
+which have the same columns.
+"""
+import csv
+import json
+
+from django.http import StreamingHttpResponse
+
+from .models import ArchivedHistory, ArchivedInvoice, Invoice, ServiceHistory
+
+CHUNK_SIZE = 2000
+
+HISTORY_COLUMNS = [
+    ('id', 'id'),
+    ('service_date', 'service_date'),
+    ('vehicle_number', 'vehicle__vehicle_number'),
+    ('service_center', 'service_center__name'),
+    ('booking_id', 'booking_id'),
+    ('details', 'details'),
+    ('cost', 'cost'),
+]
+
+INVOICE_COLUMNS = [
+    ('id', 'id'),
+    ('issue_date', 'issue_date'),
+    ('booking_id', 'booking_id'),
+    ('vehicle_number', 'booking__vehicle__vehicle_number'),
+    ('customer', 'booking__customer__name'),
+    ('service_center', 'service_center__name'),
+    ('total_amount', 'total_amount'),
+    ('payment_status', 'payment_status'),
+]
+
+
+class Echo:
+    """File-like object whose write() hands the line back to csv.writer's caller."""
+
+    def write(self, value):
+        return value
+
+
+def history_export_rows(owner_filters, date_from=None, date_to=None, vehicle=None, archived=False):
+    queryset = (ArchivedHistory if archived else ServiceHistory).objects.filter(**owner_filters)
+    if date_from:
+        queryset = queryset.filter(service_date__gte=date_from)
+    if date_to:
+        queryset = queryset.filter(service_date__lte=date_to)
+    if vehicle:
+        queryset = queryset.filter(vehicle_id=vehicle)
+    return queryset.order_by('service_date', 'id').values_list(*[path for _, path in HISTORY_COLUMNS])
+
+
+def invoice_export_rows(owner_filters, date_from=None, date_to=None, vehicle=None, archived=False):
+    queryset = (ArchivedInvoice if archived else Invoice).objects.filter(**owner_filters)
+    if date_from:
+        queryset = queryset.filter(issue_date__gte=date_from)
+    if date_to:
+        queryset = queryset.filter(issue_date__lte=date_to)
+    if vehicle:
+        queryset = queryset.filter(booking__vehicle_id=vehicle)
+    return queryset.order_by('issue_date', 'id').values_list(*[path for _, path in INVOICE_COLUMNS])
+
+
+def _csv_lines(columns, rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow([name for name, _ in columns])
+    for row in rows.iterator(chunk_size=CHUNK_SIZE):
+        yield writer.writerow(row)
+
+
+def _ndjson_lines(columns, rows):
+    names = [name for name, _ in columns]
+    for row in rows.iterator(chunk_size=CHUNK_SIZE):
+        yield json.dumps(dict(zip(names, row)), default=str) + '\n'
+
+
+def stream_export(filename, columns, rows, fmt):
+    if fmt == 'ndjson':
+        response = StreamingHttpResponse(_ndjson_lines(columns, rows), content_type='application/x-ndjson')
+    else:
+        response = StreamingHttpResponse(_csv_lines(columns, rows), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{fmt}"'
+    return response
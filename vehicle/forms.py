@@ -7,6 +7,8 @@ from .models import (
     ServiceBooking, JobAssignment, ServiceStatus,
     Invoice, ServiceHistory, ReminderOffer
 )
+from . import scheduling
+from .pagination import MAX_PAGE_SIZE
 
 # ---------------------------
 # 1. User Registration Forms
@@ -38,7 +40,7 @@ class CustomerForm(forms.ModelForm):
 class ServiceCenterForm(forms.ModelForm):
     class Meta:
         model = ServiceCenter
-        fields = ["name", "address", "phone", "email"]
+        fields = ["name", "address", "phone", "email", "daily_capacity"]
         widgets = {"address": forms.Textarea(attrs={"rows": 2})}
 
 # ---------------------------
@@ -84,6 +86,22 @@ class ServiceBookingForm(forms.ModelForm):
             raise forms.ValidationError("Scheduled date cannot be in the past.")
         return sd
 
+    def clean(self):
+        cleaned_data = super().clean()
+        center = cleaned_data.get('service_center')
+        sd = cleaned_data.get('scheduled_date')
+        if center and sd and not scheduling.has_capacity(center, sd):
+            self.add_error('scheduled_date', full_day_message(center, sd))
+        return cleaned_data
+
+
+def full_day_message(center, day):
+    free = scheduling.available_dates(center, 3, start=max(day, date.today()))
+    message = f"{center} is fully booked on {day:%d %b %Y}."
+    if free:
+        message += " Next available: " + ", ".join(f"{d:%d %b %Y}" for d in free) + "."
+    return message
+
 
 # ---------------------------
 # 5. Job Assignment Form (staff queryset limited by booking passed from view)
@@ -126,7 +144,7 @@ class InvoiceForm(forms.ModelForm):
 
 
 # ---------------------------
-# 8. Service History Form
+# 8. Service History Form (vehicles and bookings limited to the requesting owner's)
 # ---------------------------
 class ServiceHistoryForm(forms.ModelForm):
     class Meta:
@@ -137,6 +155,30 @@ class ServiceHistoryForm(forms.ModelForm):
             'details': forms.Textarea(attrs={'rows': 3}),
         }
 
+    def __init__(self, *args, customer=None, service_center=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if customer:
+            vehicles = Vehicle.objects.filter(customer=customer)
+            bookings = ServiceBooking.objects.filter(customer=customer)
+        elif service_center:
+            vehicles = Vehicle.objects.filter(servicebooking__service_center=service_center).distinct()
+            bookings = ServiceBooking.objects.filter(service_center=service_center)
+        else:
+            vehicles, bookings = Vehicle.objects.none(), ServiceBooking.objects.none()
+        # only the owner's rows are valid choices; load just the fields the labels use
+        self.fields['vehicle'].queryset = vehicles.only('id', 'vehicle_number', 'model').order_by('vehicle_number')
+        self.fields['booking'].queryset = (
+            bookings.select_related('vehicle').only('id', 'customer_id', 'vehicle__vehicle_number').order_by('-id')
+        )
+
+    def clean(self):
+        cleaned_data = super().clean()
+        vehicle = cleaned_data.get('vehicle')
+        booking = cleaned_data.get('booking')
+        if vehicle and booking and booking.vehicle_id != vehicle.id:
+            self.add_error('booking', "This booking is for a different vehicle.")
+        return cleaned_data
+
 
 # ---------------------------
 # 9. Reminder / Offer Form
@@ -148,3 +190,79 @@ class ReminderOfferForm(forms.ModelForm):
         widgets = {
             'message': forms.Textarea(attrs={'rows': 3}),
         }
+
+
+# ---------------------------
+# 10. Export Filter Form (history / invoice downloads)
+# ---------------------------
+class ExportFilterForm(forms.Form):
+    format = forms.ChoiceField(choices=[('csv', 'CSV'), ('ndjson', 'NDJSON')], required=False)
+    date_from = forms.DateField(required=False)
+    date_to = forms.DateField(required=False)
+    vehicle = forms.IntegerField(required=False, min_value=1)
+    archived = forms.BooleanField(required=False)
+
+    def clean_format(self):
+        return self.cleaned_data.get('format') or 'csv'
+
+    def clean(self):
+        cleaned_data = super().clean()
+        date_from = cleaned_data.get('date_from')
+        date_to = cleaned_data.get('date_to')
+        if date_from and date_to and date_from > date_to:
+            raise forms.ValidationError("Start date must be on or before the end date.")
+        return cleaned_data
+
+
+# ---------------------------
+# 11. Reminder Campaign Form (segment of a center's customers)
+# ---------------------------
+class ReminderCampaignForm(forms.Form):
+    title = forms.CharField(max_length=150)
+    message = forms.CharField(widget=forms.Textarea(attrs={'rows': 3}))
+    months = forms.IntegerField(
+        min_value=1, max_value=120, initial=6,
+        label="Customers with a completed booking in the last N months",
+    )
+
+
+# ---------------------------
+# 12. Bulk Status Form (bookings limited to the center's own, checked in one query)
+# ---------------------------
+class BookingChoiceField(forms.ModelMultipleChoiceField):
+    def label_from_instance(self, obj):
+        return f"{obj.vehicle.vehicle_number} - {obj.scheduled_date} ({obj.status})"
+
+    def clean(self, value):
+        # the table shows one page; more ids than that didn't come from it
+        if value and len(value) > MAX_PAGE_SIZE:
+            raise forms.ValidationError(f"Select at most {MAX_PAGE_SIZE} bookings at a time.")
+        return super().clean(value)
+
+
+def open_bookings(service_center):
+    """The center's bookings a bulk update can still move."""
+    return (
+        ServiceBooking.objects.filter(service_center=service_center)
+        .exclude(status__in=['Completed', 'Cancelled'])
+        .select_related('vehicle')
+        .only('id', 'status', 'booking_date', 'scheduled_date', 'customer_id', 'vehicle__vehicle_number')
+    )
+
+
+class BulkStatusForm(forms.Form):
+    bookings = BookingChoiceField(queryset=ServiceBooking.objects.none(), widget=forms.CheckboxSelectMultiple)
+    status = forms.ChoiceField(choices=ServiceBooking.status_choices, initial='Completed')
+    remarks = forms.CharField(required=False, widget=forms.Textarea(attrs={'rows': 2}))
+
+    def __init__(self, *args, service_center=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if service_center:
+            # any open booking of the center validates; show_page() picks the checkboxes
+            self.fields['bookings'].queryset = open_bookings(service_center)
+            self.fields['bookings'].widget.choices = []
+
+    def show_page(self, page):
+        """Offer the bookings of one keyset page as checkboxes."""
+        field = self.fields['bookings']
+        field.widget.choices = [(booking.pk, field.label_from_instance(booking)) for booking in page]
@@ -0,0 +1,244 @@
+"""
+Printable invoice documents.
+
+A document is rendered, as HTML or as a PDF, from an Invoice (or an
+ArchivedInvoice, which has the same shape) with its booking, vehicle,
+customer and service center. Output is
+content-addressed: the key hashes the format, the document template and
+every value the document shows, and the rendered file is stored under
+``settings.INVOICE_DOCUMENT_DIR`` by that key. Asking for an unchanged
+invoice again reads the file; changing anything printed on it (an address,
+the payment status) gives a new key and one fresh render. Nothing is ever
+invalidated, so files that are no longer asked for can be deleted at any
+time.
+
+The PDF writer is deliberately small (Helvetica text lines, no third-party
+dependency): long lines are wrapped and the lines run onto as many A4
+pages as they need. ``manage.py render_invoices`` renders a center's month
+across a process pool and streams the files into one zip archive, reading
+the invoices in chunks and keeping only a few documents per worker queued.
+"""
+import functools
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import tempfile
+import textwrap
+from collections import deque
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections
+from django.template.loader import get_template, render_to_string
+
+FORMATS = {
+    'html': 'text/html; charset=utf-8',
+    'pdf': 'application/pdf',
+}
+TEMPLATE = 'invoice_document.html'
+# bump when the PDF layout below changes (template changes are picked up by themselves)
+PDF_LAYOUT = 2
+CHUNK_SIZE = 200
+# documents queued per worker in a batch
+IN_FLIGHT = 4
+# 11pt Helvetica between 56pt margins; 14pt leading from the top margin down to the bottom one
+LINE_WIDTH = 85
+LINES_PER_PAGE = 51
+
+
+def document_rows(invoices):
+    """``invoices`` with everything a document shows, in the same query."""
+    return invoices.select_related('booking__vehicle', 'booking__customer', 'service_center')
+
+
+def document_data(invoice):
+    """The values printed on ``invoice``'s document, as JSON-ready strings."""
+    booking, center = invoice.booking, invoice.service_center
+    customer, vehicle = booking.customer, booking.vehicle
+    return {
+        'number': invoice.id,
+        'issue_date': invoice.issue_date.isoformat(),
+        'total_amount': str(invoice.total_amount),
+        'payment_status': invoice.payment_status,
+        'booking': booking.id,
+        'scheduled_date': booking.scheduled_date.isoformat(),
+        'description': booking.description,
+        'vehicle_number': vehicle.vehicle_number,
+        'vehicle': f'{vehicle.manufacturer} {vehicle.model} ({vehicle.year})',
+        'customer': {'name': customer.name, 'address': customer.address, 'phone': customer.phone,
+                     'email': customer.email},
+        'center': {'name': center.name, 'address': center.address, 'phone': center.phone, 'email': center.email},
+    }
+
+
+@functools.cache
+def _template_digest():
+    return hashlib.sha256(get_template(TEMPLATE).template.source.encode()).hexdigest()
+
+
+def document_key(data, fmt):
+    layout = _template_digest() if fmt == 'html' else PDF_LAYOUT
+    payload = json.dumps([fmt, layout, data], sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def filename(data, fmt):
+    return f"invoice-{data['number']}.{fmt}"
+
+
+# ---------------------------
+# Rendering
+# ---------------------------
+def _pdf_text(text):
+    text = text.encode('latin-1', 'replace').decode('latin-1')
+    return '(' + text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)') + ')'
+
+
+def _pdf_lines(data):
+    customer, center = data['customer'], data['center']
+    return [
+        center['name'],
+        *center['address'].splitlines(),
+        f"{center['phone']}  {center['email']}",
+        '',
+        f"INVOICE #{data['number']}    Issued {data['issue_date']}",
+        '',
+        'Bill to:',
+        customer['name'],
+        *customer['address'].splitlines(),
+        f"{customer['phone']}  {customer['email']}",
+        '',
+        f"Vehicle: {data['vehicle_number']} - {data['vehicle']}",
+        f"Booking #{data['booking']}, scheduled {data['scheduled_date']}",
+        *[
+            wrapped for i, line in enumerate(data['description'].splitlines())
+            for wrapped in textwrap.wrap(line, LINE_WIDTH, initial_indent='Service: ' if i == 0 else ' ' * 9,
+                                         subsequent_indent=' ' * 9) or ['']
+        ],
+        '',
+        f"Total: {data['total_amount']}",
+        f"Status: {data['payment_status']}",
+    ]
+
+
+def render_pdf(data):
+    """An A4 PDF listing the document's lines, page after page; the same data always gives the same bytes."""
+    lines = [wrapped for line in _pdf_lines(data) for wrapped in textwrap.wrap(line, LINE_WIDTH) or ['']]
+    pages = [lines[i:i + LINES_PER_PAGE] for i in range(0, len(lines), LINES_PER_PAGE)]
+    # catalog, page tree and font, then a page and its content stream per page
+    page_numbers = [4 + 2 * i for i in range(len(pages))]
+    objects = [
+        b'<< /Type /Catalog /Pages 2 0 R >>',
+        b'<< /Type /Pages /Kids [%s] /Count %d >>' % (
+            b' '.join(b'%d 0 R' % number for number in page_numbers), len(pages),
+        ),
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>',
+    ]
+    for number, page in zip(page_numbers, pages):
+        text = ' T* '.join(f'{_pdf_text(line)} Tj' for line in page)
+        stream = f'BT /F1 11 Tf 14 TL 56 780 Td {text} ET'.encode('latin-1')
+        objects += [
+            b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] '
+            b'/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>' % (number + 1),
+            b'<< /Length %d >>\nstream\n%s\nendstream' % (len(stream), stream),
+        ]
+    out = bytearray(b'%PDF-1.4\n')
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b'%d 0 obj\n%s\nendobj\n' % (number, body)
+    xref = len(out)
+    out += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+    out += b''.join(b'%010d 00000 n \n' % offset for offset in offsets)
+    out += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+def render(data, fmt):
+    if fmt == 'pdf':
+        return render_pdf(data)
+    return render_to_string(TEMPLATE, data).encode()
+
+
+# ---------------------------
+# Disk cache
+# ---------------------------
+def _path(key, fmt):
+    return Path(settings.INVOICE_DOCUMENT_DIR) / key[:2] / f'{key}.{fmt}'
+
+
+def _store(path, content):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # write aside and rename, so readers and other processes never see half a file
+    fd, tmp = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as fh:
+            fh.write(content)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def stored_document(data, fmt):
+    """(key, path, rendered now?) of the document, rendering it only if no file has its key yet."""
+    key = document_key(data, fmt)
+    path = _path(key, fmt)
+    if path.exists():
+        return key, path, False
+    _store(path, render(data, fmt))
+    return key, path, True
+
+
+def cached_document(data, fmt):
+    """
+    (key, open binary file, rendered now?) of the document. The cached file
+    is opened here, so one deleted after the check is rendered again rather
+    than failing; a fresh render is served from memory.
+    """
+    key = document_key(data, fmt)
+    path = _path(key, fmt)
+    try:
+        return key, open(path, 'rb'), False
+    except FileNotFoundError:
+        pass
+    content = render(data, fmt)
+    _store(path, content)
+    return key, io.BytesIO(content), True
+
+
+# ---------------------------
+# Batches
+# ---------------------------
+def _cached_document(args):
+    data, fmt = args
+    _, path, rendered = stored_document(data, fmt)
+    return filename(data, fmt), path, rendered
+
+
+def render_batch(invoices, fmt, workers=1):
+    """
+    Yield (filename, path, rendered now?) for every invoice in the queryset,
+    in its order. The invoices are read in chunks as the documents are
+    written, so memory stays flat however many there are. With ``workers``
+    > 1 the rendering runs in a pool of forked processes with at most
+    IN_FLIGHT documents per worker queued; only this process reads the
+    database.
+    """
+    tasks = ((document_data(invoice), fmt) for invoice in document_rows(invoices).iterator(chunk_size=CHUNK_SIZE))
+    if workers == 1:
+        yield from map(_cached_document, tasks)
+        return
+    # the workers never query, but must not inherit open connections
+    connections.close_all()
+    with multiprocessing.get_context('fork').Pool(workers) as pool:
+        # submitted from this thread: a pool's own task feeder thread would need a connection of its own
+        pending = deque()
+        for task in tasks:
+            pending.append(pool.apply_async(_cached_document, (task,)))
+            if len(pending) >= workers * IN_FLIGHT:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
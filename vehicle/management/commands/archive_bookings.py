@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from vehicle import archive
+
+
+class Command(BaseCommand):
+    help = (
+        "Move bookings closed longer ago than the retention window, with their statuses, assignments, "
+        "invoice and history, into the archive tables, one short transaction per batch."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help="Retention window in days (default: settings.ARCHIVE_AFTER_DAYS).")
+        parser.add_argument('--batch-size', type=int, default=archive.BATCH_SIZE, help="Bookings per transaction.")
+
+    def handle(self, *args, **options):
+        if options['days'] is not None and options['days'] < 0:
+            raise CommandError("--days can't be negative.")
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size must be at least 1.")
+
+        def progress(totals):
+            if options['verbosity'] > 1:
+                self.stdout.write(f"{totals.get('vehicle.ArchivedBooking', 0)} booking(s) archived so far")
+
+        totals = archive.archive(options['days'], options['batch_size'], progress)
+        for label, n in totals.items():
+            self.stdout.write(f"{label:<28} {n:>10}")
+        self.stdout.write(self.style.SUCCESS(f"Archived {totals.get('vehicle.ArchivedBooking', 0)} booking(s)."))
@@ -0,0 +1,155 @@
+import asyncio
+import json
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.test import AsyncClient, Client
+from django.urls import reverse
+
+from vehicle import benchmarks, dashboard_cache
+from vehicle.models import Customer, ServiceBooking, ServiceCenter, ServiceHistory, Staff, Vehicle
+
+ROUTES = [
+    ('customer_dashboard', 'customer'),
+    ('servicecenter_dashboard', 'center'),
+    ('view_bookings', 'center'),
+    ('view_history', 'customer'),
+    ('view_vehicle', 'customer'),
+]
+
+
+def seed(bookings):
+    """A customer and a service center sharing ``bookings`` bookings and histories."""
+    customer_user = User.objects.create_user('bench_customer', password='bench')
+    center_user = User.objects.create_user('bench_center', password='bench')
+    customer = Customer.objects.create(user=customer_user, name='Bench Customer', address='-', phone='0',
+                                       email='customer@bench.local')
+    center = ServiceCenter.objects.create(user=center_user, name='Bench Center', address='-', phone='0',
+                                          email='center@bench.local')
+    Staff.objects.bulk_create(
+        Staff(service_center=center, name=f'Staff {i}', role='Mechanic', phone='0', email=f's{i}@bench.local')
+        for i in range(10)
+    )
+    vehicles = Vehicle.objects.bulk_create(
+        Vehicle(customer=customer, vehicle_number=f'BENCH{i:06d}', plate_key=f'BENCH{i:06d}', model='Model',
+                manufacturer='Make', year=2020, fuel_type='Petrol')
+        for i in range(max(1, bookings // 10))
+    )
+    rows = ServiceBooking.objects.bulk_create(
+        ServiceBooking(customer=customer, vehicle=vehicles[i % len(vehicles)], service_center=center,
+                       scheduled_date=date.today() + timedelta(days=i % 30), description='Service')
+        for i in range(bookings)
+    )
+    ServiceHistory.objects.bulk_create(
+        ServiceHistory(customer=customer, service_center=center, vehicle=b.vehicle, booking=b,
+                       service_date=date.today(), details='Done', cost=1000)
+        for b in rows
+    )
+    return {'customer': customer_user, 'center': center_user}
+
+
+CAVEAT = (
+    "Requests go through the in-process test Client (WSGI handler) and AsyncClient (ASGI handler), "
+    "not real servers such as gunicorn or uvicorn, so there is no socket, worker or server overhead. "
+    "The dashboard fragment cache is only cleared once per route and handler, so after the warm-up "
+    "most dashboard requests are cache hits."
+)
+
+
+def summarize(latencies, elapsed):
+    latencies = sorted(latencies)
+    return {
+        'requests': len(latencies),
+        'rps': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(statistics.median(latencies) * 1000, 2),
+        'p95_ms': round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 2),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare requests/sec of the read-heavy views through the WSGI handler (sync views, "
+        "thread pool) and the ASGI handler (async views, event loop) on a throwaway test database. "
+        + CAVEAT
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help="Requests per route and handler.")
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--bookings', type=int, default=500, help="Bookings to seed.")
+        parser.add_argument('--json', help="Also write the results to this file.")
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"Note: {CAVEAT}\n")
+        with benchmarks.throwaway_database():
+            users = seed(options['bookings'])
+            results = {}
+            for name, who in ROUTES:
+                url = reverse(name)
+                results[name] = {
+                    'wsgi': self.run_wsgi(url, users[who], options['requests'], options['concurrency']),
+                    'asgi': self.run_asgi(url, users[who], options['requests'], options['concurrency']),
+                }
+                self.report(name, results[name])
+
+        if options['json']:
+            with open(options['json'], 'w') as fh:
+                json.dump({'note': CAVEAT, 'routes': results}, fh, indent=2)
+
+    def report(self, name, result):
+        wsgi, asgi = result['wsgi'], result['asgi']
+        self.stdout.write(
+            f"{name:<26} wsgi {wsgi['rps']:>8} req/s (p95 {wsgi['p95_ms']} ms)   "
+            f"asgi {asgi['rps']:>8} req/s (p95 {asgi['p95_ms']} ms)"
+        )
+
+    def run_wsgi(self, url, user, requests, concurrency):
+        dashboard_cache.get_cache().clear()
+        local = threading.local()
+
+        def one(_):
+            if not hasattr(local, 'client'):
+                local.client = Client()
+                local.client.force_login(user)
+            start = time.perf_counter()
+            local.client.get(url)
+            return time.perf_counter() - start
+
+        with ThreadPoolExecutor(concurrency) as pool:
+            list(pool.map(one, range(concurrency)))  # warm up: log in each worker
+            start = time.perf_counter()
+            latencies = list(pool.map(one, range(requests)))
+            elapsed = time.perf_counter() - start
+        return summarize(latencies, elapsed)
+
+    def run_asgi(self, url, user, requests, concurrency):
+        dashboard_cache.get_cache().clear()
+
+        async def run():
+            clients = [AsyncClient() for _ in range(concurrency)]
+            for client in clients:
+                await client.aforce_login(user)
+            queue = asyncio.Queue()
+            for i in range(requests):
+                queue.put_nowait(i)
+            latencies = []
+
+            async def worker(client):
+                while not queue.empty():
+                    queue.get_nowait()
+                    begin = time.perf_counter()
+                    await client.get(url)
+                    latencies.append(time.perf_counter() - begin)
+
+            await asyncio.gather(*(c.get(url) for c in clients))  # warm up
+            start = time.perf_counter()
+            await asyncio.gather(*(worker(c) for c in clients))
+            return latencies, time.perf_counter() - start
+
+        latencies, elapsed = asyncio.run(run())
+        return summarize(latencies, elapsed)
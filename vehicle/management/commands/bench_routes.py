@@ -0,0 +1,95 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from vehicle import benchmarks
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a throwaway database, request every named route as the users it serves and record "
+        "p50/p95 latency, query counts and peak memory; compare against a baseline and fail on extra "
+        "queries or calibrated slowdowns."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', choices=benchmarks.SCALES, default='small')
+        for field in ('centers', 'customers', 'vehicles', 'bookings'):
+            parser.add_argument(f'--{field}', type=int, help=f"Override the scale's {field}.")
+        parser.add_argument('--seed', type=int, default=0, help="Random seed for the generated data.")
+        parser.add_argument('--requests', type=int, default=20, help="Timed requests per route and user.")
+        parser.add_argument('--output', help="Write the results to this JSON file.")
+        parser.add_argument('--baseline', default=str(settings.BASE_DIR / 'benchmarks' / 'baseline.json'))
+        parser.add_argument('--threshold', type=float, default=benchmarks.THRESHOLD,
+                            help="Allowed relative slowdown / memory growth before a route fails (0.25 = 25%%).")
+        parser.add_argument('--route', action='append', dest='routes', metavar='NAME',
+                            choices=[route.name for route in benchmarks.ROUTES],
+                            help="Only measure this route (repeatable).")
+        parser.add_argument('--update-baseline', action='store_true',
+                            help="Store the results as the new baseline instead of comparing; with --route, "
+                                 "replace just those routes in the stored baseline.")
+
+    def handle(self, *args, **options):
+        scale = dict(benchmarks.SCALES[options['scale']])
+        scale.update({field: options[field] for field in scale if options[field] is not None})
+        full_update = options['update_baseline'] and not options['routes']
+        baseline = None if full_update else self.read_baseline(options['baseline'])
+        if baseline is None and options['update_baseline'] and not full_update:
+            raise CommandError("No baseline to update; record every route first.")
+        if baseline is not None:
+            if baseline['meta']['scale'] != scale or baseline['meta']['seed'] != options['seed']:
+                raise CommandError("The baseline was recorded at a different scale or seed.")
+            if options['routes']:
+                keys = {benchmarks.route_key(route, role) for route in benchmarks.ROUTES
+                        if route.name in options['routes'] for role in route.who}
+                compared = {**baseline, 'routes': {k: v for k, v in baseline['routes'].items() if k in keys}}
+            else:
+                compared = baseline
+
+        with benchmarks.throwaway_database():
+            dataset = benchmarks.seed(seed=options['seed'], **scale)
+            routes = [route for route in benchmarks.ROUTES if route.name in options['routes']] \
+                if options['routes'] else benchmarks.ROUTES
+            results = benchmarks.run(dataset, options['requests'], routes)
+            if baseline is not None and not options['update_baseline']:
+                results = benchmarks.remeasure(dataset, results, compared, options['threshold'])
+
+        self.stdout.write(f"{'route':<40} {'status':>6} {'p50 ms':>9} {'p95 ms':>9} {'queries':>8} {'peak KiB':>9}")
+        for key, row in results['routes'].items():
+            self.stdout.write(
+                f"{key:<40} {row['status']:>6} {row['p50_ms']:>9} {row['p95_ms']:>9} "
+                f"{row['queries']:>8} {row['peak_kib']:>9}"
+            )
+        if options['output']:
+            with open(options['output'], 'w') as fh:
+                json.dump(results, fh, indent=2)
+
+        if full_update:
+            self.write_baseline(results, options['baseline'])
+            return
+        if options['update_baseline']:
+            self.write_baseline(benchmarks.merge(results, baseline), options['baseline'])
+            return
+        if baseline is None:
+            self.stdout.write(self.style.WARNING("No baseline to compare against; run with --update-baseline."))
+            return
+
+        regressions = benchmarks.compare(results, compared, options['threshold'])
+        for line in regressions:
+            self.stdout.write(self.style.ERROR(line))
+        if regressions:
+            raise CommandError(f"{len(regressions)} regression(s) against {options['baseline']}.")
+        self.stdout.write(self.style.SUCCESS(f"No regressions against {options['baseline']}."))
+
+    def read_baseline(self, path):
+        try:
+            with open(path) as fh:
+                return json.load(fh)
+        except FileNotFoundError:
+            return None
+
+    def write_baseline(self, results, path):
+        with open(path, 'w') as fh:
+            json.dump(results, fh, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Baseline written to {path}."))
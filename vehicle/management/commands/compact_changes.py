@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from vehicle import changes
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete change feed entries superseded by a newer entry for the same owner and row. "
+        "Safe to run at any time: clients with an older cursor receive the newer entry instead."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=changes.BATCH_SIZE, help="Entries per delete.")
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size must be at least 1.")
+
+        def progress(removed):
+            if options['verbosity'] > 1:
+                self.stdout.write(f"{removed} entr(ies) deleted so far")
+
+        removed = changes.compact(options['batch_size'], progress)
+        self.stdout.write(self.style.SUCCESS(f"Deleted {removed} superseded change feed entr(ies)."))
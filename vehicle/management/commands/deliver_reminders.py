@@ -0,0 +1,22 @@
+import smtplib
+
+from django.core.management.base import BaseCommand, CommandError
+
+from vehicle.reminders import deliver_pending
+
+
+class Command(BaseCommand):
+    help = "Send queued reminders/offers in batches over a single SMTP connection."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--limit', type=int, help="Stop after this many reminders.")
+
+    def handle(self, *args, **options):
+        try:
+            delivered, failed = deliver_pending(batch_size=options['batch_size'], limit=options['limit'])
+        except (smtplib.SMTPException, OSError) as exc:
+            raise CommandError(f"Delivery stopped: {exc}. Unsent reminders stay queued for the next run.")
+        self.stdout.write(self.style.SUCCESS(f"Delivered {delivered} reminder(s)."))
+        if failed:
+            self.stdout.write(self.style.WARNING(f"{failed} reminder(s) refused by the mail server and skipped."))
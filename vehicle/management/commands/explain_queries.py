@@ -0,0 +1,79 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from vehicle.models import ChangeLog, ServiceBooking, ServiceStatus, Staff
+from vehicle.pagination import page_queryset
+from vehicle.plates import matching_vehicles
+from vehicle.views import (
+    booking_rows, vehicle_rows, history_rows,
+    BOOKING_KEYS, VEHICLE_KEYS, HISTORY_KEYS,
+)
+
+
+def view_queries():
+    """
+    (label, queryset) for the list queries the views issue. Plans do not
+    depend on the parameter values, so placeholder ids and dates are used.
+    """
+    now = timezone.now()
+    today = now.date()
+    queries = []
+    for owner in ('customer', 'service_center'):
+        rows = booking_rows(**{owner: 1})
+        queries += [
+            (f"bookings by {owner}: first page", page_queryset(rows, BOOKING_KEYS)),
+            (f"bookings by {owner}: next page", page_queryset(rows, BOOKING_KEYS, [now, 1])),
+            (f"bookings by {owner}: previous page", page_queryset(rows, BOOKING_KEYS, [now, 1], forward=False)),
+        ]
+    history = history_rows(customer=1)
+    vehicles = vehicle_rows(customer=1)
+    queries += [
+        ("history: first page", page_queryset(history, HISTORY_KEYS)),
+        ("history: next page", page_queryset(history, HISTORY_KEYS, [today, 1])),
+        ("history: previous page", page_queryset(history, HISTORY_KEYS, [today, 1], forward=False)),
+        ("vehicles: first page", page_queryset(vehicles, VEHICLE_KEYS, descending=False)),
+        ("vehicles: next page", page_queryset(vehicles, VEHICLE_KEYS, [1], descending=False)),
+        ("staff by service_center", Staff.objects.filter(service_center=1)),
+        ("status timeline", ServiceStatus.objects.filter(booking=1).order_by('updated_on')),
+        ("bookings by status", ServiceBooking.objects.filter(status='Pending', service_center=1)),
+        ("plate prefix by customer", matching_vehicles("ka01", customer=1)),
+        ("plate prefix by service_center", matching_vehicles("ka01", service_center=1)),
+        ("change feed after cursor", ChangeLog.objects.filter(owner="customer:1", id__gt=1).order_by('id')),
+    ]
+    return queries
+
+
+def plan_problems(plan):
+    """Return the plan lines that scan a whole table or sort in a temp B-tree."""
+    problems = []
+    for line in plan.splitlines():
+        detail = line.split(None, 3)[-1] if line[:1].isdigit() else line
+        if detail.startswith('SCAN') or 'USE TEMP B-TREE' in detail:
+            problems.append(detail)
+    return problems
+
+
+class Command(BaseCommand):
+    help = "Run EXPLAIN QUERY PLAN on the views' list queries and fail on table scans or temp B-tree sorts."
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError("explain_queries only understands SQLite query plans.")
+
+        failures = 0
+        for label, queryset in view_queries():
+            plan = queryset.explain()
+            problems = plan_problems(plan)
+            if problems:
+                failures += 1
+                self.stdout.write(self.style.ERROR(f"FAIL  {label}"))
+                for problem in problems:
+                    self.stdout.write(f"      {problem}")
+            else:
+                self.stdout.write(self.style.SUCCESS(f"ok    {label}"))
+            if options['verbosity'] > 1:
+                self.stdout.write(plan)
+
+        if failures:
+            raise CommandError(f"{failures} query plan(s) scan a table or sort in a temp B-tree.")
@@ -0,0 +1,42 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from vehicle.bulk_import import IMPORTERS, batches, read_rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream customers, vehicles or bookings from a CSV or NDJSON file into the database in batches. "
+        "Customer passwords must be Django password hashes; customers without one must reset it."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(IMPORTERS))
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['csv', 'ndjson'], help="Defaults to the file extension.")
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--errors', help="Where to write rejected rows (default: <path>.rejected.ndjson).")
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size must be at least 1.")
+        errors_path = options['errors'] or f"{options['path']}.rejected.ndjson"
+        importer = IMPORTERS[options['kind']]()
+        rejected = 0
+
+        try:
+            rows = read_rows(options['path'], options['format'])
+            with open(errors_path, 'w', encoding='utf-8') as errors_file:
+                for batch in batches(rows, options['batch_size']):
+                    for rejection in importer.import_batch(batch):
+                        errors_file.write(json.dumps(rejection, default=str) + '\n')
+                        rejected += 1
+                    if options['verbosity'] > 1:
+                        self.stdout.write(f"{importer.created} imported, {rejected} rejected")
+        except OSError as exc:
+            raise CommandError(str(exc))
+
+        self.stdout.write(self.style.SUCCESS(f"Imported {importer.created} {options['kind']}."))
+        if rejected:
+            self.stdout.write(self.style.WARNING(f"Rejected {rejected} row(s); see {errors_path}."))
@@ -0,0 +1,72 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from vehicle.counters import COUNTER_FIELDS, compute_counts
+from vehicle.models import BookingSlot, DashboardCounter, ServiceCenter
+from vehicle.scheduling import expected_slots
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the per-service-center dashboard counters and the per-day booking slots from scratch "
+        "and report any drift."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Report drift without writing.")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            expected = compute_counts()
+            stored = {c.service_center_id: c for c in DashboardCounter.objects.select_for_update()}
+            drifted = 0
+
+            for service_center_id in ServiceCenter.objects.values_list('id', flat=True).iterator():
+                counts = expected[service_center_id]
+                counter = stored.get(service_center_id)
+                if counter is None:
+                    if not options['dry_run']:
+                        DashboardCounter.objects.create(service_center_id=service_center_id, **counts)
+                    continue
+
+                diffs = {
+                    field: (getattr(counter, field), counts[field])
+                    for field in COUNTER_FIELDS
+                    if getattr(counter, field) != counts[field]
+                }
+                if not diffs:
+                    continue
+                drifted += 1
+                detail = ", ".join(f"{field} {old} -> {new}" for field, (old, new) in diffs.items())
+                self.stdout.write(self.style.WARNING(f"service center {service_center_id}: {detail}"))
+                if not options['dry_run']:
+                    for field in diffs:
+                        setattr(counter, field, counts[field])
+                    counter.save(update_fields=list(diffs))
+
+            drifted_slots = self.rebuild_slots(options['dry_run'])
+
+        verb = "found" if options['dry_run'] else "repaired"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} drift in {drifted} service center(s) and {drifted_slots} booking slot(s)."
+        ))
+
+    def rebuild_slots(self, dry_run):
+        expected = expected_slots()
+        stored = {(s.service_center_id, s.date): s for s in BookingSlot.objects.select_for_update()}
+        drifted = 0
+        for key in sorted(expected.keys() | stored.keys()):
+            slot = stored.get(key)
+            old, new = (slot.booked if slot else 0), expected[key]
+            if old == new:
+                continue
+            drifted += 1
+            self.stdout.write(self.style.WARNING(f"service center {key[0]} on {key[1]}: booked {old} -> {new}"))
+            if dry_run:
+                continue
+            if slot is None:
+                BookingSlot.objects.create(service_center_id=key[0], date=key[1], booked=new)
+            else:
+                slot.booked = new
+                slot.save(update_fields=['booked'])
+        return drifted
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from vehicle import search
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search index over bookings, service history and vehicles."
+
+    def handle(self, *args, **options):
+        if not search.is_available():
+            raise CommandError("Full-text search needs the SQLite FTS5 backend.")
+        with transaction.atomic():
+            documents = search.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Indexed {documents} document(s)."))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from vehicle import rollups
+
+
+class Command(BaseCommand):
+    help = (
+        "Update the daily revenue / throughput rollups from rows changed since the last run "
+        "(the first run, or --full, rebuilds them all)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help="Recompute every day from scratch.")
+
+    def handle(self, *args, **options):
+        written = rollups.refresh(full=options['full'])
+        self.stdout.write(self.style.SUCCESS(f"Refreshed {written} center-day rollup(s)."))
@@ -0,0 +1,60 @@
+import time
+import zipfile
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from vehicle import invoices
+from vehicle.models import ArchivedInvoice, Invoice, ServiceCenter
+
+
+def month(value):
+    try:
+        year, number = value.split('-')
+        return date(int(year), int(number), 1)
+    except ValueError:
+        raise CommandError(f"--month must look like 2026-09, not {value!r}.")
+
+
+class Command(BaseCommand):
+    help = (
+        "Render every invoice a service center issued in a month (HTML or PDF) across a process pool "
+        "and stream them into one zip archive, archived invoices included. Unchanged invoices come from the "
+        "document cache."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('center', type=int, help="Service center id.")
+        parser.add_argument('--month', help="YYYY-MM (default: the current month).")
+        parser.add_argument('--format', choices=invoices.FORMATS, default='pdf')
+        parser.add_argument('--workers', type=int, default=1, help="Processes rendering in parallel.")
+        parser.add_argument('--output', help="Archive path (default: invoices-<center>-<month>.zip).")
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1:
+            raise CommandError("--workers must be at least 1.")
+        if not ServiceCenter.objects.filter(pk=options['center']).exists():
+            raise CommandError(f"No service center with id {options['center']}.")
+        first = month(options['month']) if options['month'] else timezone.localdate().replace(day=1)
+        following = (first.replace(day=28) + timedelta(days=4)).replace(day=1)
+        output = options['output'] or f"invoices-{options['center']}-{first:%Y-%m}.zip"
+        selected = [
+            model.objects.filter(
+                service_center_id=options['center'], issue_date__gte=first, issue_date__lt=following,
+            ).order_by('id')
+            for model in (Invoice, ArchivedInvoice)
+        ]
+
+        started = time.perf_counter()
+        written = rendered = 0
+        with zipfile.ZipFile(output, 'w', zipfile.ZIP_DEFLATED) as archive:
+            for queryset in selected:
+                for name, path, fresh in invoices.render_batch(queryset, options['format'], options['workers']):
+                    archive.write(path, name)
+                    written += 1
+                    rendered += fresh
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {written} invoice(s) to {output} in {time.perf_counter() - started:.1f}s "
+            f"({rendered} rendered, {written - rendered} from the cache)."
+        ))
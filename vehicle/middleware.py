@@ -0,0 +1,97 @@
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.utils.decorators import sync_and_async_middleware
+
+from . import db_router, roles, timing
+
+
+@sync_and_async_middleware
+def asgi_urlconf(get_response):
+    """Route ASGI requests through settings.ASGI_URLCONF so they reach the async views."""
+    urlconf = getattr(settings, 'ASGI_URLCONF', None)
+
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            if urlconf and isinstance(request, ASGIRequest):
+                request.urlconf = urlconf
+            return await get_response(request)
+    else:
+        def middleware(request):
+            if urlconf and isinstance(request, ASGIRequest):
+                request.urlconf = urlconf
+            return get_response(request)
+    return middleware
+
+
+@sync_and_async_middleware
+def replica_routing(get_response):
+    """
+    Let vehicle.db_router send this request's reads to the replica when it
+    is a GET/HEAD from a client that has not written recently, and pin the
+    client to the primary for a while once the request writes.
+    """
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            state, token = db_router.begin_request(request)
+            try:
+                response = await get_response(request)
+            finally:
+                db_router.end_request(token)
+            return await db_router.apin_if_written(state, request, response)
+    else:
+        def middleware(request):
+            state, token = db_router.begin_request(request)
+            try:
+                response = get_response(request)
+            finally:
+                db_router.end_request(token)
+            return db_router.pin_if_written(state, request, response)
+    return middleware
+
+
+@sync_and_async_middleware
+def server_timing(get_response):
+    """
+    Time the request with vehicle.timing: a log line for slow requests and,
+    when enabled, a Server-Timing header. Keep it first in MIDDLEWARE so
+    the other middleware's queries are counted too.
+    """
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            timings, token = timing.start()
+            response = await get_response(request)
+            return timing.stop(timings, token, request, response)
+
+        async def process_view(request, view_func, view_args, view_kwargs):
+            timing.view_started(view_func)
+    else:
+        def middleware(request):
+            timings, token = timing.start()
+            response = get_response(request)
+            return timing.stop(timings, token, request, response)
+
+        def process_view(request, view_func, view_args, view_kwargs):
+            timing.view_started(view_func)
+    # Django picks process_view up from the middleware instance, functions included
+    middleware.process_view = process_view
+    return middleware
+
+
+@sync_and_async_middleware
+def user_role(get_response):
+    """
+    Set request.role and request.profile (see vehicle.roles). Goes after
+    AuthenticationMiddleware; the profile comes with the user's own query.
+    """
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            # keep the loaded user so sync code (templates) doesn't load it again
+            request.user = await request.auser()
+            await roles.aattach(request, request.user)
+            return await get_response(request)
+    else:
+        def middleware(request):
+            roles.attach(request, request.user)
+            return get_response(request)
+    return middleware
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vehicle', '0002_servicehistory_service_center_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='servicebooking',
+            index=models.Index(fields=['service_center', '-booking_date', '-id'], name='booking_center_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='servicebooking',
+            index=models.Index(fields=['customer', '-booking_date', '-id'], name='booking_customer_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='servicebooking',
+            index=models.Index(fields=['status', 'service_center'], name='booking_status_center_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='servicehistory',
+            index=models.Index(fields=['customer', '-service_date', '-id'], name='history_customer_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='servicestatus',
+            index=models.Index(fields=['booking', 'updated_on'], name='status_booking_updated_idx'),
+        ),
+    ]
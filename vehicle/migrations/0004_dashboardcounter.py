@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:58
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vehicle', '0003_access_path_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DashboardCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pending', models.IntegerField(default=0)),
+                ('in_progress', models.IntegerField(default=0)),
+                ('completed', models.IntegerField(default=0)),
+                ('cancelled', models.IntegerField(default=0)),
+                ('open_assignments', models.IntegerField(default=0)),
+                ('unpaid_invoices', models.IntegerField(default=0)),
+                ('unpaid_total', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('service_center', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='counters', to='vehicle.servicecenter')),
+            ],
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vehicle', '0005_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reminderoffer',
+            name='delivered_on',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='reminderoffer',
+            index=models.Index(condition=models.Q(('delivered_on__isnull', True)), fields=['id'], name='reminder_undelivered_idx'),
+        ),
+    ]
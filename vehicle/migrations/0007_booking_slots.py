@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:09
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_slots(apps, schema_editor):
+    """Seed the slot index with the active bookings that already exist."""
+    ServiceBooking = apps.get_model('vehicle', 'ServiceBooking')
+    BookingSlot = apps.get_model('vehicle', 'BookingSlot')
+    rows = (
+        ServiceBooking.objects.exclude(status='Cancelled')
+        .values('service_center_id', 'scheduled_date').annotate(n=Count('id')).order_by()
+    )
+    BookingSlot.objects.bulk_create(
+        (BookingSlot(service_center_id=r['service_center_id'], date=r['scheduled_date'], booked=r['n']) for r in rows),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vehicle', '0006_reminderoffer_delivery'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='servicecenter',
+            name='daily_capacity',
+            field=models.PositiveIntegerField(default=20, help_text='Bookings accepted per day.'),
+        ),
+        migrations.CreateModel(
+            name='BookingSlot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('booked', models.PositiveIntegerField(default=0)),
+                ('service_center', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='slots', to='vehicle.servicecenter')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('service_center', 'date'), name='slot_center_date_uniq')],
+            },
+        ),
+        migrations.RunPython(fill_slots, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:21
+
+import re
+from importlib import import_module
+
+from django.db import migrations, models
+
+# Adding a NOT NULL column rebuilds vehicle_vehicle, which drops its triggers
+# and can't rename under the views: drop the index first and build it again
+# afterwards, with the schema frozen in 0009_search_index.
+frozen_schema = import_module('vehicle.migrations.0009_search_index')
+
+
+def fill_plate_keys(apps, schema_editor):
+    """Normalize existing plates in batches; runs before the indexes are built."""
+    Vehicle = apps.get_model('vehicle', 'Vehicle')
+    last_id = 0
+    while True:
+        # walk by id rather than holding a cursor open on the table being updated
+        batch = list(Vehicle.objects.filter(id__gt=last_id).only('id', 'vehicle_number').order_by('id')[:2000])
+        if not batch:
+            return
+        for vehicle in batch:
+            vehicle.plate_key = re.sub(r'[^0-9A-Z]', '', vehicle.vehicle_number.upper())
+        Vehicle.objects.bulk_update(batch, ['plate_key'])
+        last_id = batch[-1].id
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vehicle', '0009_search_index'),
+    ]
+
+    operations = [
+        # adding a NOT NULL column rebuilds vehicle_vehicle on SQLite
+        migrations.RunPython(frozen_schema.drop_schema, frozen_schema.create_and_fill),
+        migrations.AddField(
+            model_name='vehicle',
+            name='plate_key',
+            field=models.CharField(default='', editable=False, max_length=50),
+        ),
+        migrations.RunPython(fill_plate_keys, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='vehicle',
+            index=models.Index(fields=['plate_key'], name='vehicle_plate_key_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vehicle',
+            index=models.Index(fields=['customer', 'plate_key'], name='vehicle_customer_plate_idx'),
+        ),
+        migrations.RunPython(frozen_schema.create_and_fill, frozen_schema.drop_schema),
+    ]
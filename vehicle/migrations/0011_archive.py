@@ -0,0 +1,90 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vehicle', '0010_vehicle_plate_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedBooking',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('booking_date', models.DateTimeField()),
+                ('scheduled_date', models.DateField()),
+                ('description', models.TextField()),
+                ('status', models.CharField(choices=[('Pending', 'Pending'), ('In Progress', 'In Progress'), ('Completed', 'Completed'), ('Cancelled', 'Cancelled')], max_length=20)),
+                ('updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField()),
+                ('customer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_bookings', to='vehicle.customer')),
+                ('service_center', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_bookings', to='vehicle.servicecenter')),
+                ('vehicle', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_bookings', to='vehicle.vehicle')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedAssignment',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('assigned_date', models.DateField()),
+                ('notes', models.TextField(blank=True, null=True)),
+                ('staff', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_assignments', to='vehicle.staff')),
+                ('booking', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='assignments', to='vehicle.archivedbooking')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedHistory',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('service_date', models.DateField()),
+                ('details', models.TextField()),
+                ('cost', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('updated_at', models.DateTimeField()),
+                ('booking', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='history', to='vehicle.archivedbooking')),
+                ('customer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_history', to='vehicle.customer')),
+                ('service_center', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_history', to='vehicle.servicecenter')),
+                ('vehicle', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_history', to='vehicle.vehicle')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedInvoice',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('total_amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('issue_date', models.DateField()),
+                ('payment_status', models.CharField(max_length=20)),
+                ('booking', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='invoice', to='vehicle.archivedbooking')),
+                ('service_center', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_invoices', to='vehicle.servicecenter')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedStatus',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('updated_on', models.DateTimeField()),
+                ('current_status', models.CharField(max_length=50)),
+                ('remarks', models.TextField(blank=True, null=True)),
+                ('booking', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='statuses', to='vehicle.archivedbooking')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='archivedbooking',
+            index=models.Index(fields=['service_center', '-booking_date', '-id'], name='archbooking_center_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedbooking',
+            index=models.Index(fields=['customer', '-booking_date', '-id'], name='archbooking_customer_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedhistory',
+            index=models.Index(fields=['customer', '-service_date', '-id'], name='archhistory_customer_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedinvoice',
+            index=models.Index(fields=['service_center', 'issue_date'], name='archinvoice_center_date_idx'),
+        ),
+    ]
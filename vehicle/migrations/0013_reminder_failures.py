@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vehicle', '0012_changelog'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='reminderoffer',
+            name='reminder_undelivered_idx',
+        ),
+        migrations.AddField(
+            model_name='reminderoffer',
+            name='failed_on',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='reminderoffer',
+            name='failure',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddIndex(
+            model_name='reminderoffer',
+            index=models.Index(condition=models.Q(('delivered_on__isnull', True), ('failed_on__isnull', True)), fields=['id'], name='reminder_queue_idx'),
+        ),
+    ]
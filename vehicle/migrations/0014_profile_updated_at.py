@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:12
+
+from importlib import import_module
+
+from django.db import migrations, models
+
+# Adding a column with a default rebuilds vehicle_customer, which drops its
+# trigger and can't rename under the views: drop the index first and build it
+# again afterwards, with the schema frozen in 0009_search_index.
+frozen_schema = import_module('vehicle.migrations.0009_search_index')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vehicle', '0013_reminder_failures'),
+    ]
+
+    operations = [
+        migrations.RunPython(frozen_schema.drop_schema, frozen_schema.create_and_fill),
+        migrations.AddField(
+            model_name='customer',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='servicecenter',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.RunPython(frozen_schema.create_and_fill, frozen_schema.drop_schema),
+    ]
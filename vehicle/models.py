@@ -1,6 +1,15 @@
+import re
+
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 from django.contrib.auth.models import User
 
+
+def normalize_plate(number):
+    """Plate lookup key: letters and digits only, upper case ("ka 01-ab" -> "KA01AB")."""
+    return re.sub(r'[^0-9A-Z]', '', (number or '').upper())
+
+
 # ---------------------------
 # 1. Service Center Model
 # ---------------------------
@@ -11,6 +20,9 @@ class ServiceCenter(models.Model):
     phone = models.CharField(max_length=15)
     email = models.EmailField(unique=True)
     registration_date = models.DateTimeField(auto_now_add=True)
+    # names and contact details are shown on other owners' rows; API validators include this
+    updated_at = models.DateTimeField(auto_now=True)
+    daily_capacity = models.PositiveIntegerField(default=20, help_text="Bookings accepted per day.")
 
     def __str__(self):
         return self.name
@@ -26,6 +38,8 @@ class Customer(models.Model):
     phone = models.CharField(max_length=15)
     email = models.EmailField(unique=True)
     registration_date = models.DateTimeField(auto_now_add=True)
+    # names and contact details are shown on other owners' rows; API validators include this
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.name
@@ -37,11 +51,27 @@ class Customer(models.Model):
 class Vehicle(models.Model):
     customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='vehicles')
     vehicle_number = models.CharField(max_length=50, unique=True)
+    plate_key = models.CharField(max_length=50, editable=False, default='')
     model = models.CharField(max_length=100)
     manufacturer = models.CharField(max_length=100)
     year = models.IntegerField()
     fuel_type = models.CharField(max_length=50)
     registration_date = models.DateField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['customer', 'updated_at'], name='vehicle_customer_updated_idx'),
+            models.Index(fields=['plate_key'], name='vehicle_plate_key_idx'),
+            models.Index(fields=['customer', 'plate_key'], name='vehicle_customer_plate_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.plate_key = normalize_plate(self.vehicle_number)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'vehicle_number' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'plate_key'}
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.vehicle_number} - {self.model}"
@@ -79,6 +109,17 @@ class ServiceBooking(models.Model):
         ('Cancelled', 'Cancelled'),
     ]
     status = models.CharField(max_length=20, choices=status_choices, default='Pending')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['service_center', '-booking_date', '-id'], name='booking_center_date_idx'),
+            models.Index(fields=['customer', '-booking_date', '-id'], name='booking_customer_date_idx'),
+            models.Index(fields=['status', 'service_center'], name='booking_status_center_idx'),
+            models.Index(fields=['service_center', 'updated_at'], name='booking_center_updated_idx'),
+            models.Index(fields=['customer', 'updated_at'], name='booking_customer_updated_idx'),
+            models.Index(fields=['updated_at'], name='booking_updated_idx'),
+        ]
 
     def __str__(self):
         return f"Booking {self.id} - {self.vehicle.vehicle_number}"
@@ -107,6 +148,12 @@ class ServiceStatus(models.Model):
     current_status = models.CharField(max_length=50)
     remarks = models.TextField(blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['booking', 'updated_on'], name='status_booking_updated_idx'),
+            models.Index(fields=['updated_on'], name='status_updated_idx'),
+        ]
+
     def __str__(self):
         return f"Status of {self.booking.vehicle.vehicle_number}: {self.current_status}"
 
@@ -124,6 +171,13 @@ class Invoice(models.Model):
         choices=[('Paid', 'Paid'), ('Unpaid', 'Unpaid')],
         default='Unpaid'
     )
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['issue_date'], name='invoice_issue_date_idx'),
+            models.Index(fields=['updated_at'], name='invoice_updated_idx'),
+        ]
 
     def __str__(self):
         return f"Invoice #{self.id} - {self.booking.vehicle.vehicle_number}"
@@ -140,6 +194,14 @@ class ServiceHistory(models.Model):
     service_date = models.DateField()
     details = models.TextField()
     cost = models.DecimalField(max_digits=10, decimal_places=2)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['customer', '-service_date', '-id'], name='history_customer_date_idx'),
+            models.Index(fields=['customer', 'updated_at'], name='history_customer_updated_idx'),
+            models.Index(fields=['updated_at'], name='history_updated_idx'),
+        ]
 
     def __str__(self):
         return f"History for {self.vehicle.vehicle_number}"
@@ -154,6 +216,188 @@ class ReminderOffer(models.Model):
     title = models.CharField(max_length=150)
     message = models.TextField()
     sent_date = models.DateTimeField(auto_now_add=True)
+    delivered_on = models.DateTimeField(blank=True, null=True)
+    # set when the mail server refused the message; it is not retried
+    failed_on = models.DateTimeField(blank=True, null=True)
+    failure = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            # small partial index: the delivery queue is only the rows neither delivered nor failed
+            models.Index(
+                fields=['id'], condition=models.Q(delivered_on__isnull=True, failed_on__isnull=True),
+                name='reminder_queue_idx',
+            ),
+        ]
 
     def __str__(self):
         return f"Reminder: {self.title} to {self.customer.name}"
+
+
+# ---------------------------
+# 11. Dashboard Counters (denormalized per service center,
+#     maintained by vehicle.counters)
+# ---------------------------
+class DashboardCounter(models.Model):
+    service_center = models.OneToOneField(ServiceCenter, on_delete=models.CASCADE, related_name='counters')
+    pending = models.IntegerField(default=0)
+    in_progress = models.IntegerField(default=0)
+    completed = models.IntegerField(default=0)
+    cancelled = models.IntegerField(default=0)
+    open_assignments = models.IntegerField(default=0)
+    unpaid_invoices = models.IntegerField(default=0)
+    unpaid_total = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    def __str__(self):
+        return f"Counters for {self.service_center_id}"
+
+
+# ---------------------------
+# 12. Booking Slots (booked count per center per day,
+#     maintained by vehicle.scheduling)
+# ---------------------------
+class BookingSlot(models.Model):
+    service_center = models.ForeignKey(ServiceCenter, on_delete=models.CASCADE, related_name='slots')
+    date = models.DateField()
+    booked = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['service_center', 'date'], name='slot_center_date_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.service_center_id} on {self.date}: {self.booked}"
+
+
+# ---------------------------
+# 13. Daily Rollups (revenue and throughput per center per day,
+#     maintained by vehicle.rollups)
+# ---------------------------
+class DailyRollup(models.Model):
+    service_center = models.ForeignKey(ServiceCenter, on_delete=models.CASCADE, related_name='rollups')
+    date = models.DateField()
+    bookings = models.IntegerField(default=0)
+    services = models.IntegerField(default=0)
+    invoices = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    completed = models.IntegerField(default=0)
+    turnaround_seconds = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['service_center', 'date'], name='rollup_center_date_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.service_center_id} on {self.date}"
+
+
+class RollupWatermark(models.Model):
+    name = models.CharField(max_length=50, unique=True)
+    processed_until = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return f"{self.name}: {self.processed_until}"
+
+
+# ---------------------------
+# 14. Archive: closed bookings and their rows, moved out of the hot
+#     tables by vehicle.archive. Same columns and ids as the originals;
+#     timestamps are copied, not set.
+# ---------------------------
+class ArchivedBooking(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='archived_bookings')
+    vehicle = models.ForeignKey(Vehicle, on_delete=models.CASCADE, related_name='archived_bookings')
+    service_center = models.ForeignKey(ServiceCenter, on_delete=models.CASCADE, related_name='archived_bookings')
+    booking_date = models.DateTimeField()
+    scheduled_date = models.DateField()
+    description = models.TextField()
+    status = models.CharField(max_length=20, choices=ServiceBooking.status_choices)
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['service_center', '-booking_date', '-id'], name='archbooking_center_date_idx'),
+            models.Index(fields=['customer', '-booking_date', '-id'], name='archbooking_customer_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"Archived booking {self.id}"
+
+
+class ArchivedStatus(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    booking = models.ForeignKey(ArchivedBooking, on_delete=models.CASCADE, related_name='statuses')
+    updated_on = models.DateTimeField()
+    current_status = models.CharField(max_length=50)
+    remarks = models.TextField(blank=True, null=True)
+
+
+class ArchivedAssignment(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    booking = models.ForeignKey(ArchivedBooking, on_delete=models.CASCADE, related_name='assignments')
+    staff = models.ForeignKey(Staff, on_delete=models.CASCADE, related_name='archived_assignments')
+    assigned_date = models.DateField()
+    notes = models.TextField(blank=True, null=True)
+
+
+class ArchivedInvoice(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    booking = models.OneToOneField(ArchivedBooking, on_delete=models.CASCADE, related_name='invoice')
+    service_center = models.ForeignKey(ServiceCenter, on_delete=models.CASCADE, related_name='archived_invoices')
+    total_amount = models.DecimalField(max_digits=10, decimal_places=2)
+    issue_date = models.DateField()
+    payment_status = models.CharField(max_length=20)
+    updated_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['service_center', 'issue_date'], name='archinvoice_center_date_idx'),
+        ]
+
+
+class ArchivedHistory(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='archived_history')
+    service_center = models.ForeignKey(
+        ServiceCenter, on_delete=models.SET_NULL, null=True, blank=True, related_name='archived_history'
+    )
+    vehicle = models.ForeignKey(Vehicle, on_delete=models.CASCADE, related_name='archived_history')
+    booking = models.ForeignKey(ArchivedBooking, on_delete=models.CASCADE, related_name='history')
+    service_date = models.DateField()
+    details = models.TextField()
+    cost = models.DecimalField(max_digits=10, decimal_places=2)
+    updated_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['customer', '-service_date', '-id'], name='archhistory_customer_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"Archived history for {self.vehicle_id}"
+
+
+# ---------------------------
+# 15. Change Log (append-only feed of booking, history and vehicle
+#     changes per owner, written by vehicle.changes; id is the cursor)
+# ---------------------------
+class ChangeLog(models.Model):
+    owner = models.CharField(max_length=30)
+    kind = models.CharField(max_length=20)
+    object_id = models.BigIntegerField()
+    action = models.CharField(max_length=10)
+    data = models.JSONField(encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['owner', 'id'], name='changelog_owner_idx'),
+            models.Index(fields=['owner', 'kind', 'object_id', 'id'], name='changelog_object_idx'),
+        ]
+
+    def __str__(self):
+        return f"#{self.id} {self.kind} {self.object_id} {self.action}"
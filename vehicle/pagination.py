@@ -0,0 +1,170 @@
+"""
+Keyset (cursor) pagination for the list views.
+
+Pages are addressed by the sort key of the row at their edge instead of an
+OFFSET, so page 500 costs the same single range query as page 1:
+
+    ?after=<cursor>   rows that sort after the last row of the current page
+    ?before=<cursor>  rows that sort before the first row of the current page
+    ?size=<n>         optional page size (capped at MAX_PAGE_SIZE)
+
+The last key must be unique (normally ``id``) so ties on the date column
+are broken deterministically.
+"""
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+DEFAULT_PAGE_SIZE = 25
+MAX_PAGE_SIZE = 100
+
+
+class KeysetPage:
+    def __init__(self, object_list, params, next_cursor=None, previous_cursor=None, size=DEFAULT_PAGE_SIZE):
+        self.object_list = object_list
+        self.params = params
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.size = size
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def _query(self, direction, cursor):
+        params = self.params.copy()
+        params.pop('after', None)
+        params.pop('before', None)
+        params[direction] = cursor
+        return params.urlencode()
+
+    @property
+    def next_query(self):
+        return self._query('after', self.next_cursor) if self.has_next else ''
+
+    @property
+    def previous_query(self):
+        return self._query('before', self.previous_cursor) if self.has_previous else ''
+
+
+def encode_cursor(obj, keys):
+    if isinstance(obj, dict):
+        values = [str(obj[key]) for key in keys]
+    else:
+        values = [str(getattr(obj, key)) for key in keys]
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, model, keys):
+    """Return the key values stored in ``cursor``, or None if it is malformed."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(values, list) or len(values) != len(keys):
+            return None
+        return [model._meta.get_field(key).to_python(value) for key, value in zip(keys, values)]
+    except (ValueError, TypeError, ValidationError):
+        return None
+
+
+def _seek(keys, values, descending, forward):
+    """
+    Build the row-value comparison ``(k1, k2, ...) < (v1, v2, ...)`` as
+    ``k1 <= v1 AND (k1 < v1 OR (k1 = v1 AND k2 < v2) OR ...)``.
+
+    The redundant leading bound is what lets SQLite turn the seek into an
+    index range; the OR on its own would be applied as a filter while
+    walking the index from the start.
+    """
+    lookup = 'lt' if descending == forward else 'gt'
+    condition = Q()
+    for i, key in enumerate(keys):
+        term = Q(**dict(zip(keys[:i], values[:i])))
+        term &= Q(**{f'{key}__{lookup}': values[i]})
+        condition |= term
+    if len(keys) > 1:
+        condition &= Q(**{f'{keys[0]}__{lookup}e': values[0]})
+    return condition
+
+
+def page_queryset(queryset, keys, values=None, descending=True, forward=True):
+    """Order ``queryset`` by ``keys`` and seek past ``values`` if given."""
+    if values is not None:
+        queryset = queryset.filter(_seek(keys, values, descending, forward))
+    ascending = descending != forward
+    return queryset.order_by(*[key if ascending else f'-{key}' for key in keys])
+
+
+def get_page_size(request):
+    try:
+        size = int(request.GET.get('size', DEFAULT_PAGE_SIZE))
+    except (TypeError, ValueError):
+        return DEFAULT_PAGE_SIZE
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+
+def _seek_request(request, queryset, keys, descending):
+    """Return (sliced queryset, size, cursor values, forward) for the requested page."""
+    size = get_page_size(request)
+    after = request.GET.get('after')
+    before = request.GET.get('before')
+
+    forward = True
+    values = None
+    if after:
+        values = decode_cursor(after, queryset.model, keys)
+    elif before:
+        values = decode_cursor(before, queryset.model, keys)
+        forward = values is None
+
+    queryset = page_queryset(queryset, keys, values, descending, forward)
+    return queryset[:size + 1], size, values, forward
+
+
+def _build_page(request, rows, keys, size, values, forward):
+    has_more = len(rows) > size
+    rows = rows[:size]
+
+    if not forward:
+        rows.reverse()
+        has_next, has_previous = True, has_more
+    else:
+        has_next, has_previous = has_more, values is not None
+
+    return KeysetPage(
+        rows,
+        request.GET,
+        next_cursor=encode_cursor(rows[-1], keys) if rows and has_next else None,
+        previous_cursor=encode_cursor(rows[0], keys) if rows and has_previous else None,
+        size=size,
+    )
+
+
+def keyset_paginate(request, queryset, keys, descending=True):
+    """
+    Return one KeysetPage of ``queryset`` ordered by ``keys``.
+
+    Exactly one query is issued: ``size + 1`` rows are fetched so we know
+    whether another page exists without a COUNT.
+    """
+    queryset, size, values, forward = _seek_request(request, queryset, keys, descending)
+    return _build_page(request, list(queryset), keys, size, values, forward)
+
+
+async def akeyset_paginate(request, queryset, keys, descending=True):
+    """Async version of keyset_paginate using the async ORM."""
+    queryset, size, values, forward = _seek_request(request, queryset, keys, descending)
+    rows = [row async for row in queryset]
+    return _build_page(request, rows, keys, size, values, forward)
@@ -0,0 +1,51 @@
+"""
+Plate-number autocomplete.
+
+Vehicle.plate_key holds the plate with spacing, punctuation and case
+removed, so "ka 01 ab", "KA-01-AB" and "KA01AB" all become "KA01AB". A
+prefix lookup is a range on the plate_key index: ``key >= prefix`` and
+``key < prefix`` with its last character bumped. That avoids LIKE
+entirely, whose index use depends on the backend's collation rules.
+"""
+from django.db.models import Exists, OuterRef, Prefetch
+
+from .counters import CLOSED_STATUSES
+from .models import ServiceBooking, Vehicle, normalize_plate
+
+MAX_MATCHES = 25
+
+
+def prefix_range(prefix):
+    """(low, high) such that low <= key < high exactly when key starts with ``prefix``."""
+    return prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def matching_vehicles(text, customer=None, service_center=None, limit=10):
+    """
+    Vehicles whose normalized plate starts with ``text``, in plate order: a
+    customer's own, or those booked at a service center. Each comes with
+    ``open_bookings`` (at that center, for a center) prefetched.
+    """
+    prefix = normalize_plate(text)
+    if not prefix:
+        return Vehicle.objects.none()
+    low, high = prefix_range(prefix)
+    vehicles = Vehicle.objects.filter(plate_key__gte=low, plate_key__lt=high)
+    open_bookings = ServiceBooking.objects.exclude(status__in=CLOSED_STATUSES)
+    if customer is not None:
+        vehicles = vehicles.filter(customer=customer)
+    else:
+        at_center = ServiceBooking.objects.filter(vehicle=OuterRef('pk'), service_center=service_center)
+        vehicles = vehicles.filter(Exists(at_center))
+        open_bookings = open_bookings.filter(service_center=service_center)
+    return (
+        vehicles.only('id', 'vehicle_number', 'model', 'manufacturer')
+        .order_by('plate_key', 'id')
+        .prefetch_related(Prefetch(
+            'servicebooking_set',
+            queryset=open_bookings.select_related('service_center')
+            .only('id', 'vehicle_id', 'scheduled_date', 'status', 'service_center__name')
+            .order_by('scheduled_date', 'id'),
+            to_attr='open_bookings',
+        ))[:limit]
+    )
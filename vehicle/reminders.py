@@ -0,0 +1,129 @@
+"""
+Reminder / offer campaigns.
+
+A campaign picks a segment of a center's customers in one query, queues a
+ReminderOffer row per customer with ``bulk_create`` and returns straight
+away. ``manage.py deliver_reminders`` then sends the queue in batches over
+a single reused SMTP connection, one message at a time, and marks each
+batch's sent reminders delivered with one UPDATE. A message whose recipient
+the server refuses for good (a 5xx reply, e.g. a bad address) is marked
+failed with the reason and left out of later runs, so one bad row never
+blocks the queue. Anything else (a temporary 4xx reply, a refused sender, a
+dropped connection) stops the run and leaves the reminder queued for the
+next one.
+"""
+import calendar
+import smtplib
+from datetime import date
+from itertools import islice
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ReminderOffer, ServiceBooking
+
+
+def months_ago(months, today=None):
+    today = today or date.today()
+    month_index = today.year * 12 + today.month - 1 - months
+    year, month = divmod(month_index, 12)
+    day = min(today.day, calendar.monthrange(year, month + 1)[1])
+    return date(year, month + 1, day)
+
+
+def segment_customer_ids(service_center, months):
+    """Customers with a completed booking at ``service_center`` in the last ``months`` months."""
+    return (
+        ServiceBooking.objects
+        .filter(service_center=service_center, status='Completed', scheduled_date__gte=months_ago(months))
+        .values_list('customer_id', flat=True)
+        .distinct()
+    )
+
+
+def queue_campaign(service_center, title, message, customer_ids, batch_size=1000):
+    """Create one undelivered ReminderOffer per customer; return how many were queued."""
+    customer_ids = iter(customer_ids)
+    queued = 0
+    with transaction.atomic():
+        while True:
+            batch = [
+                ReminderOffer(service_center=service_center, customer_id=customer_id, title=title, message=message)
+                for customer_id in islice(customer_ids, batch_size)
+            ]
+            if not batch:
+                return queued
+            ReminderOffer.objects.bulk_create(batch)
+            queued += len(batch)
+
+
+def _message(reminder):
+    return EmailMessage(
+        subject=reminder.title,
+        body=reminder.message,
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[reminder.customer.email],
+        reply_to=[reminder.service_center.email],
+    )
+
+
+def permanent_refusal(exc):
+    """True when ``exc`` means this message's recipient can never be delivered to."""
+    if isinstance(exc, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in exc.recipients.values())
+    return isinstance(exc, ValueError)  # an address that can't even be put in a header
+
+
+def _mark(sent, failed):
+    now = timezone.now()
+    if sent:
+        ReminderOffer.objects.filter(id__in=sent).update(delivered_on=now)
+    for reminder_id, reason in failed.items():
+        ReminderOffer.objects.filter(id=reminder_id).update(failed_on=now, failure=reason)
+
+
+def deliver_pending(batch_size=500, limit=None, connection=None):
+    """
+    Send queued reminders oldest first over one connection. What a batch
+    sent (or had refused for good) is recorded as soon as the batch ends,
+    even when the run stops partway on another SMTP error, which is raised;
+    the next run resumes where it stopped. Returns (delivered, failed).
+    """
+    connection = connection or get_connection()
+    delivered = failed = 0
+    last_id = 0
+    connection.open()
+    try:
+        while limit is None or delivered + failed < limit:
+            size = batch_size if limit is None else min(batch_size, limit - delivered - failed)
+            batch = list(
+                ReminderOffer.objects
+                .filter(delivered_on__isnull=True, failed_on__isnull=True, id__gt=last_id)
+                .select_related('customer', 'service_center')
+                .only('id', 'title', 'message', 'customer__email', 'service_center__email')
+                .order_by('id')[:size]
+            )
+            if not batch:
+                break
+            sent, refused = [], {}
+            try:
+                for reminder in batch:
+                    try:
+                        if connection.send_messages([_message(reminder)]):
+                            sent.append(reminder.id)
+                        else:
+                            refused[reminder.id] = "Not sent."
+                    except (smtplib.SMTPRecipientsRefused, ValueError) as exc:
+                        if not permanent_refusal(exc):
+                            raise
+                        refused[reminder.id] = str(exc)
+            finally:
+                _mark(sent, refused)
+            delivered += len(sent)
+            failed += len(refused)
+            last_id = batch[-1].id
+    finally:
+        connection.close()
+    return delivered, failed
@@ -0,0 +1,84 @@
+"""
+Who the signed-in user is: a customer, a service center, or neither.
+
+ProfileBackend loads the session's user together with its Customer and
+ServiceCenter rows (LEFT JOINs on the query AuthenticationMiddleware makes
+anyway), so a role check never costs a query of its own and nothing has
+to be cached or invalidated: the profile is as fresh as the user row. The
+``user_role`` middleware (vehicle.middleware) exposes the result as
+
+- ``request.role``: CUSTOMER, SERVICE_CENTER or None;
+- ``request.profile``: the Customer / ServiceCenter, or None;
+
+for views and templates. Both are resolved on first use, so a request that
+never looks at the user doesn't load the session either. Users loaded some
+other way (e.g. sessions from before the backend was enabled) still work;
+their profile costs a query.
+"""
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.exceptions import ObjectDoesNotExist
+from django.utils.functional import SimpleLazyObject
+
+CUSTOMER = 'customer'
+SERVICE_CENTER = 'servicecenter'
+ROLES = (CUSTOMER, SERVICE_CENTER)
+
+UserModel = get_user_model()
+
+
+class ProfileBackend(ModelBackend):
+    """ModelBackend whose session user arrives with its customer / service center profile."""
+
+    def _users(self):
+        return UserModel._default_manager.select_related(*ROLES)
+
+    def get_user(self, user_id):
+        try:
+            user = self._users().get(pk=user_id)
+        except UserModel.DoesNotExist:
+            return None
+        return user if self.user_can_authenticate(user) else None
+
+    async def aget_user(self, user_id):
+        try:
+            user = await self._users().aget(pk=user_id)
+        except UserModel.DoesNotExist:
+            return None
+        return user if self.user_can_authenticate(user) else None
+
+
+def resolve(user):
+    """(role, profile) of ``user``; (None, None) for anonymous users and users with no profile."""
+    if user.is_authenticated:
+        for role in ROLES:
+            try:
+                return role, getattr(user, role)
+            except ObjectDoesNotExist:
+                continue
+    return None, None
+
+
+def attach(request, user):
+    """
+    Set ``request.role`` and ``request.profile`` for ``user``, lazily. The
+    profile proxy is never None itself; test it for truth, not identity.
+    """
+    resolved = []
+
+    def get(index):
+        if not resolved:
+            resolved.extend(resolve(user))
+        return resolved[index]
+
+    request.role = SimpleLazyObject(lambda: get(0))
+    request.profile = SimpleLazyObject(lambda: get(1))
+
+
+async def aattach(request, user):
+    """attach() for async middleware: resolved up front, off the event loop if the profile wasn't loaded with the user."""
+    if user.is_authenticated and not all(getattr(UserModel, role).is_cached(user) for role in ROLES):
+        request.role, request.profile = await sync_to_async(resolve)(user)
+    else:
+        request.role, request.profile = resolve(user)
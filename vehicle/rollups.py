@@ -0,0 +1,211 @@
+"""
+Daily revenue and throughput rollups.
+
+DailyRollup holds, per service center per day: bookings made, services
+recorded, invoices issued and their revenue, and bookings completed with
+their total turnaround (booking_date to the first Completed ServiceStatus).
+Reports read only these rows.
+
+``manage.py refresh_rollups`` keeps them current incrementally. It finds
+the (center, day) pairs whose source rows changed since the stored
+watermark, using the ``updated_at`` / ``updated_on`` indexes, recomputes
+just that span from the source tables with grouped queries and upserts
+the result. The watermark trails the run's start by ``WATERMARK_LAG`` so
+rows committed by transactions still open at that moment are picked up
+next time; recomputing a day twice is harmless. Deleted rows leave no
+trace to find, so ``--full`` rebuilds everything, ``FULL_CHUNK_DAYS`` at
+a time with a commit after each chunk, so the write lock is never held
+for the whole rebuild and readers only ever see whole days.
+Archived rows (vehicle.archive) keep counting: every recomputation reads
+the archive tables alongside the hot ones.
+"""
+from collections import defaultdict
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, Max, Min, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import (
+    ArchivedBooking, ArchivedHistory, ArchivedInvoice, ArchivedStatus, DailyRollup, Invoice, RollupWatermark,
+    ServiceBooking, ServiceHistory, ServiceStatus,
+)
+
+WATERMARK = 'daily'
+WATERMARK_LAG = timedelta(minutes=5)
+FULL_CHUNK_DAYS = 31
+# (bookings, history, invoices, statuses): the hot tables, then the archive
+SOURCES = [
+    (ServiceBooking, ServiceHistory, Invoice, ServiceStatus),
+    (ArchivedBooking, ArchivedHistory, ArchivedInvoice, ArchivedStatus),
+]
+ROLLUP_FIELDS = ['bookings', 'services', 'invoices', 'revenue', 'completed', 'turnaround_seconds']
+
+
+def _zero():
+    row = {field: 0 for field in ROLLUP_FIELDS}
+    row['revenue'] = Decimal('0')
+    return row
+
+
+def changed_keys(since):
+    """{(service_center_id, day)} touched by source rows changed after ``since``."""
+    keys = set()
+    keys.update(
+        ServiceBooking.objects.filter(updated_at__gt=since)
+        .values_list('service_center_id', TruncDate('booking_date')).distinct()
+    )
+    keys.update(
+        ServiceHistory.objects.filter(updated_at__gt=since, service_center__isnull=False)
+        .values_list('service_center_id', 'service_date').distinct()
+    )
+    keys.update(
+        Invoice.objects.filter(updated_at__gt=since)
+        .values_list('service_center_id', 'issue_date').distinct()
+    )
+    keys.update(
+        ServiceStatus.objects.filter(updated_on__gt=since, current_status='Completed')
+        .values_list('booking__service_center_id', TruncDate('updated_on')).distinct()
+    )
+    return keys
+
+
+def compute(service_center_ids=None, start=None, end=None):
+    """
+    Rollup rows from the source tables: {(service_center_id, day): {field: value}},
+    optionally limited to some centers and to days in [start, end].
+    Four grouped queries over the hot tables and four over the archive,
+    whatever the span.
+    """
+    def limit(queryset, center_field, day_field):
+        if service_center_ids is not None:
+            queryset = queryset.filter(**{f'{center_field}__in': service_center_ids})
+        if start is not None:
+            queryset = queryset.filter(**{f'{day_field}__gte': start, f'{day_field}__lte': end})
+        return queryset
+
+    rows = defaultdict(_zero)
+    for booking_model, history_model, invoice_model, status_model in SOURCES:
+        bookings = limit(booking_model.objects.all(), 'service_center_id', 'booking_date__date')
+        for center, day, n in (bookings.values_list('service_center_id', TruncDate('booking_date'))
+                               .annotate(n=Count('id')).order_by()):
+            rows[center, day]['bookings'] += n
+
+        histories = limit(
+            history_model.objects.filter(service_center__isnull=False), 'service_center_id', 'service_date',
+        )
+        for center, day, n in (histories.values_list('service_center_id', 'service_date')
+                               .annotate(n=Count('id')).order_by()):
+            rows[center, day]['services'] += n
+
+        invoices = limit(invoice_model.objects.all(), 'service_center_id', 'issue_date')
+        for center, day, n, revenue in (invoices.values_list('service_center_id', 'issue_date')
+                                        .annotate(n=Count('id'), revenue=Sum('total_amount')).order_by()):
+            rows[center, day]['invoices'] += n
+            rows[center, day]['revenue'] += revenue
+
+        completions = limit(
+            status_model.objects.filter(current_status='Completed')
+            .values('booking_id', 'booking__service_center_id', 'booking__booking_date')
+            .annotate(done=Min('updated_on')).order_by(),
+            'booking__service_center_id', 'done__date',
+        )
+        for row in completions.iterator():
+            key = (row['booking__service_center_id'], timezone.localdate(row['done']))
+            rows[key]['completed'] += 1
+            rows[key]['turnaround_seconds'] += int((row['done'] - row['booking__booking_date']).total_seconds())
+    return rows
+
+
+def _upsert(rows):
+    DailyRollup.objects.bulk_create(
+        (DailyRollup(service_center_id=center, date=day, **values) for (center, day), values in rows.items()),
+        update_conflicts=True,
+        unique_fields=['service_center', 'date'],
+        update_fields=ROLLUP_FIELDS,
+        batch_size=500,
+    )
+
+
+def _span():
+    """(first, last) day with any source rows, or None when there are none."""
+    days = []
+    for booking_model, history_model, invoice_model, status_model in SOURCES:
+        for queryset, field in (
+            (booking_model.objects.all(), 'booking_date'),
+            (history_model.objects.filter(service_center__isnull=False), 'service_date'),
+            (invoice_model.objects.all(), 'issue_date'),
+            (status_model.objects.filter(current_status='Completed'), 'updated_on'),
+        ):
+            bounds = queryset.aggregate(first=Min(field), last=Max(field))
+            days += [timezone.localdate(day) if isinstance(day, datetime) else day
+                     for day in bounds.values() if day is not None]
+    return (min(days), max(days)) if days else None
+
+
+def _rebuild():
+    """Recompute every day, committing one FULL_CHUNK_DAYS chunk at a time."""
+    span = _span()
+    with transaction.atomic():
+        # a rebuild that dies halfway is started again by the next run
+        RollupWatermark.objects.update_or_create(name=WATERMARK, defaults={'processed_until': None})
+        stale = DailyRollup.objects.all()
+        if span is not None:
+            stale = stale.exclude(date__gte=span[0], date__lte=span[1])
+        stale.delete()
+    if span is None:
+        return 0
+    written = 0
+    start, last = span
+    while start <= last:
+        end = min(start + timedelta(days=FULL_CHUNK_DAYS - 1), last)
+        with transaction.atomic():
+            rows = compute(start=start, end=end)
+            DailyRollup.objects.filter(date__gte=start, date__lte=end).delete()
+            _upsert(rows)
+        written += len(rows)
+        start = end + timedelta(days=1)
+    return written
+
+
+def refresh(full=False):
+    """Bring the rollups up to date; returns the number of (center, day) rows written."""
+    started = timezone.now()
+    mark, _ = RollupWatermark.objects.get_or_create(name=WATERMARK)
+    if full or mark.processed_until is None:
+        written = _rebuild()
+    else:
+        with transaction.atomic():
+            keys = changed_keys(mark.processed_until)
+            rows = {}
+            if keys:
+                days = [day for _, day in keys]
+                rows = compute({center for center, _ in keys}, min(days), max(days))
+                # days that no longer have any source rows go back to zero
+                for key in keys:
+                    rows.setdefault(key, _zero())
+            _upsert(rows)
+        written = len(rows)
+    RollupWatermark.objects.filter(name=WATERMARK).update(processed_until=started - WATERMARK_LAG)
+    return written
+
+
+def report(service_center, start, end):
+    """The center's rollup rows for [start, end] plus totals, from the rollup table only."""
+    days = list(
+        DailyRollup.objects.filter(service_center=service_center, date__gte=start, date__lte=end)
+        .order_by('date')
+    )
+    totals = _zero()
+    for day in days:
+        for field in ROLLUP_FIELDS:
+            totals[field] += getattr(day, field)
+    span = (end - start).days + 1
+    totals['average_ticket'] = totals['revenue'] / totals['invoices'] if totals['invoices'] else None
+    totals['bookings_per_day'] = totals['bookings'] / span
+    totals['turnaround'] = (
+        timedelta(seconds=totals['turnaround_seconds'] // totals['completed']) if totals['completed'] else None
+    )
+    return days, totals
@@ -0,0 +1,158 @@
+"""
+Per-day booking capacity.
+
+Each service center declares ``daily_capacity``; BookingSlot keeps the
+number of active (not cancelled) bookings per center per day, so checking
+a day is one lookup on the (service_center, date) unique index and the
+next free days come from the slot rows rather than from counting
+bookings. Write paths call the helpers below inside the same transaction
+as the booking write they describe.
+
+``reserve`` is the only path that enforces capacity. It takes a slot with
+a conditional ``UPDATE ... SET booked = booked + 1 WHERE booked < capacity``,
+which the database applies atomically, so concurrent submissions cannot
+both take the last slot; the first booking of a day inserts the row and
+the unique constraint settles a race between two such inserts.
+
+``release`` never takes a slot below zero. Freeing more than a slot holds
+means the slot has drifted from its bookings; that is logged to the
+``vehicle.scheduling`` logger, and ``manage.py rebuild_counters`` reports
+and repairs it from the bookings (``expected_slots``).
+"""
+import logging
+from collections import Counter
+from datetime import date, timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+
+from .models import ArchivedBooking, BookingSlot, ServiceBooking, ServiceCenter
+
+logger = logging.getLogger('vehicle.scheduling')
+
+CANCELLED = 'Cancelled'
+SEARCH_DAYS = 365
+
+
+class SlotUnavailable(Exception):
+    pass
+
+
+def _increment(service_center_id, day, count=1, capacity=None):
+    """Add ``count`` to the day's slot; with ``capacity``, only while it stays within it."""
+    slots = BookingSlot.objects.filter(service_center_id=service_center_id, date=day)
+    if capacity is not None:
+        slots = slots.filter(booked__lte=capacity - count)
+    if slots.update(booked=F('booked') + count):
+        return True
+    if capacity is not None and count > capacity:
+        return False
+    try:
+        with transaction.atomic():
+            BookingSlot.objects.create(service_center_id=service_center_id, date=day, booked=count)
+        return True
+    except IntegrityError:
+        # the row exists: either the day is full or a concurrent booking just created it
+        return bool(slots.update(booked=F('booked') + count))
+
+
+def reserve(service_center, day):
+    """Take one slot on ``day`` or raise SlotUnavailable."""
+    if not _increment(service_center.id, day, capacity=service_center.daily_capacity):
+        raise SlotUnavailable(f"{service_center} is fully booked on {day}.")
+
+
+def occupy(service_center_id, day, count=1):
+    """Add ``count`` bookings to a day without a capacity check (reopened or imported bookings)."""
+    _increment(service_center_id, day, count)
+
+
+def release(service_center_id, day, count=1):
+    """Free ``count`` bookings on a day; returns False, and logs the drift, if the slot holds fewer."""
+    if BookingSlot.objects.filter(service_center_id=service_center_id, date=day, booked__gte=count).update(
+        booked=F('booked') - count
+    ):
+        return True
+    logger.warning(
+        "Slot of service center %s on %s holds fewer than %s booking(s) to release; "
+        "run rebuild_counters to repair it.", service_center_id, day, count,
+    )
+    return False
+
+
+def booked_on(service_center, day):
+    booked = BookingSlot.objects.filter(service_center=service_center, date=day).values_list('booked', flat=True)
+    return booked.first() or 0
+
+
+def has_capacity(service_center, day):
+    return booked_on(service_center, day) < service_center.daily_capacity
+
+
+def available_dates(service_center, count, start=None):
+    """The next ``count`` days from ``start`` (default today) with a free slot."""
+    start = start or date.today()
+    if service_center.daily_capacity == 0:
+        return []
+    end = start + timedelta(days=SEARCH_DAYS)
+    full = set(
+        BookingSlot.objects.filter(
+            service_center=service_center, date__gte=start, date__lt=end,
+            booked__gte=service_center.daily_capacity,
+        ).values_list('date', flat=True)
+    )
+    days = []
+    day = start
+    while len(days) < count and day < end:
+        if day not in full:
+            days.append(day)
+        day += timedelta(days=1)
+    return days
+
+
+def booking_status_changed(booking, old_status):
+    """Cancelling frees the booking's slot; reopening takes it back regardless of capacity."""
+    if (old_status == CANCELLED) == (booking.status == CANCELLED):
+        return
+    if booking.status == CANCELLED:
+        release(booking.service_center_id, booking.scheduled_date)
+    else:
+        occupy(booking.service_center_id, booking.scheduled_date)
+
+
+def reserve_bookings(bookings):
+    """
+    Take the slots of bulk-created ``bookings`` (imports) within their
+    centers' capacity, a day at a time; raise SlotUnavailable if a day has
+    no room for all of its bookings.
+    """
+    per_day = Counter((b.service_center_id, b.scheduled_date) for b in bookings if b.status != CANCELLED)
+    capacities = dict(
+        ServiceCenter.objects.filter(id__in={center_id for center_id, _ in per_day}).values_list('id', 'daily_capacity')
+    )
+    for (service_center_id, day), count in per_day.items():
+        if not _increment(service_center_id, day, count, capacity=capacities[service_center_id]):
+            raise SlotUnavailable(f"Service center {service_center_id} is fully booked on {day}.")
+
+
+def bookings_removed(bookings):
+    """Free the slots held by ``bookings``, a queryset about to be deleted."""
+    rows = (
+        bookings.exclude(status=CANCELLED)
+        .values('service_center_id', 'scheduled_date').annotate(n=Count('id')).order_by()
+    )
+    for row in rows:
+        release(row['service_center_id'], row['scheduled_date'], row['n'])
+
+
+def expected_slots():
+    """{(service_center_id, date): active bookings}, recomputed from hot and archived bookings."""
+    slots = Counter()
+    for bookings in (ServiceBooking.objects.all(), ArchivedBooking.objects.all()):
+        rows = (
+            bookings.exclude(status=CANCELLED)
+            .values_list('service_center_id', 'scheduled_date').annotate(n=Count('id')).order_by()
+        )
+        for service_center_id, day, n in rows:
+            slots[service_center_id, day] += n
+    return slots
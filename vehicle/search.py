@@ -0,0 +1,104 @@
+"""
+Full-text search over bookings, service history and vehicles.
+
+The ``vehicle_search`` FTS5 table (vehicle.search_schema) holds one document per
+booking, history entry and vehicle: the vehicle number, make and model as
+the title, the description / details and the customer name as the body.
+Triggers on the source tables keep it in sync, so ``bulk_create`` and
+``QuerySet.update`` are covered as well as ``save()``.
+
+Each document carries owner tokens ("c<customer id>", "s<service center
+id>") in its ``owners`` column and every query requires one of them, so
+scoping a search to the user's own rows is part of the index lookup rather
+than a filter over the matches. Results are ranked with bm25, weighting
+the title above the body. SQLite only; ``manage.py rebuild_search_index``
+repopulates the table from the source views.
+"""
+import re
+
+from django.db import connection
+
+from .models import ServiceBooking, ServiceHistory, Vehicle
+from .search_schema import fill_statements
+
+BOOKING, HISTORY, VEHICLE = 1, 2, 3
+KINDS = {BOOKING: 'booking', HISTORY: 'history', VEHICLE: 'vehicle'}
+SEARCH_LIMIT = 50
+MAX_TERMS = 8
+# bm25 column weights: owners, title, body
+WEIGHTS = (0.0, 4.0, 1.0)
+
+
+def is_available():
+    return connection.vendor == 'sqlite'
+
+
+def owner_token(customer=None, service_center=None):
+    return f"c{customer.id}" if customer is not None else f"s{service_center.id}"
+
+
+def match_expression(query, owner):
+    """
+    An FTS5 query for every word of ``query`` within the owner's documents.
+    Only the last word matches as a prefix (it may still be being typed):
+    prefix terms expand to many index entries and cost far more than whole
+    words, which the porter stemmer already matches across plurals.
+    """
+    terms = re.findall(r'\w+', query.lower())[:MAX_TERMS]
+    if not terms:
+        return None
+    words = ' '.join(f'"{term}"' for term in terms) + '*'
+    return f'owners:"{owner}" AND {{title body}}:({words})'
+
+
+def ranked_ids(owner, query, limit=SEARCH_LIMIT):
+    """[(kind, object id), ...] best match first."""
+    expression = match_expression(query, owner)
+    if expression is None or not is_available():
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT rowid FROM vehicle_search WHERE vehicle_search MATCH %s "
+            "ORDER BY bm25(vehicle_search, %s, %s, %s) LIMIT %s",
+            [expression, *WEIGHTS, limit],
+        )
+        return [(rowid % 4, rowid // 4) for (rowid,) in cursor.fetchall()]
+
+
+def search(owner, query, limit=SEARCH_LIMIT):
+    """
+    Ranked [(kind name, object), ...] for ``query`` within ``owner``'s rows:
+    one FTS query, then at most one query per kind to load the objects.
+    """
+    hits = ranked_ids(owner, query, limit)
+    wanted = {kind: [pk for k, pk in hits if k == kind] for kind in KINDS}
+    loaded = {}
+    if wanted[BOOKING]:
+        loaded[BOOKING] = ServiceBooking.objects.select_related('vehicle', 'customer', 'service_center').only(
+            'id', 'scheduled_date', 'status', 'description',
+            'vehicle__vehicle_number', 'customer__name', 'service_center__name',
+        ).in_bulk(wanted[BOOKING])
+    if wanted[HISTORY]:
+        loaded[HISTORY] = ServiceHistory.objects.select_related('vehicle').only(
+            'id', 'service_date', 'details', 'cost', 'vehicle__vehicle_number',
+        ).in_bulk(wanted[HISTORY])
+    if wanted[VEHICLE]:
+        loaded[VEHICLE] = Vehicle.objects.only(
+            'id', 'vehicle_number', 'model', 'manufacturer',
+        ).in_bulk(wanted[VEHICLE])
+    return [
+        (KINDS[kind], loaded[kind][pk])
+        for kind, pk in hits
+        if pk in loaded.get(kind, {})
+    ]
+
+
+def rebuild():
+    """Repopulate the index from the source tables; returns the number of documents."""
+    with connection.cursor() as cursor:
+        cursor.execute("DELETE FROM vehicle_search")
+        for statement in fill_statements():
+            cursor.execute(statement)
+        cursor.execute("INSERT INTO vehicle_search(vehicle_search) VALUES ('optimize')")
+        cursor.execute("SELECT COUNT(*) FROM vehicle_search")
+        return cursor.fetchone()[0]
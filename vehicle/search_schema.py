@@ -0,0 +1,166 @@
+"""
+DDL for the ``vehicle_search`` full-text index (see vehicle.search).
+
+On SQLite, Django applies most field changes by rebuilding the table
+(create a copy, move the rows, drop, rename). Dropping a table drops its
+triggers, and the rename fails while a view still refers to the old
+table. A migration that alters ``vehicle_vehicle``, ``vehicle_customer``,
+``vehicle_servicebooking`` or ``vehicle_servicehistory`` must therefore
+drop the schema before its operations and create and fill it after them.
+Migrations never import this module, so that editing the DDL here never
+changes what an applied migration does. The statements are frozen once,
+in 0009_search_index, and later migrations that rebuild the index import
+them from there; a change here ships with a migration that freezes the new
+version, which later migrations then import instead. A test checks that
+the newest frozen copy matches this module. Everything here is a no-op on
+other backends, which go without the index.
+"""
+
+# Documents: rowid = object id * 4 + kind (1 booking, 2 history, 3 vehicle), so a
+# trigger can replace one document by rowid. ``owners`` holds "c<customer_id>"
+# and "s<service_center_id>" tokens that scope a query inside the index itself.
+CREATE = [
+    """
+    CREATE VIRTUAL TABLE vehicle_search USING fts5(
+        owners, title, body, tokenize = 'porter unicode61', prefix = '2 3', detail = 'column'
+    )
+    """,
+    """
+    CREATE VIEW vehicle_search_booking_docs AS
+    SELECT b.id AS id, b.id * 4 + 1 AS doc_id, b.vehicle_id AS vehicle_id, b.customer_id AS customer_id,
+           'c' || b.customer_id || ' s' || b.service_center_id AS owners,
+           v.vehicle_number || ' ' || v.manufacturer || ' ' || v.model AS title,
+           b.description || ' ' || c.name AS body
+    FROM vehicle_servicebooking b
+    JOIN vehicle_vehicle v ON v.id = b.vehicle_id
+    JOIN vehicle_customer c ON c.id = b.customer_id
+    """,
+    """
+    CREATE VIEW vehicle_search_history_docs AS
+    SELECT h.id AS id, h.id * 4 + 2 AS doc_id, h.vehicle_id AS vehicle_id, h.customer_id AS customer_id,
+           'c' || h.customer_id || COALESCE(' s' || h.service_center_id, '') AS owners,
+           v.vehicle_number || ' ' || v.manufacturer || ' ' || v.model AS title,
+           h.details || ' ' || c.name AS body
+    FROM vehicle_servicehistory h
+    JOIN vehicle_vehicle v ON v.id = h.vehicle_id
+    JOIN vehicle_customer c ON c.id = h.customer_id
+    """,
+    """
+    CREATE VIEW vehicle_search_vehicle_docs AS
+    SELECT v.id AS id, v.id * 4 + 3 AS doc_id, v.id AS vehicle_id, v.customer_id AS customer_id,
+           'c' || v.customer_id AS owners,
+           v.vehicle_number || ' ' || v.manufacturer || ' ' || v.model AS title,
+           c.name AS body
+    FROM vehicle_vehicle v
+    JOIN vehicle_customer c ON c.id = v.customer_id
+    """,
+]
+
+# (table, kind view, columns whose change re-indexes the row)
+DOCUMENT_TABLES = [
+    ('vehicle_servicebooking', 'booking', 1, ['description', 'vehicle_id', 'customer_id', 'service_center_id']),
+    ('vehicle_servicehistory', 'history', 2, ['details', 'vehicle_id', 'customer_id', 'service_center_id']),
+    ('vehicle_vehicle', 'vehicle', 3, ['vehicle_number', 'manufacturer', 'model', 'customer_id']),
+]
+
+
+def _insert(kind, where):
+    return (
+        f"INSERT INTO vehicle_search(rowid, owners, title, body) "
+        f"SELECT doc_id, owners, title, body FROM vehicle_search_{kind}_docs WHERE {where};"
+    )
+
+
+def _delete(kind_number, where):
+    return f"DELETE FROM vehicle_search WHERE rowid IN (SELECT id * 4 + {kind_number} FROM {where});"
+
+
+for table, kind, number, columns in DOCUMENT_TABLES:
+    changed = " OR ".join(f"OLD.{c} IS NOT NEW.{c}" for c in columns)
+    CREATE += [
+        f"CREATE TRIGGER {table}_search_ai AFTER INSERT ON {table} BEGIN {_insert(kind, 'id = NEW.id')} END",
+        f"""
+        CREATE TRIGGER {table}_search_au AFTER UPDATE ON {table} WHEN {changed} BEGIN
+            DELETE FROM vehicle_search WHERE rowid = OLD.id * 4 + {number};
+            {_insert(kind, 'id = NEW.id')}
+        END
+        """,
+        f"CREATE TRIGGER {table}_search_ad AFTER DELETE ON {table} BEGIN "
+        f"DELETE FROM vehicle_search WHERE rowid = OLD.id * 4 + {number}; END",
+    ]
+
+# Vehicle and customer fields are copied into other documents: refresh those too.
+CREATE += [
+    f"""
+    CREATE TRIGGER vehicle_vehicle_search_related_au AFTER UPDATE ON vehicle_vehicle
+    WHEN OLD.vehicle_number IS NOT NEW.vehicle_number OR OLD.manufacturer IS NOT NEW.manufacturer
+         OR OLD.model IS NOT NEW.model
+    BEGIN
+        {_delete(1, 'vehicle_servicebooking WHERE vehicle_id = NEW.id')}
+        {_insert('booking', 'vehicle_id = NEW.id')}
+        {_delete(2, 'vehicle_servicehistory WHERE vehicle_id = NEW.id')}
+        {_insert('history', 'vehicle_id = NEW.id')}
+    END
+    """,
+    f"""
+    CREATE TRIGGER vehicle_customer_search_au AFTER UPDATE ON vehicle_customer
+    WHEN OLD.name IS NOT NEW.name
+    BEGIN
+        {_delete(1, 'vehicle_servicebooking WHERE customer_id = NEW.id')}
+        {_insert('booking', 'customer_id = NEW.id')}
+        {_delete(2, 'vehicle_servicehistory WHERE customer_id = NEW.id')}
+        {_insert('history', 'customer_id = NEW.id')}
+        {_delete(3, 'vehicle_vehicle WHERE customer_id = NEW.id')}
+        {_insert('vehicle', 'customer_id = NEW.id')}
+    END
+    """,
+]
+
+DROP = [
+    "DROP TRIGGER IF EXISTS vehicle_customer_search_au",
+    "DROP TRIGGER IF EXISTS vehicle_vehicle_search_related_au",
+] + [
+    f"DROP TRIGGER IF EXISTS {table}_search_{suffix}"
+    for table, _, _, _ in DOCUMENT_TABLES for suffix in ('ai', 'au', 'ad')
+] + [
+    "DROP VIEW IF EXISTS vehicle_search_booking_docs",
+    "DROP VIEW IF EXISTS vehicle_search_history_docs",
+    "DROP VIEW IF EXISTS vehicle_search_vehicle_docs",
+    "DROP TABLE IF EXISTS vehicle_search",
+]
+
+
+def _applies(schema_editor):
+    return schema_editor.connection.vendor == 'sqlite'
+
+
+def create_schema(apps, schema_editor):
+    if _applies(schema_editor):
+        for statement in CREATE:
+            schema_editor.execute(statement)
+
+
+def drop_schema(apps, schema_editor):
+    if _applies(schema_editor):
+        for statement in DROP:
+            schema_editor.execute(statement)
+
+
+def fill_statements():
+    return [
+        f"INSERT INTO vehicle_search(rowid, owners, title, body) "
+        f"SELECT doc_id, owners, title, body FROM vehicle_search_{kind}_docs"
+        for kind in ('booking', 'history', 'vehicle')
+    ]
+
+
+def fill(apps, schema_editor):
+    """Index every existing row (the table must be empty)."""
+    if _applies(schema_editor):
+        for statement in fill_statements():
+            schema_editor.execute(statement)
+
+
+def create_and_fill(apps, schema_editor):
+    create_schema(apps, schema_editor)
+    fill(apps, schema_editor)
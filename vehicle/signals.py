@@ -0,0 +1,62 @@
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import dashboard_cache, timing
+from .models import Invoice, ServiceBooking, ServiceStatus, Staff, Vehicle
+
+
+def _invalidate_booking_owners(booking_id, booking=None):
+    if booking is None:
+        owners = ServiceBooking.objects.filter(pk=booking_id).values_list('customer_id', 'service_center_id').first()
+        if owners is None:
+            return
+        customer_id, service_center_id = owners
+    else:
+        customer_id, service_center_id = booking.customer_id, booking.service_center_id
+    dashboard_cache.invalidate('customer', customer_id)
+    dashboard_cache.invalidate('servicecenter', service_center_id)
+
+
+def _is_cascade(instance, origin):
+    # Rows removed by a cascade are covered by the booking/vehicle that started it.
+    return origin is not None and origin is not instance
+
+
+@receiver([post_save, post_delete], sender=ServiceBooking)
+def booking_changed(sender, instance, **kwargs):
+    _invalidate_booking_owners(instance.pk, instance)
+
+
+@receiver(post_save, sender=Vehicle)
+def vehicle_saved(sender, instance, created, **kwargs):
+    dashboard_cache.invalidate('customer', instance.customer_id)
+    if not created:
+        # the vehicle number is shown on the booking tables of centers it was booked at
+        centers = ServiceBooking.objects.filter(vehicle=instance).values_list('service_center_id', flat=True)
+        for service_center_id in set(centers):
+            dashboard_cache.invalidate('servicecenter', service_center_id)
+
+
+@receiver(post_delete, sender=Vehicle)
+def vehicle_deleted(sender, instance, **kwargs):
+    dashboard_cache.invalidate('customer', instance.customer_id)
+
+
+@receiver([post_save, post_delete], sender=Staff)
+def staff_changed(sender, instance, **kwargs):
+    dashboard_cache.invalidate('servicecenter', instance.service_center_id)
+
+
+@receiver([post_save, post_delete], sender=ServiceStatus)
+@receiver([post_save, post_delete], sender=Invoice)
+def booking_detail_changed(sender, instance, origin=None, **kwargs):
+    if _is_cascade(instance, origin):
+        return
+    booking = instance.booking if sender.booking.is_cached(instance) else None
+    _invalidate_booking_owners(instance.booking_id, booking)
+
+
+@receiver(connection_created)
+def instrument_connection(sender, connection, **kwargs):
+    timing.instrument(connection)
@@ -0,0 +1,402 @@
+"""
+Synthetic data at production scale.
+
+``manage.py generate_data`` adds service centers with their staff and
+customers with their vehicles, bookings (with status trails, job
+assignments, invoices and service history) and reminders, plus the rows
+derived from them: booking slots, dashboard counters, daily rollups and
+the search index.
+
+Primary keys are assigned up front from each table's current maximum, and
+everything about a customer (its user, vehicles, bookings and their rows)
+is computed from the customer's position and a per-chunk random stream
+seeded from ``--seed``. Chunks of customers are therefore independent:
+they can be generated in any order, by any number of processes, and the
+same seed always gives the same rows. Statuses, assignments, invoices and
+histories get contiguous id ranges per chunk, so ids have gaps only
+between chunks.
+
+Rows are written with one prepared INSERT per table run through
+``executemany``: bulk_create compiles SQL for every batch of a few hundred
+rows, which costs more than the writes themselves. Timestamps are part of
+the data (booking dates before scheduled dates, status trails, invoice
+dates) and are written as they were set; ``auto_now``/``auto_now_add``
+never run. Every user shares one password hash, computed once instead of
+hashing per user. On SQLite the search triggers are dropped during the
+load and the index is rebuilt at the end, and the load runs with
+``synchronous=OFF`` and an in-memory rollback journal: a crash part way
+through can corrupt the database, which is acceptable for generated data.
+
+Throughput is bound by building the rows in Python, not by the writes:
+one worker produces about 15k rows/s on SQLite (measured on one core).
+A booking comes with about 6.7 rows (its status trail, assignment,
+invoice and history), so 10M bookings are some 67M rows, well over an
+hour for one worker. Workers build chunks in parallel on separate cores
+but SQLite takes one writer at a time, so they help until the writes
+themselves are the bottleneck.
+"""
+import math
+import multiprocessing
+import random
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from operator import attrgetter
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.color import no_style
+from django.db import DEFAULT_DB_ALIAS, connection, connections, transaction
+from django.db.models import Count, Max
+from django.utils import timezone
+
+from . import archive, rollups, search, search_schema
+from .counters import compute_counts
+from .models import (
+    BookingSlot, Customer, DashboardCounter, Invoice, JobAssignment, ReminderOffer, ServiceBooking, ServiceCenter,
+    ServiceHistory, ServiceStatus, Staff, Vehicle,
+)
+
+MODELS = [User, ServiceCenter, Customer, Staff, Vehicle, ServiceBooking, ServiceStatus, JobAssignment, Invoice,
+          ServiceHistory, ReminderOffer]
+CHUNK_CUSTOMERS = 2000
+BATCH_SIZE = 2000
+PLAIN_TYPES = {'AutoField', 'BigAutoField', 'IntegerField', 'BigIntegerField', 'PositiveIntegerField',
+               'SmallIntegerField', 'PositiveSmallIntegerField', 'CharField', 'TextField', 'BooleanField'}
+# a lost write is no loss while generating; restored when the load ends
+FAST_PRAGMAS = {'synchronous': 'OFF', 'journal_mode': 'MEMORY'}
+STAFF_PER_CENTER = 10
+# statuses are written per booking; a trail is at most this long
+MAX_TRAIL = 3
+DEFAULT_PASSWORD = 'synthetic'
+
+STATES = ['KA', 'MH', 'TN', 'DL', 'UP', 'GJ', 'RJ', 'KL', 'TS', 'WB']
+CITIES = ['Bengaluru', 'Mumbai', 'Chennai', 'Delhi', 'Lucknow', 'Ahmedabad', 'Jaipur', 'Kochi', 'Hyderabad',
+          'Kolkata']
+FIRST_NAMES = ['Aarav', 'Diya', 'Ishaan', 'Kavya', 'Rohan', 'Ananya', 'Vikram', 'Meera', 'Arjun', 'Nisha',
+               'Kabir', 'Priya', 'Aditya', 'Sneha', 'Rahul', 'Pooja']
+LAST_NAMES = ['Sharma', 'Iyer', 'Patel', 'Reddy', 'Nair', 'Gupta', 'Singh', 'Rao', 'Menon', 'Das', 'Khan',
+              'Joshi']
+MAKES = [('Maruti', 'Swift'), ('Maruti', 'Baleno'), ('Hyundai', 'i20'), ('Hyundai', 'Creta'), ('Tata', 'Nexon'),
+         ('Tata', 'Punch'), ('Honda', 'City'), ('Toyota', 'Innova'), ('Mahindra', 'XUV700'), ('Kia', 'Seltos')]
+FUELS = ['Petrol', 'Petrol', 'Petrol', 'Diesel', 'Diesel', 'CNG', 'Electric']
+JOBS = ['Periodic service', 'Oil change', 'Brake pads replaced', 'Clutch overhaul', 'Wheel alignment',
+        'Battery replacement', 'AC gas refill', 'Suspension check', 'Engine tuning', 'Tyre rotation']
+ROLES = ['Mechanic', 'Mechanic', 'Mechanic', 'Technician', 'Electrician', 'Service Advisor', 'Manager']
+
+
+class Plan:
+    """What to generate and the first primary key of every table; picklable for worker processes."""
+
+    def __init__(self, centers, customers, vehicles, bookings, seed=0, days=730, password_hash=None, today=None):
+        self.centers = centers
+        self.customers = customers
+        self.vehicles = vehicles        # per customer
+        self.bookings = bookings        # per vehicle
+        self.seed = seed
+        self.days = days                # bookings are scheduled over this many days up to today (+30)
+        self.password_hash = password_hash or make_password(DEFAULT_PASSWORD)
+        self.today = today or timezone.localdate()
+        # archived rows keep their ids, so new ids start past those too
+        self.base = {
+            model: max(
+                (source.objects.aggregate(top=Max('id'))['top'] or 0)
+                for source in (model, archive.ARCHIVED.get(model, model))
+            ) + 1
+            for model in MODELS
+        }
+        self.center_ids = [self.base[ServiceCenter] + i for i in range(centers)]
+        # enough daily capacity that the generated load fits, with room for new bookings
+        per_day = customers * vehicles * bookings / max(centers, 1) / (days + 30)
+        self.daily_capacity = max(20, math.ceil(per_day * 2))
+
+    @property
+    def chunks(self):
+        return math.ceil(self.customers / CHUNK_CUSTOMERS)
+
+    def staff_ids(self, center_index):
+        first = self.base[Staff] + center_index * STAFF_PER_CENTER
+        return range(first, first + STAFF_PER_CENTER)
+
+
+def insert(model, objects):
+    """
+    INSERT ``objects`` with their ids and timestamps as set, through one
+    prepared statement. No ``pre_save``, no signals, like bulk_create.
+    """
+    # the real connection: every attribute lookup on the ``connection`` proxy goes through a thread-local
+    db = connections[DEFAULT_DB_ALIAS]
+    ops = db.ops
+    fields = model._meta.concrete_fields
+    sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+        ops.quote_name(model._meta.db_table),
+        ', '.join(ops.quote_name(field.column) for field in fields),
+        ', '.join(['%s'] * len(fields)),
+    )
+    values = attrgetter(*(field.attname for field in fields))
+    # ints and strings go to the driver as they are; only dates, decimals and the like need preparing
+    prepare = [
+        (i, field.get_db_prep_save) for i, field in enumerate(fields)
+        if (field.target_field if field.is_relation else field).get_internal_type() not in PLAIN_TYPES
+    ]
+    rows = []
+    for obj in objects:
+        row = list(values(obj))
+        for i, prep in prepare:
+            row[i] = prep(row[i], db)
+        rows.append(row)
+    with db.cursor() as cursor:
+        cursor.executemany(sql, rows)
+
+
+def _pragmas(values):
+    """
+    Set SQLite PRAGMAs on this process's connection; returns their previous
+    values. Left alone inside a transaction, where SQLite refuses them.
+    """
+    if connection.vendor != 'sqlite' or connection.in_atomic_block:
+        return {}
+    with connection.cursor() as cursor:
+        previous = {}
+        for name, value in values.items():
+            previous[name] = cursor.execute(f'PRAGMA {name}').fetchone()[0]
+            cursor.execute(f'PRAGMA {name} = {value}')
+    return previous
+
+
+def _at(day, rng, start_hour=8, end_hour=19):
+    """An aware datetime on ``day`` during working hours."""
+    moment = datetime.combine(day, time(rng.randrange(start_hour, end_hour), rng.randrange(60)))
+    # the default zone is cached; looking up the current one goes through a thread-local every time
+    return timezone.make_aware(moment, timezone.get_default_timezone())
+
+
+def plate(vehicle_id, rng):
+    """A unique, plausible number plate ("KA 05 MX 1234") derived from the vehicle id."""
+    serial, rest = vehicle_id % 10000, vehicle_id // 10000
+    district, rest = rest % 100, rest // 100
+    letters = chr(65 + rest // 26 % 26) + chr(65 + rest % 26)
+    return f"{rng.choice(STATES)} {district:02d} {letters} {serial:04d}"
+
+
+def create_centers(plan):
+    """The centers, their users and staff; run once before the chunks."""
+    rng = random.Random(f'{plan.seed}-centers')
+    users, centers, staff = [], [], []
+    for index, center_id in enumerate(plan.center_ids):
+        user_id = plan.base[User] + index
+        city = rng.choice(CITIES)
+        joined = plan.today - timedelta(days=plan.days + 30 + rng.randrange(365))
+        users.append(User(id=user_id, username=f'center{center_id}', password=plan.password_hash,
+                          date_joined=timezone.make_aware(datetime.combine(joined, time(9)))))
+        registered = timezone.make_aware(datetime.combine(joined, time(9)))
+        centers.append(ServiceCenter(
+            id=center_id, user_id=user_id, name=f'{city} Auto Care {center_id}',
+            address=f'{rng.randrange(1, 500)} Ring Road, {city}', phone=f'9{center_id:09d}',
+            email=f'center{center_id}@example.test', daily_capacity=plan.daily_capacity,
+            registration_date=registered, updated_at=registered,
+        ))
+        for staff_id in plan.staff_ids(index):
+            name = f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}'
+            staff.append(Staff(id=staff_id, service_center_id=center_id, name=name, role=rng.choice(ROLES),
+                               phone=f'8{staff_id:09d}', email=f'staff{staff_id}@example.test', date_joined=joined))
+    with transaction.atomic():
+        insert(User, users)
+        insert(ServiceCenter, centers)
+        insert(Staff, staff)
+    return len(centers), len(staff)
+
+
+def _booking_rows(plan, rng, booking, center_index, ids):
+    """Status trail, assignment, invoice and history for one booking; fills in its status and dates."""
+    day = booking.scheduled_date
+    booked_at = _at(day - timedelta(days=rng.randint(1, 21)), rng)
+    age = (plan.today - day).days
+    if age < 0:
+        status = 'Cancelled' if rng.random() < 0.05 else 'Pending'
+    elif age < 3:
+        status = rng.choice(['Pending', 'In Progress', 'In Progress', 'Completed'])
+    else:
+        status = rng.choices(['Completed', 'Cancelled', 'In Progress'], [85, 12, 3])[0]
+
+    trail = [('Pending', booked_at)]
+    if status == 'Cancelled':
+        trail.append(('Cancelled', booked_at + timedelta(hours=rng.randint(1, 24 * 7))))
+    elif status in ('In Progress', 'Completed'):
+        started = _at(day, rng, 9, 12)
+        trail.append(('In Progress', started))
+        if status == 'Completed':
+            trail.append(('Completed', started + timedelta(hours=rng.randint(2, 72))))
+    booking.status = status
+    booking.booking_date = booked_at
+    booking.updated_at = trail[-1][1]
+
+    rows = {ServiceStatus: [
+        ServiceStatus(id=next(ids[ServiceStatus]), booking_id=booking.id, current_status=name, updated_on=at,
+                      remarks='' if name == 'Pending' else f'{name} by workshop')
+        for name, at in trail
+    ]}
+    if status in ('In Progress', 'Completed'):
+        rows[JobAssignment] = [JobAssignment(
+            id=next(ids[JobAssignment]), booking_id=booking.id,
+            staff_id=rng.choice(plan.staff_ids(center_index)), assigned_date=day,
+        )]
+    if status == 'Completed':
+        done = timezone.localdate(trail[-1][1])
+        cost = Decimal(int(rng.lognormvariate(8.3, 0.6))).quantize(Decimal('1.00'))
+        paid = rng.random() < (0.9 if (plan.today - done).days > 30 else 0.5)
+        rows[Invoice] = [Invoice(id=next(ids[Invoice]), booking_id=booking.id,
+                                 service_center_id=booking.service_center_id, total_amount=cost,
+                                 issue_date=done, payment_status='Paid' if paid else 'Unpaid',
+                                 updated_at=trail[-1][1])]
+        rows[ServiceHistory] = [ServiceHistory(
+            id=next(ids[ServiceHistory]), customer_id=booking.customer_id,
+            service_center_id=booking.service_center_id, vehicle_id=booking.vehicle_id, booking_id=booking.id,
+            service_date=done, details=booking.description, cost=cost, updated_at=trail[-1][1],
+        )]
+    return rows
+
+
+def generate_chunk(plan, chunk):
+    """Write customers [chunk * CHUNK_CUSTOMERS, ...) with everything under them; returns row counts."""
+    rng = random.Random(f'{plan.seed}-{chunk}')
+    first = chunk * CHUNK_CUSTOMERS
+    last = min(first + CHUNK_CUSTOMERS, plan.customers)
+    first_booking = first * plan.vehicles * plan.bookings
+    # contiguous ids per chunk for the tables with a variable number of rows per booking
+    ids = {
+        ServiceStatus: iter(range(plan.base[ServiceStatus] + first_booking * MAX_TRAIL, 2 ** 62)),
+        JobAssignment: iter(range(plan.base[JobAssignment] + first_booking, 2 ** 62)),
+        Invoice: iter(range(plan.base[Invoice] + first_booking, 2 ** 62)),
+        ServiceHistory: iter(range(plan.base[ServiceHistory] + first_booking, 2 ** 62)),
+    }
+    rows = {model: [] for model in MODELS}
+    start = plan.today - timedelta(days=plan.days)
+
+    for index in range(first, last):
+        customer_id = plan.base[Customer] + index
+        user_id = plan.base[User] + plan.centers + index
+        city = rng.choice(CITIES)
+        name = f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}'
+        joined = timezone.make_aware(datetime.combine(start - timedelta(days=rng.randrange(365)), time(10)),
+                                     timezone.get_default_timezone())
+        rows[User].append(User(id=user_id, username=f'customer{customer_id}', password=plan.password_hash,
+                               first_name=name.split()[0], last_name=name.split()[1], date_joined=joined))
+        rows[Customer].append(Customer(
+            id=customer_id, user_id=user_id, name=name, address=f'{rng.randrange(1, 999)} Main Road, {city}',
+            phone=f'7{customer_id:09d}', email=f'customer{customer_id}@example.test', registration_date=joined,
+            updated_at=joined,
+        ))
+        home = rng.randrange(plan.centers)
+        if rng.random() < 0.3:
+            rows[ReminderOffer].append(ReminderOffer(
+                id=plan.base[ReminderOffer] + index, service_center_id=plan.center_ids[home],
+                customer_id=customer_id, title='Service due', message=f'Hi {name}, your vehicle is due for service.',
+                sent_date=joined + timedelta(days=rng.randrange(30, 365)),
+                delivered_on=joined + timedelta(days=rng.randrange(30, 365)),
+            ))
+
+        for v in range(plan.vehicles):
+            vehicle_index = index * plan.vehicles + v
+            vehicle_id = plan.base[Vehicle] + vehicle_index
+            number = plate(vehicle_id, rng)
+            manufacturer, model = rng.choice(MAKES)
+            rows[Vehicle].append(Vehicle(
+                id=vehicle_id, customer_id=customer_id, vehicle_number=number, plate_key=number.replace(' ', ''),
+                model=model, manufacturer=manufacturer, year=rng.randint(2008, plan.today.year),
+                fuel_type=rng.choice(FUELS), registration_date=joined.date(), updated_at=joined,
+            ))
+            for b in range(plan.bookings):
+                # most visits go to the customer's usual center
+                center_index = home if rng.random() < 0.8 else rng.randrange(plan.centers)
+                booking = ServiceBooking(
+                    id=plan.base[ServiceBooking] + vehicle_index * plan.bookings + b,
+                    customer_id=customer_id, vehicle_id=vehicle_id, service_center_id=plan.center_ids[center_index],
+                    scheduled_date=start + timedelta(days=rng.randrange(plan.days + 30)),
+                    description=rng.choice(JOBS),
+                )
+                for model, extra in _booking_rows(plan, rng, booking, center_index, ids).items():
+                    rows[model].extend(extra)
+                rows[ServiceBooking].append(booking)
+
+    with transaction.atomic():
+        for model in MODELS:
+            if rows[model]:
+                insert(model, rows[model])
+    return {model._meta.label: len(rows[model]) for model in MODELS if rows[model]}
+
+
+def _init_worker():
+    # on SQLite the workers take turns writing; wait for the lock rather than fail after 5 seconds
+    for alias in connections:
+        if connections[alias].vendor == 'sqlite':
+            connections[alias].settings_dict.setdefault('OPTIONS', {})['timeout'] = 600
+    _pragmas(FAST_PRAGMAS)
+
+
+def derive(plan):
+    """Slots, counters and rollups for the generated rows."""
+    new = ServiceBooking.objects.filter(service_center_id__in=plan.center_ids)
+    BookingSlot.objects.bulk_create(
+        (BookingSlot(service_center_id=row['service_center_id'], date=row['scheduled_date'], booked=row['n'])
+         for row in new.exclude(status='Cancelled').values('service_center_id', 'scheduled_date')
+         .annotate(n=Count('id')).order_by().iterator()),
+        batch_size=BATCH_SIZE,
+    )
+    counts = compute_counts(plan.center_ids)
+    DashboardCounter.objects.bulk_create(
+        DashboardCounter(service_center_id=center_id, **counts[center_id]) for center_id in plan.center_ids
+    )
+    rollups.refresh(full=True)
+
+
+def _execute(statements):
+    with connection.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+
+
+def reset_sequences():
+    """Move the id sequences past the pre-assigned keys (nothing to do on SQLite)."""
+    _execute(connection.ops.sequence_reset_sql(no_style(), MODELS))
+
+
+def generate(plan, workers=1, progress=None):
+    """Generate everything in ``plan``; returns {model label: rows written}."""
+    totals = {}
+
+    def add(counts):
+        for label, n in counts.items():
+            totals[label] = totals.get(label, 0) + n
+        if progress:
+            progress(totals)
+
+    previous = _pragmas(FAST_PRAGMAS)
+    centers, staff = create_centers(plan)
+    add({ServiceCenter._meta.label: centers, Staff._meta.label: staff, User._meta.label: centers})
+
+    if search.is_available():
+        # row-by-row index triggers would dominate the load; the index is rebuilt afterwards
+        _execute(search_schema.DROP)
+    try:
+        if workers > 1:
+            # forked workers open their own connections
+            connections.close_all()
+            context = multiprocessing.get_context('fork')
+            with context.Pool(workers, initializer=_init_worker) as pool:
+                for counts in pool.imap_unordered(_generate_chunk, [(plan, chunk) for chunk in range(plan.chunks)]):
+                    add(counts)
+        else:
+            for chunk in range(plan.chunks):
+                add(generate_chunk(plan, chunk))
+    finally:
+        reset_sequences()
+        if search.is_available():
+            _execute(search_schema.CREATE)
+            search.rebuild()
+        _pragmas(previous)
+    derive(plan)
+    return totals
+
+
+def _generate_chunk(args):
+    return generate_chunk(*args)
@@ -1,3 +1,2300 @@
-from django.test import TestCase
+from datetime import date, timedelta
+from decimal import Decimal
+from io import StringIO
+import importlib
+import json
+import os
+import re
+import smtplib
+import socketserver
+import tempfile
+import threading
+import zipfile
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection, connections, transaction
+from django.db.models import F
+from django.test.utils import CaptureQueriesContext
+from django.test import AsyncClient, TestCase, TransactionTestCase, override_settings
+from django.urls import URLPattern, reverse
+from django.utils import timezone
+from django.utils.http import http_date
+
+from . import (
+    archive, assignment, async_views, benchmarks, bulk_import, changes, counters, dashboard_cache, db_router, invoices,
+    reminders, rollups, scheduling, search, search_schema, synthetic, timing, transitions, urls as vehicle_urls, views,
+)
+from .models import (
+    ServiceCenter, Customer, Vehicle, Staff,
+    ServiceBooking, JobAssignment, ServiceStatus,
+    Invoice, ServiceHistory, DashboardCounter, ReminderOffer, BookingSlot, DailyRollup, RollupWatermark,
+    ArchivedAssignment, ArchivedBooking, ArchivedInvoice, ArchivedStatus, ChangeLog,
+)
+
+
+# ---------------------------
+# Test data helpers
+# ---------------------------
+def make_customer(username):
+    user = User.objects.create_user(username=username, password="pass12345")
+    customer = Customer.objects.create(
+        user=user, name=username.title(), address="1 Road", phone="555", email=f"{username}@example.com"
+    )
+    return customer
+
+
+def make_servicecenter(username):
+    user = User.objects.create_user(username=username, password="pass12345")
+    center = ServiceCenter.objects.create(
+        user=user, name=username.title(), address="2 Road", phone="555", email=f"{username}@example.com"
+    )
+    return center
+
+
+def make_vehicle(customer, number):
+    return Vehicle.objects.create(
+        customer=customer, vehicle_number=number, model="Swift",
+        manufacturer="Maruti", year=2020, fuel_type="Petrol",
+    )
+
+
+def make_booking(customer, vehicle, center, status="Pending"):
+    booking = ServiceBooking.objects.create(
+        customer=customer, vehicle=vehicle, service_center=center,
+        scheduled_date=date.today() + timedelta(days=1), description="General service", status=status,
+    )
+    if status != "Cancelled":
+        scheduling.occupy(center.id, booking.scheduled_date)  # as the booking views do
+    return booking
+
+
+def make_history(booking):
+    return ServiceHistory.objects.create(
+        customer=booking.customer, service_center=booking.service_center, vehicle=booking.vehicle,
+        booking=booking, service_date=date.today(), details="Oil change", cost=Decimal("1500.00"),
+    )
+
+
+class ServiceDataMixin:
+    """A customer and a service center sharing a handful of bookings."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = make_customer("alice")
+        cls.center = make_servicecenter("autofix")
+        cls.staff = Staff.objects.create(
+            service_center=cls.center, name="Bob", role="Mechanic", phone="555", email="bob@example.com"
+        )
+        cls.vehicles = [make_vehicle(cls.customer, f"KA01AB{i:04d}") for i in range(3)]
+        cls.spare_vehicle = make_vehicle(cls.customer, "KA01ZZ9999")
+        cls.bookings = [make_booking(cls.customer, v, cls.center) for v in cls.vehicles]
+        for booking in cls.bookings:
+            make_history(booking)
+            ServiceStatus.objects.create(booking=booking, current_status="Pending")
+            JobAssignment.objects.create(booking=booking, staff=cls.staff)
+        counters.counters_for(cls.center)
+
+    def make_invoice(self, booking=None, payment_status="Paid"):
+        return Invoice.objects.create(
+            booking=booking or self.bookings[0], service_center=self.center, total_amount=Decimal("1500.00"),
+            payment_status=payment_status,
+        )
+
+    def use_temporary_document_dir(self):
+        """Render invoice documents (vehicle.invoices) into a directory removed after the test."""
+        self.enterContext(override_settings(INVOICE_DOCUMENT_DIR=self.enterContext(tempfile.TemporaryDirectory())))
+
+    def add_rows(self, count):
+        """Add more bookings/history so N+1 patterns would change the query count."""
+        for i in range(count):
+            vehicle = make_vehicle(self.customer, f"MH12CD{i:04d}")
+            make_history(make_booking(self.customer, vehicle, self.center))
+
+
+# ---------------------------
+# Query-count regression tests
+# ---------------------------
+# (url name, kwargs factory, who is logged in, expected queries)
+# Every named route in vehicle/urls.py must appear here.
+QUERY_BUDGETS = [
+    ("home", None, None, 0),
+    ("register_customer", None, None, 0),
+    ("register_servicecenter", None, None, 0),
+    ("login", None, None, 0),
+    ("logout", None, "customer", 4),
+    ("customer_dashboard", None, "customer", 4),
+    ("servicecenter_dashboard", None, "center", 5),
+    ("dashboard_cache_stats", None, None, 0),
+    ("view_vehicle", None, "customer", 3),
+    ("add_vehicle", None, "customer", 2),
+    ("edit_vehicle", lambda t: {"pk": t.vehicles[0].pk}, "customer", 3),
+    ("delete_vehicle", lambda t: {"pk": t.spare_vehicle.pk}, "customer", 16),
+    ("booking_service", None, "customer", 4),
+    ("view_bookings", None, "center", 3),
+    ("booking_detail", lambda t: {"pk": t.bookings[0].pk}, "customer", 5),
+    ("booking_details", None, "center", 2),
+    ("add_staff", None, "center", 2),
+    ("send_reminders", None, "center", 2),
+    ("revenue_report", None, "center", 3),
+    ("assign_job", lambda t: {"booking_id": t.bookings[0].pk}, "center", 5),
+    ("auto_assign", lambda t: {"booking_id": t.bookings[0].pk}, "center", 0),
+    ("auto_assign_pending", None, "center", 0),
+    ("update_booking_status", lambda t: {"pk": t.bookings[0].pk}, "center", 3),
+    ("bulk_update_status", None, "center", 3),
+    ("generate_invoice", lambda t: {"booking_id": t.bookings[0].pk}, "center", 3),
+    ("view_history", None, "customer", 3),
+    ("record_history", None, "customer", 4),
+    ("record_history_booking", lambda t: {"booking_id": t.bookings[0].pk}, "customer", 4),
+    ("export_history", None, "customer", 2),
+    ("export_invoices", None, "center", 2),
+    ("invoice_document", lambda t: {"pk": t.make_invoice().pk}, "center", 3),
+    ("search_records", None, "customer", 2),
+    ("api_bookings", None, "center", 4),
+    ("api_booking_statuses", lambda t: {"pk": t.bookings[0].pk}, "customer", 5),
+    ("api_vehicles", None, "customer", 4),
+    ("api_plate_autocomplete", None, "center", 2),
+    ("api_history", None, "customer", 4),
+    ("api_available_dates", lambda t: {"pk": t.center.pk}, "customer", 4),
+    ("api_changes", None, "center", 3),
+]
+
+
+class QueryCountTests(ServiceDataMixin, TestCase):
+
+    def setUp(self):
+        dashboard_cache.get_cache().clear()
+        self.use_temporary_document_dir()
+
+    def login_as(self, who):
+        if who == "customer":
+            self.client.force_login(self.customer.user)
+        elif who == "center":
+            self.client.force_login(self.center.user)
+
+    def test_every_route_has_a_budget(self):
+        names = {p.name for p in vehicle_urls.urlpatterns if isinstance(p, URLPattern)}
+        self.assertEqual(names, {name for name, *_ in QUERY_BUDGETS})
+
+    def test_query_counts(self):
+        for name, kwargs, who, expected in QUERY_BUDGETS:
+            with self.subTest(url=name):
+                self.login_as(who)
+                url = reverse(name, kwargs=kwargs(self) if kwargs else None)
+                with self.assertNumQueries(expected):
+                    self.client.get(url)
+                self.client.logout()
+
+    def test_list_views_do_not_grow_with_rows(self):
+        cases = [
+            ("customer_dashboard", "customer", 4),
+            ("servicecenter_dashboard", "center", 5),
+            ("view_bookings", "customer", 3),
+            ("view_bookings", "center", 3),
+            ("view_history", "customer", 3),
+            ("view_vehicle", "customer", 3),
+            ("record_history", "customer", 4),
+        ]
+        self.add_rows(5)
+        for name, who, expected in cases:
+            with self.subTest(url=name, user=who):
+                self.login_as(who)
+                with self.assertNumQueries(expected):
+                    response = self.client.get(reverse(name))
+                self.assertEqual(response.status_code, 200)
+                self.client.logout()
+
+
+# ---------------------------
+# Keyset pagination
+# ---------------------------
+class KeysetPaginationTests(ServiceDataMixin, TestCase):
+
+    def setUp(self):
+        self.add_rows(4)
+        self.client.force_login(self.center.user)
+
+    def walk(self, url_name, context_name, **params):
+        seen = []
+        response = self.client.get(reverse(url_name), params)
+        while True:
+            page = response.context[context_name]
+            seen.extend(obj.pk for obj in page)
+            if not page.has_next:
+                return seen, page
+            response = self.client.get(reverse(url_name) + "?" + page.next_query)
+
+    def test_pages_cover_every_booking_once_newest_first(self):
+        seen, _ = self.walk("view_bookings", "bookings", size=2)
+        expected = list(
+            ServiceBooking.objects.filter(service_center=self.center)
+            .order_by("-booking_date", "-id").values_list("pk", flat=True)
+        )
+        self.assertEqual(seen, expected)
+
+    def test_previous_link_returns_to_prior_page(self):
+        first = self.client.get(reverse("view_bookings"), {"size": 3}).context["bookings"]
+        second = self.client.get(reverse("view_bookings") + "?" + first.next_query).context["bookings"]
+        self.assertTrue(second.has_previous)
+        back = self.client.get(reverse("view_bookings") + "?" + second.previous_query).context["bookings"]
+        self.assertEqual([b.pk for b in back], [b.pk for b in first])
+        self.assertFalse(back.has_previous)
+        self.assertEqual(back.size, 3)
+
+    def test_deep_page_costs_one_list_query(self):
+        _, last = self.walk("view_bookings", "bookings", size=1)
+        url = reverse("view_bookings") + "?" + last.previous_query
+        with self.assertNumQueries(3):
+            self.client.get(url)
+
+    def test_history_pages_by_service_date(self):
+        self.client.force_login(self.customer.user)
+        seen, _ = self.walk("view_history", "histories", size=2)
+        self.assertEqual(len(seen), ServiceHistory.objects.filter(customer=self.customer).count())
+        self.assertEqual(len(set(seen)), len(seen))
+
+    def test_bad_cursor_and_size_fall_back_to_first_page(self):
+        response = self.client.get(reverse("view_bookings"), {"after": "not-a-cursor", "size": "x"})
+        page = response.context["bookings"]
+        self.assertFalse(page.has_previous)
+        self.assertEqual(page.size, 25)
+
+
+# ---------------------------
+# Query plans
+# ---------------------------
+class QueryPlanTests(TestCase):
+
+    def test_list_queries_use_indexes(self):
+        out = StringIO()
+        call_command("explain_queries", stdout=out)
+        self.assertNotIn("FAIL", out.getvalue())
+
+    def test_scans_and_temp_sorts_are_reported(self):
+        from .management.commands.explain_queries import plan_problems
+        plan = (
+            "2 0 0 SCAN vehicle_servicebooking\n"
+            "7 0 0 SEARCH vehicle_vehicle USING INTEGER PRIMARY KEY (rowid=?)\n"
+            "30 0 0 USE TEMP B-TREE FOR ORDER BY"
+        )
+        self.assertEqual(plan_problems(plan), ["SCAN vehicle_servicebooking", "USE TEMP B-TREE FOR ORDER BY"])
+
+
+# ---------------------------
+# Dashboard counters
+# ---------------------------
+class DashboardCounterTests(ServiceDataMixin, TestCase):
+
+    def setUp(self):
+        self.client.force_login(self.center.user)
+
+    def assertCountersMatchSource(self):
+        stored = DashboardCounter.objects.get(service_center=self.center)
+        expected = counters.compute_counts([self.center.id])[self.center.id]
+        self.assertEqual({f: getattr(stored, f) for f in counters.COUNTER_FIELDS}, expected)
+        return stored
+
+    def test_write_paths_keep_counters_in_sync(self):
+        booking = self.bookings[0]
+        self.client.post(reverse("update_booking_status", args=[booking.pk]), {"current_status": "In Progress"})
+        stored = self.assertCountersMatchSource()
+        self.assertEqual((stored.pending, stored.in_progress, stored.open_assignments), (2, 1, 3))
+
+        self.client.post(reverse("assign_job", args=[booking.pk]), {"staff": self.staff.pk})
+        self.assertEqual(self.assertCountersMatchSource().open_assignments, 4)
+
+        self.client.post(reverse("generate_invoice", args=[booking.pk]),
+                         {"total_amount": "2500.00", "payment_status": "Unpaid"})
+        stored = self.assertCountersMatchSource()
+        self.assertEqual((stored.completed, stored.open_assignments), (1, 2))
+        self.assertEqual(stored.unpaid_total, Decimal("2500.00"))
+
+        self.client.force_login(self.customer.user)
+        self.client.post(reverse("booking_service"), {
+            "vehicle": self.vehicles[1].pk, "service_center": self.center.pk,
+            "scheduled_date": date.today().isoformat(), "description": "Brakes",
+        })
+        self.assertEqual(self.assertCountersMatchSource().pending, 3)
+
+        self.client.get(reverse("delete_vehicle", args=[booking.vehicle_id]))
+        stored = self.assertCountersMatchSource()
+        self.assertEqual((stored.completed, stored.unpaid_invoices), (0, 0))
+
+    def test_write_paths_create_a_missing_counter_row_before_writing(self):
+        booking = self.bookings[0]
+        DashboardCounter.objects.filter(service_center=self.center).delete()
+        self.client.post(reverse("generate_invoice", args=[booking.pk]),
+                         {"total_amount": "2500.00", "payment_status": "Unpaid"})
+        stored = self.assertCountersMatchSource()
+        self.assertEqual((stored.unpaid_invoices, stored.unpaid_total), (1, Decimal("2500.00")))
+
+        DashboardCounter.objects.filter(service_center=self.center).delete()
+        self.client.post(reverse("update_booking_status", args=[self.bookings[1].pk]), {"current_status": "Cancelled"})
+        self.assertEqual(self.assertCountersMatchSource().cancelled, 1)
+
+        DashboardCounter.objects.filter(service_center=self.center).delete()
+        self.client.post(reverse("bulk_update_status"), {
+            "bookings": [self.bookings[2].pk], "status": "In Progress", "remarks": "",
+        })
+        self.assertEqual(self.assertCountersMatchSource().in_progress, 1)
+
+        DashboardCounter.objects.filter(service_center=self.center).delete()
+        self.client.force_login(self.customer.user)
+        self.client.post(reverse("booking_service"), {
+            "vehicle": self.vehicles[1].pk, "service_center": self.center.pk,
+            "scheduled_date": date.today().isoformat(), "description": "Brakes",
+        })
+        self.assertEqual(self.assertCountersMatchSource().pending, 1)
+
+    def test_racing_status_changes_apply_their_deltas_once(self):
+        booking = self.bookings[0]
+        is_valid = views.ServiceStatusForm.is_valid
+        raced = []
+
+        def racing_is_valid(form):
+            # another request cancels the booking after this one loaded it, before its transaction
+            if not raced:
+                raced.append(True)
+                self.client.post(reverse("update_booking_status", args=[booking.pk]), {"current_status": "Cancelled"})
+            return is_valid(form)
+
+        with mock.patch.object(views.ServiceStatusForm, "is_valid", racing_is_valid):
+            self.client.post(reverse("update_booking_status", args=[booking.pk]), {"current_status": "Cancelled"})
+        stored = self.assertCountersMatchSource()
+        self.assertEqual((stored.pending, stored.cancelled), (2, 1))
+        self.assertEqual(scheduling.booked_on(self.center, booking.scheduled_date),
+                         scheduling.expected_slots()[self.center.id, booking.scheduled_date])
+        self.assertEqual(ServiceStatus.objects.filter(booking=booking, current_status="Cancelled").count(), 2)
+
+    def test_dashboard_reads_counters(self):
+        response = self.client.get(reverse("servicecenter_dashboard"))
+        self.assertEqual(response.context["counters"].pending, 3)
+
+    def test_rebuild_reports_and_repairs_drift(self):
+        DashboardCounter.objects.filter(service_center=self.center).update(pending=99)
+        out = StringIO()
+        call_command("rebuild_counters", "--dry-run", stdout=out)
+        self.assertIn("pending 99 -> 3", out.getvalue())
+        self.assertEqual(DashboardCounter.objects.get(service_center=self.center).pending, 99)
+
+        call_command("rebuild_counters", stdout=StringIO())
+        self.assertCountersMatchSource()
+
+    def test_invoicing_keeps_concurrent_edits(self):
+        booking = self.bookings[0]
+        is_valid = views.InvoiceForm.is_valid
+
+        def racing_is_valid(form):
+            # the customer edits the booking after the view loaded it
+            ServiceBooking.objects.filter(pk=booking.pk).update(description="Also check the brakes")
+            return is_valid(form)
+
+        with mock.patch.object(views.InvoiceForm, "is_valid", racing_is_valid):
+            self.client.post(reverse("generate_invoice", args=[booking.pk]),
+                             {"total_amount": "900.00", "payment_status": "Paid"})
+        booking.refresh_from_db()
+        self.assertEqual((booking.status, booking.description), ("Completed", "Also check the brakes"))
+
+    def test_invoicing_a_cancelled_booking_takes_its_slot_back(self):
+        booking = self.bookings[0]
+        self.client.post(reverse("update_booking_status", args=[booking.pk]), {"current_status": "Cancelled"})
+        self.client.post(reverse("generate_invoice", args=[booking.pk]),
+                         {"total_amount": "900.00", "payment_status": "Paid"})
+        self.assertEqual(ServiceBooking.objects.get(pk=booking.pk).status, "Completed")
+        stored = BookingSlot.objects.filter(booked__gt=0).values_list("service_center_id", "date", "booked")
+        self.assertEqual({(center, day): n for center, day, n in stored}, dict(scheduling.expected_slots()))
+
+    def test_slot_drift_is_logged_and_repaired(self):
+        day = self.bookings[0].scheduled_date
+        BookingSlot.objects.filter(service_center=self.center, date=day).update(booked=0)
+        with self.assertLogs("vehicle.scheduling", "WARNING") as logs:
+            self.assertFalse(scheduling.release(self.center.id, day))
+        self.assertIn(f"service center {self.center.id} on {day}", logs.output[0])
+
+        expected = scheduling.expected_slots()[self.center.id, day]
+        out = StringIO()
+        call_command("rebuild_counters", "--dry-run", stdout=out)
+        self.assertIn(f"service center {self.center.id} on {day}: booked 0 -> {expected}", out.getvalue())
+        self.assertIn("found drift in 0 service center(s) and 1 booking slot(s).", out.getvalue())
+        call_command("rebuild_counters", stdout=StringIO())
+        self.assertEqual(scheduling.booked_on(self.center, day), expected)
+
+
+# ---------------------------
+# Dashboard fragment cache
+# ---------------------------
+class DashboardCacheTests(ServiceDataMixin, TestCase):
+
+    def setUp(self):
+        dashboard_cache.get_cache().clear()
+        db_router.pin_cache().clear()  # other tests' writes pin their users to the primary
+
+    def test_second_load_is_served_from_cache(self):
+        self.client.force_login(self.customer.user)
+        self.client.get(reverse("customer_dashboard"))
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse("customer_dashboard"))
+        self.assertContains(response, "KA01AB0000")
+        self.assertEqual(dashboard_cache.stats()["hits"], 2)
+
+    def test_pages_are_cached_separately(self):
+        self.client.force_login(self.center.user)
+        first = self.client.get(reverse("servicecenter_dashboard"), {"size": 1})
+        second = self.client.get(reverse("servicecenter_dashboard"), {"size": 2})
+        self.assertNotEqual(first.context["booking_table"], second.context["booking_table"])
+
+    def test_status_change_invalidates_both_owners(self):
+        self.client.force_login(self.customer.user)
+        self.client.get(reverse("customer_dashboard"))
+        self.client.force_login(self.center.user)
+        self.client.get(reverse("servicecenter_dashboard"))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse("update_booking_status", args=[self.bookings[0].pk]),
+                             {"current_status": "In Progress"})
+        self.assertContains(self.client.get(reverse("servicecenter_dashboard")), "In Progress")
+        self.client.force_login(self.customer.user)
+        self.assertContains(self.client.get(reverse("customer_dashboard")), "In Progress")
+
+    def test_other_owners_stay_cached(self):
+        other = make_customer("carol")
+        self.client.force_login(other.user)
+        self.client.get(reverse("customer_dashboard"))
+        Staff.objects.create(service_center=self.center, name="Dan", role="Painter", phone="1", email="d@x.com")
+        with self.assertNumQueries(2):
+            self.client.get(reverse("customer_dashboard"))
+
+    def test_vehicle_edit_invalidates_centers_it_was_booked_at(self):
+        self.client.force_login(self.center.user)
+        self.client.get(reverse("servicecenter_dashboard"))
+        vehicle = self.vehicles[0]
+        vehicle.vehicle_number = "KA01XY1234"
+        with self.captureOnCommitCallbacks(execute=True):
+            vehicle.save()
+        self.assertContains(self.client.get(reverse("servicecenter_dashboard")), "KA01XY1234")
+
+    def test_invalidation_waits_for_the_commit(self):
+        before = dashboard_cache.DashboardFragments("customer", self.customer.id).prefix
+        with self.captureOnCommitCallbacks(execute=True):
+            dashboard_cache.invalidate("customer", self.customer.id)
+            # a dashboard rendered before the commit still files its fragments under the old generation
+            self.assertEqual(dashboard_cache.DashboardFragments("customer", self.customer.id).prefix, before)
+        self.assertNotEqual(dashboard_cache.DashboardFragments("customer", self.customer.id).prefix, before)
+
+    def test_replica_renders_under_a_fresh_token_are_not_cached(self):
+        self.client.force_login(self.customer.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            dashboard_cache.invalidate("customer", self.customer.id)
+        for _ in range(2):
+            self.client.get(reverse("customer_dashboard"))
+        self.assertEqual(dashboard_cache.stats()["hits"], 0)
+        # read from the primary, or once the replica has caught up, they are
+        with override_settings(REPLICA_DATABASE=None):
+            self.client.get(reverse("customer_dashboard"))
+        self.client.get(reverse("customer_dashboard"))
+        self.assertEqual(dashboard_cache.stats()["hits"], 2)
+        with override_settings(STICKY_PRIMARY_SECONDS=0):
+            with self.captureOnCommitCallbacks(execute=True):
+                dashboard_cache.invalidate("customer", self.customer.id)
+            for _ in range(2):
+                self.client.get(reverse("customer_dashboard"))
+        self.assertEqual(dashboard_cache.stats()["hits"], 4)
+
+    def test_stats_view_is_staff_only(self):
+        self.client.force_login(self.customer.user)
+        self.assertEqual(self.client.get(reverse("dashboard_cache_stats")).status_code, 302)
+        admin = User.objects.create_user("admin", password="x", is_staff=True)
+        self.client.force_login(admin)
+        self.assertEqual(
+            self.client.get(reverse("dashboard_cache_stats")).json(),
+            {"hits": 0, "misses": 0, "hit_rate": None},
+        )
+
+
+# ---------------------------
+# Bulk import
+# ---------------------------
+class ImportRecordsTests(ServiceDataMixin, TestCase):
+
+    def write(self, name, text):
+        path = os.path.join(self.tmp.name, name)
+        with open(path, "w") as fh:
+            fh.write(text)
+        return path
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def run_import(self, *args):
+        out = StringIO()
+        call_command("import_records", *args, "--batch-size", "2", stdout=out)
+        return out.getvalue()
+
+    def rejected(self, path):
+        with open(path + ".rejected.ndjson") as fh:
+            return [json.loads(line) for line in fh]
+
+    def test_customers_from_csv(self):
+        path = self.write("customers.csv", (
+            "username,name,address,phone,email\n"
+            "dave,Dave,3 Road,555,dave@example.com\n"
+            "erin,Erin,4 Road,555,erin@example.com\n"
+            "alice,Dup,5 Road,555,new@example.com\n"
+            "frank,Frank,6 Road,555,erin@example.com\n"
+        ))
+        self.run_import("customers", path)
+        dave = Customer.objects.get(email="dave@example.com")
+        self.assertEqual(dave.user.username, "dave")
+        self.assertFalse(dave.user.has_usable_password())
+        self.assertEqual([r["line"] for r in self.rejected(path)], [4, 5])
+
+    def test_customer_passwords_are_imported_as_hashes(self):
+        hashed = make_password("s3cret-pass")
+        path = self.write("customers.ndjson", "\n".join(json.dumps(row) for row in [
+            {"username": "dave", "name": "Dave", "address": "3 Road", "phone": "555",
+             "email": "dave@example.com", "password": hashed},
+            {"username": "erin", "name": "Erin", "address": "4 Road", "phone": "555",
+             "email": "erin@example.com", "password": "s3cret-pass"},
+        ]))
+        # nothing is hashed per row
+        with mock.patch("django.contrib.auth.hashers.PBKDF2PasswordHasher.encode") as encode:
+            self.run_import("customers", path)
+        encode.assert_not_called()
+        self.assertEqual(User.objects.get(username="dave").password, hashed)
+        self.assertTrue(self.client.login(username="dave", password="s3cret-pass"))
+        [rejection] = self.rejected(path)
+        self.assertEqual(rejection["line"], 2)
+        self.assertEqual(rejection["errors"], {"password": ["Expected a password hash, not a plaintext password."]})
+
+    def test_vehicles_from_ndjson(self):
+        rows = [
+            {"customer_email": "alice@example.com", "vehicle_number": "TN09AA0001", "model": "i20",
+             "manufacturer": "Hyundai", "year": 2021, "fuel_type": "Petrol"},
+            {"customer_email": "nobody@example.com", "vehicle_number": "TN09AA0002", "model": "i20",
+             "manufacturer": "Hyundai", "year": 2021, "fuel_type": "Petrol"},
+            {"customer_email": "alice@example.com", "vehicle_number": "KA01AB0000", "model": "i20",
+             "manufacturer": "Hyundai", "year": "soon", "fuel_type": "Petrol"},
+        ]
+        path = self.write("vehicles.ndjson", "\n".join(json.dumps(r) for r in rows) + "\nnot json\n")
+        self.run_import("vehicles", path)
+        self.assertTrue(Vehicle.objects.filter(vehicle_number="TN09AA0001", customer=self.customer).exists())
+        rejected = self.rejected(path)
+        self.assertEqual([r["line"] for r in rejected], [2, 3, 4])
+        self.assertEqual(set(rejected[1]["errors"]), {"vehicle_number", "year"})
+
+    def test_rows_taken_after_the_check_are_rejected_alone(self):
+        rows = [
+            {"customer_email": "alice@example.com", "vehicle_number": number, "model": "i20",
+             "manufacturer": "Hyundai", "year": 2021, "fuel_type": "Petrol"}
+            for number in ("TN09AA0001", "TN09AA0002")
+        ]
+        path = self.write("vehicles.ndjson", "\n".join(json.dumps(r) for r in rows) + '\n["a", "list"]\n')
+        clean_batch = bulk_import.VehicleImporter.clean_batch
+
+        def racing_clean_batch(importer, batch):
+            cleaned = clean_batch(importer, batch)
+            if cleaned:
+                make_vehicle(make_customer("carol"), "TN09AA0002")  # created between the check and the write
+            return cleaned
+
+        with mock.patch.object(bulk_import.VehicleImporter, "clean_batch", racing_clean_batch):
+            self.run_import("vehicles", path)
+        self.assertEqual(Vehicle.objects.get(vehicle_number="TN09AA0001").customer, self.customer)
+        self.assertEqual(Vehicle.objects.get(vehicle_number="TN09AA0002").customer.user.username, "carol")
+        rejected = self.rejected(path)
+        self.assertEqual([r["line"] for r in rejected], [2, 3])
+        self.assertIn("UNIQUE", rejected[0]["errors"]["__all__"][0])
+        self.assertEqual(rejected[1]["errors"], {"__all__": ["Expected a JSON object."]})
+
+    def test_bookings_stay_within_capacity(self):
+        ServiceCenter.objects.filter(pk=self.center.pk).update(daily_capacity=2)
+        day = (date.today() + timedelta(days=5)).isoformat()
+        later = (date.today() + timedelta(days=6)).isoformat()
+        path = self.write("bookings.csv", (
+            "customer_email,vehicle_number,service_center_email,scheduled_date,description\n"
+            + "".join(f"alice@example.com,KA01AB0001,autofix@example.com,{d},Tyres\n" for d in (day, day, day, later))
+        ))
+        clean_batch = bulk_import.BookingImporter.clean_batch
+
+        def racing_clean_batch(importer, batch):
+            cleaned = clean_batch(importer, batch)
+            if any(row["scheduled_date"] == later for _, row, _ in cleaned):
+                scheduling.occupy(self.center.id, date.fromisoformat(later), 2)  # filled by the booking form meanwhile
+            return cleaned
+
+        with mock.patch.object(bulk_import.BookingImporter, "clean_batch", racing_clean_batch):
+            self.run_import("bookings", path)
+        self.assertEqual(ServiceBooking.objects.filter(description="Tyres").count(), 2)
+        rejected = self.rejected(path)
+        self.assertEqual([r["line"] for r in rejected], [4, 5])
+        self.assertIn("fully booked", rejected[0]["errors"]["scheduled_date"][0])
+        self.assertIn("fully booked", rejected[1]["errors"]["__all__"][0])
+        self.assertEqual(scheduling.booked_on(self.center, date.fromisoformat(day)), 2)
+        self.assertEqual(scheduling.booked_on(self.center, date.fromisoformat(later)), 2)
+
+    def test_bookings_enforce_booking_form_rules(self):
+        other = make_customer("carol")
+        not_owned = make_vehicle(other, "DL01ZZ0001")
+        tomorrow = (date.today() + timedelta(days=1)).isoformat()
+        yesterday = (date.today() - timedelta(days=1)).isoformat()
+        path = self.write("bookings.csv", (
+            "customer_email,vehicle_number,service_center_email,scheduled_date,description\n"
+            f"alice@example.com,KA01AB0001,autofix@example.com,{tomorrow},Brakes\n"
+            f"alice@example.com,KA01AB0001,autofix@example.com,{yesterday},Brakes\n"
+            f"alice@example.com,{not_owned.vehicle_number},autofix@example.com,{tomorrow},Brakes\n"
+        ))
+        self.run_import("bookings", path)
+        self.assertEqual(ServiceBooking.objects.filter(description="Brakes").count(), 1)
+        rejected = self.rejected(path)
+        self.assertEqual(rejected[0]["errors"], {"scheduled_date": ["Scheduled date cannot be in the past."]})
+        self.assertIn("vehicle_number", rejected[1]["errors"])
+        self.assertEqual(DashboardCounter.objects.get(service_center=self.center).pending, 4)
+
+
+# ---------------------------
+# Streaming exports
+# ---------------------------
+class ExportTests(ServiceDataMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        old = cls.bookings[0].servicehistory_set.get()
+        old.service_date = date(2024, 1, 15)
+        old.save()
+        Invoice.objects.create(booking=cls.bookings[1], service_center=cls.center, total_amount=Decimal("900.00"))
+        other = make_customer("carol")
+        make_history(make_booking(other, make_vehicle(other, "DL01ZZ0001"), cls.center))
+
+    def body(self, response):
+        self.assertTrue(response.streaming)
+        return b"".join(response.streaming_content).decode()
+
+    def test_customer_history_csv_is_scoped_to_owner(self):
+        self.client.force_login(self.customer.user)
+        lines = self.body(self.client.get(reverse("export_history"))).splitlines()
+        self.assertEqual(lines[0], "id,service_date,vehicle_number,service_center,booking_id,details,cost")
+        self.assertEqual(len(lines), 4)
+        self.assertNotIn("DL01ZZ0001", "\n".join(lines))
+
+    def test_filters_are_applied(self):
+        self.client.force_login(self.customer.user)
+        params = {"format": "ndjson", "date_from": "2024-01-01", "date_to": "2024-12-31"}
+        rows = [json.loads(line) for line in self.body(self.client.get(reverse("export_history"), params)).splitlines()]
+        self.assertEqual([r["vehicle_number"] for r in rows], ["KA01AB0000"])
+
+        params = {"format": "ndjson", "vehicle": self.vehicles[2].pk}
+        rows = [json.loads(line) for line in self.body(self.client.get(reverse("export_history"), params)).splitlines()]
+        self.assertEqual([r["booking_id"] for r in rows], [self.bookings[2].pk])
+
+    def test_service_center_exports_its_invoices(self):
+        self.client.force_login(self.center.user)
+        response = self.client.get(reverse("export_invoices"), {"format": "ndjson"})
+        self.assertEqual(response["Content-Disposition"], 'attachment; filename="invoices.ndjson"')
+        rows = [json.loads(line) for line in self.body(response).splitlines()]
+        self.assertEqual(rows[0]["total_amount"], "900.00")
+        self.assertEqual(rows[0]["customer"], "Alice")
+
+    def test_bad_filters_are_rejected(self):
+        self.client.force_login(self.customer.user)
+        response = self.client.get(reverse("export_history"), {"date_from": "2024-02-01", "date_to": "2024-01-01"})
+        self.assertEqual(response.status_code, 400)
+
+
+# ---------------------------
+# JSON API with conditional GET
+# ---------------------------
+class ApiTests(ServiceDataMixin, TestCase):
+
+    def setUp(self):
+        self.client.force_login(self.center.user)
+
+    def test_bookings_page_and_etag(self):
+        response = self.client.get(reverse("api_bookings"), {"size": 2})
+        data = response.json()
+        self.assertEqual(len(data["results"]), 2)
+        self.assertIsNotNone(data["next"])
+        self.assertTrue(response["ETag"].startswith('"'))
+        self.assertNotIn("Last-Modified", response)
+
+        # unchanged: 304 after the session and user (with its profile) plus the one aggregate
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse("api_bookings"), {"size": 2},
+                                       HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+
+    def test_write_changes_etag(self):
+        etag = self.client.get(reverse("api_bookings"))["ETag"]
+        self.client.post(reverse("update_booking_status", args=[self.bookings[0].pk]),
+                         {"current_status": "In Progress"})
+        response = self.client.get(reverse("api_bookings"), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+        etag = self.client.get(reverse("api_booking_statuses", args=[self.bookings[0].pk]))["ETag"]
+        self.client.post(reverse("update_booking_status", args=[self.bookings[0].pk]),
+                         {"current_status": "Completed"})
+        response = self.client.get(reverse("api_booking_statuses", args=[self.bookings[0].pk]),
+                                   HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual([s["current_status"] for s in response.json()["results"]],
+                         ["Pending", "In Progress", "Completed"])
+
+    def test_deleted_rows_are_not_revalidated_by_date(self):
+        self.client.force_login(self.customer.user)
+        first = self.client.get(reverse("api_vehicles"))
+        self.client.get(reverse("delete_vehicle", args=[self.spare_vehicle.pk]))
+        # a client revalidating by date alone gets the list again, without the deleted vehicle
+        response = self.client.get(reverse("api_vehicles"), HTTP_IF_MODIFIED_SINCE=http_date())
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn(self.spare_vehicle.pk, [v["id"] for v in response.json()["results"]])
+        response = self.client.get(reverse("api_vehicles"), HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(response.status_code, 200)
+
+    def test_joined_fields_change_etag(self):
+        for change in (
+            lambda: Vehicle.objects.get(pk=self.vehicles[0].pk).save(),
+            lambda: Customer.objects.get(pk=self.customer.pk).save(),
+            lambda: ServiceCenter.objects.get(pk=self.center.pk).save(),
+        ):
+            response = self.client.get(reverse("api_bookings"))
+            change()
+            response = self.client.get(reverse("api_bookings"), HTTP_IF_NONE_MATCH=response["ETag"])
+            self.assertEqual(response.status_code, 200)
+
+        self.client.force_login(self.customer.user)
+        etag = self.client.get(reverse("api_history"))["ETag"]
+        vehicle = self.vehicles[0]
+        vehicle.vehicle_number = "KA01XY0000"
+        vehicle.save()
+        response = self.client.get(reverse("api_history"), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("KA01XY0000", [h["vehicle__vehicle_number"] for h in response.json()["results"]])
+
+    def test_scoping(self):
+        other = make_customer("carol")
+        booking = make_booking(other, make_vehicle(other, "DL01ZZ0001"), make_servicecenter("elsewhere"))
+        foreign = reverse("api_booking_statuses", args=[booking.pk])
+        response = self.client.get(foreign)
+        self.assertEqual(response.status_code, 404)
+        self.assertNotIn("ETag", response)
+        # the ETag an empty status list would have gets no 304 either
+        self.client.force_login(other.user)
+        etag = self.client.get(foreign)["ETag"]
+        ServiceStatus.objects.filter(booking=booking).delete()
+        empty = self.client.get(foreign)["ETag"]
+        self.client.force_login(self.center.user)
+        for guess in (etag, empty):
+            self.assertEqual(self.client.get(foreign, HTTP_IF_NONE_MATCH=guess).status_code, 404)
+        self.assertEqual(self.client.get(reverse("api_vehicles")).status_code, 403)
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse("api_history")).status_code, 401)
+
+    def test_customer_vehicles_and_history(self):
+        self.client.force_login(self.customer.user)
+        vehicles = self.client.get(reverse("api_vehicles")).json()["results"]
+        self.assertEqual([v["vehicle_number"] for v in vehicles][:2], ["KA01AB0000", "KA01AB0001"])
+        history = self.client.get(reverse("api_history")).json()["results"]
+        self.assertEqual(history[0]["cost"], "1500.00")
+
+
+# ---------------------------
+# Async views (ASGI)
+# ---------------------------
+class AsyncViewTests(ServiceDataMixin, TestCase):
+
+    def setUp(self):
+        dashboard_cache.get_cache().clear()
+        self.async_client = AsyncClient()
+
+    async def get_both(self, user, name, **params):
+        await self.async_client.aforce_login(user)
+        await sync_to_async(self.client.force_login)(user)
+        async_response = await self.async_client.get(reverse(name), params)
+        sync_response = await sync_to_async(self.client.get)(reverse(name), params)
+        return async_response, sync_response
+
+    def assertSamePage(self, first, second):
+        # CSRF tokens are masked differently on every render
+        token = re.compile(rb'name="csrfmiddlewaretoken" value="[^"]+"')
+        self.assertEqual(token.sub(b"", first.content), token.sub(b"", second.content))
+
+    async def test_asgi_requests_use_async_views(self):
+        await self.async_client.aforce_login(self.customer.user)
+        response = await self.async_client.get(reverse("view_history"))
+        self.assertIs(response.resolver_match.func, async_views.view_history)
+
+    async def test_customer_pages_match_sync_views(self):
+        for name in ("customer_dashboard", "view_bookings", "view_history", "view_vehicle"):
+            with self.subTest(url=name):
+                async_response, sync_response = await self.get_both(self.customer.user, name, size=2)
+                self.assertEqual(async_response.status_code, 200)
+                self.assertSamePage(async_response, sync_response)
+
+    async def test_service_center_pages_match_sync_views(self):
+        for name in ("servicecenter_dashboard", "view_bookings"):
+            with self.subTest(url=name):
+                async_response, sync_response = await self.get_both(self.center.user, name)
+                self.assertEqual(async_response.status_code, 200)
+                self.assertSamePage(async_response, sync_response)
+
+    async def test_access_checks(self):
+        await self.async_client.aforce_login(self.center.user)
+        response = await self.async_client.get(reverse("view_history"))
+        self.assertRedirects(response, reverse("home"), fetch_redirect_response=False)
+        await self.async_client.alogout()
+        response = await self.async_client.get(reverse("customer_dashboard"))
+        self.assertEqual(response.status_code, 302)
+
+
+# ---------------------------
+# Reminder campaigns
+# ---------------------------
+class DebuggingSMTPServer(socketserver.ThreadingTCPServer):
+    """
+    Just enough SMTP to accept mail; records connections and messages, and
+    refuses ``refused`` recipients ({address: reply}, 550 when a list).
+    """
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, refused=()):
+        super().__init__(("127.0.0.1", 0), DebuggingSMTPHandler)
+        self.connections = 0
+        self.messages = []
+        self.refused = refused if isinstance(refused, dict) else dict.fromkeys(refused, "550 no such user")
+
+
+class DebuggingSMTPHandler(socketserver.StreamRequestHandler):
+
+    def reply(self, line):
+        self.wfile.write(line.encode() + b"\r\n")
+
+    def handle(self):
+        self.server.connections += 1
+        self.reply("220 localhost ready")
+        while True:
+            line = self.rfile.readline().decode().strip()
+            command = line[:4].upper()
+            if not line or command == "QUIT":
+                self.reply("221 bye")
+                return
+            refusal = next((r for a, r in self.server.refused.items() if command == "RCPT" and a in line), None)
+            if refusal:
+                self.reply(refusal)
+                continue
+            if command == "DATA":
+                self.reply("354 end with .")
+                body = []
+                for data in iter(self.rfile.readline, b".\r\n"):
+                    body.append(data.decode())
+                self.server.messages.append("".join(body))
+            self.reply("250 ok")
+
+
+class ReminderCampaignTests(ServiceDataMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.bookings[0].status = "Completed"
+        cls.bookings[0].save()
+        cls.old_customer = make_customer("oldie")
+        old = make_booking(cls.old_customer, make_vehicle(cls.old_customer, "OLD0001"), cls.center, "Completed")
+        ServiceBooking.objects.filter(pk=old.pk).update(scheduled_date=date.today() - timedelta(days=800))
+        for i in range(5):
+            customer = make_customer(f"fleet{i}")
+            make_booking(customer, make_vehicle(customer, f"FLEET{i:04d}"), cls.center, "Completed")
+
+    def test_months_ago_clamps_day(self):
+        self.assertEqual(reminders.months_ago(1, date(2025, 3, 31)), date(2025, 2, 28))
+        self.assertEqual(reminders.months_ago(14, date(2025, 1, 15)), date(2023, 11, 15))
+
+    def test_campaign_queues_segment_without_sending(self):
+        self.client.force_login(self.center.user)
+        response = self.client.post(reverse("send_reminders"), {"title": "Oil change due", "message": "Hi", "months": 6})
+        self.assertRedirects(response, reverse("servicecenter_dashboard"), fetch_redirect_response=False)
+        queued = ReminderOffer.objects.filter(service_center=self.center)
+        self.assertEqual(queued.count(), 6)
+        self.assertFalse(queued.filter(customer=self.old_customer).exists())
+        self.assertFalse(queued.exclude(delivered_on=None).exists())
+
+    def test_delivery_reuses_one_smtp_connection(self):
+        customer_ids = reminders.segment_customer_ids(self.center, 6)
+        reminders.queue_campaign(self.center, "Offer", "20% off", customer_ids)
+
+        server = self.smtp_server()
+        call_command("deliver_reminders", "--batch-size", "4", stdout=StringIO())
+
+        self.assertEqual(server.connections, 1)
+        self.assertEqual(len(server.messages), 6)
+        self.assertFalse(ReminderOffer.objects.filter(delivered_on=None).exists())
+        self.assertIn("Subject: Offer", server.messages[0])
+
+    def smtp_server(self, refused=()):
+        server = DebuggingSMTPServer(refused)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        self.enterContext(override_settings(EMAIL_BACKEND="django.core.mail.backends.smtp.EmailBackend",
+                                            EMAIL_HOST="127.0.0.1", EMAIL_PORT=server.server_address[1]))
+        return server
+
+    def test_refused_recipient_is_skipped_not_retried(self):
+        reminders.queue_campaign(self.center, "Offer", "20% off", reminders.segment_customer_ids(self.center, 6))
+        server = self.smtp_server(refused=["fleet1@example.com"])
+        self.assertEqual(reminders.deliver_pending(batch_size=4), (5, 1))
+        self.assertEqual(len(server.messages), 5)
+        failed = ReminderOffer.objects.get(failed_on__isnull=False)
+        self.assertEqual((failed.customer.email, failed.delivered_on), ("fleet1@example.com", None))
+        self.assertIn("no such user", failed.failure)
+        # the next run has nothing left to send
+        self.assertEqual(reminders.deliver_pending(batch_size=4), (0, 0))
+        self.assertEqual(len(server.messages), 5)
+
+    def test_temporary_or_sender_errors_stop_the_run_and_keep_the_queue(self):
+        reminders.queue_campaign(self.center, "Offer", "20% off", reminders.segment_customer_ids(self.center, 6))
+        self.smtp_server(refused={"fleet1@example.com": "450 mailbox busy"})
+        with self.assertRaisesMessage(CommandError, "mailbox busy"):
+            call_command("deliver_reminders", stdout=StringIO())
+        self.assertFalse(ReminderOffer.objects.filter(failed_on__isnull=False).exists())
+        busy = ReminderOffer.objects.get(customer__email="fleet1@example.com")
+        self.assertIsNone(busy.delivered_on)
+
+        connection = mock.Mock()
+        connection.send_messages.side_effect = smtplib.SMTPSenderRefused(553, b"bad sender", "noreply@example.com")
+        with self.assertRaises(smtplib.SMTPSenderRefused):
+            reminders.deliver_pending(connection=connection)
+        self.assertEqual(connection.send_messages.call_count, 1)
+        self.assertFalse(ReminderOffer.objects.filter(failed_on__isnull=False).exists())
+
+    def test_dropped_connection_keeps_what_was_sent(self):
+        reminders.queue_campaign(self.center, "Offer", "20% off", reminders.segment_customer_ids(self.center, 6))
+        connection = mock.Mock()
+        connection.send_messages.side_effect = [1, 1, smtplib.SMTPServerDisconnected("gone")]
+        with self.assertRaises(smtplib.SMTPServerDisconnected):
+            reminders.deliver_pending(connection=connection)
+        self.assertEqual(ReminderOffer.objects.filter(delivered_on__isnull=False).count(), 2)
+        self.assertFalse(ReminderOffer.objects.filter(failed_on__isnull=False).exists())
+
+
+# ---------------------------
+# Booking capacity / slot index
+# ---------------------------
+class SchedulingTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = make_customer("carol")
+        cls.center = make_servicecenter("quickfix")
+        cls.center.daily_capacity = 2
+        cls.center.save()
+        cls.vehicles = [make_vehicle(cls.customer, f"TN09XY{i:04d}") for i in range(4)]
+        cls.day = date.today() + timedelta(days=3)
+
+    def book(self, vehicle, day=None):
+        return self.client.post(reverse("booking_service"), {
+            "vehicle": vehicle.pk, "service_center": self.center.pk,
+            "scheduled_date": (day or self.day).isoformat(), "description": "Service",
+        })
+
+    def test_full_day_is_rejected_with_next_free_days(self):
+        self.client.force_login(self.customer.user)
+        self.assertEqual(self.book(self.vehicles[0]).status_code, 302)
+        self.assertEqual(self.book(self.vehicles[1]).status_code, 302)
+        response = self.book(self.vehicles[2])
+        self.assertEqual(response.status_code, 200)
+        error = response.context["form"].errors["scheduled_date"][0]
+        self.assertIn("fully booked", error)
+        self.assertIn(f"{self.day + timedelta(days=1):%d %b %Y}", error)
+        self.assertEqual(ServiceBooking.objects.filter(scheduled_date=self.day).count(), 2)
+        self.assertEqual(BookingSlot.objects.get(service_center=self.center, date=self.day).booked, 2)
+
+    def test_reserve_is_a_conditional_update(self):
+        scheduling.reserve(self.center, self.day)
+        scheduling.reserve(self.center, self.day)
+        with self.assertRaises(scheduling.SlotUnavailable):
+            scheduling.reserve(self.center, self.day)
+        # a submission validated before the day filled up still cannot overbook
+        self.client.force_login(self.customer.user)
+        with mock.patch.object(scheduling, "has_capacity", return_value=True):
+            response = self.book(self.vehicles[0])
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("fully booked", response.context["form"].errors["scheduled_date"][0])
+        self.assertFalse(ServiceBooking.objects.filter(vehicle=self.vehicles[0]).exists())
+        self.assertEqual(BookingSlot.objects.get(service_center=self.center, date=self.day).booked, 2)
+
+    def test_cancelling_and_deleting_free_slots(self):
+        self.client.force_login(self.customer.user)
+        self.book(self.vehicles[0])
+        self.book(self.vehicles[1])
+        booking = ServiceBooking.objects.get(vehicle=self.vehicles[0])
+
+        self.client.force_login(self.center.user)
+        self.client.post(reverse("update_booking_status", args=[booking.pk]), {"current_status": "Cancelled"})
+        self.assertEqual(scheduling.booked_on(self.center, self.day), 1)
+
+        self.client.force_login(self.customer.user)
+        self.client.post(reverse("delete_vehicle", args=[self.vehicles[1].pk]))
+        self.assertEqual(scheduling.booked_on(self.center, self.day), 0)
+
+    def test_available_dates_come_from_the_index(self):
+        BookingSlot.objects.create(service_center=self.center, date=date.today(), booked=2)
+        BookingSlot.objects.create(service_center=self.center, date=date.today() + timedelta(days=2), booked=2)
+        BookingSlot.objects.create(service_center=self.center, date=date.today() + timedelta(days=1), booked=1)
+        self.client.force_login(self.customer.user)
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse("api_available_dates", args=[self.center.pk]), {"count": 3})
+        expected = [date.today() + timedelta(days=d) for d in (1, 3, 4)]
+        self.assertEqual(response.json()["results"], [d.isoformat() for d in expected])
+
+
+# ---------------------------
+# Automatic job assignment
+# ---------------------------
+class AutoAssignTests(ServiceDataMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        # Bob already has the three fixture bookings
+        cls.dave = Staff.objects.create(
+            service_center=cls.center, name="Dave", role="Senior Technician", phone="555", email="dave@example.com"
+        )
+        cls.reception = Staff.objects.create(
+            service_center=cls.center, name="Rita", role="Receptionist", phone="555", email="rita@example.com"
+        )
+
+    def add_pending(self, count, prefix="PN"):
+        vehicle = make_vehicle(self.customer, f"{prefix}{count:06d}")
+        return ServiceBooking.objects.bulk_create(
+            ServiceBooking(customer=self.customer, vehicle=vehicle, service_center=self.center,
+                           scheduled_date=date.today(), description="Service")
+            for _ in range(count)
+        )
+
+    def test_workloads_come_from_one_query(self):
+        self.bookings[0].status = "Completed"
+        self.bookings[0].save()
+        with self.assertNumQueries(1):
+            loads = {s.name: s.open_jobs for s in assignment.staff_workloads(self.center)}
+        self.assertEqual(loads, {"Bob": 2, "Dave": 0, "Rita": 0})
+
+    def test_least_loaded_workshop_staff_first(self):
+        self.add_pending(4)
+        jobs = assignment.auto_assign(self.center)
+        names = [job.staff.name for job in jobs]
+        # Dave catches up with Bob, then ties go to the lower id; the receptionist gets nothing
+        self.assertEqual(names, ["Dave", "Dave", "Dave", "Bob"])
+        self.assertEqual(counters.counters_for(self.center).open_assignments, 7)
+        self.assertEqual(assignment.auto_assign(self.center), [])
+
+    def test_query_count_does_not_grow_with_bookings(self):
+        self.add_pending(10, "SMALL")
+        # savepoint, bookings, workloads, counter row check, insert, counters, change log, release
+        with self.assertNumQueries(8):
+            assignment.auto_assign(self.center)
+        self.add_pending(1000, "LARGE")
+        # only the inserts are split, by the backend's query parameter limit
+        batch = connection.ops.bulk_batch_size(["booking", "staff", "assigned_date", "notes"], [None] * 1000)
+        # two change log entries per assignment: the customer's and the center's
+        log_batch = connection.ops.bulk_batch_size(
+            ["owner", "kind", "object_id", "action", "data", "created_at"], [None] * 2000,
+        )
+        with self.assertNumQueries(6 + -(-1000 // batch) + -(-2000 // log_batch)):
+            jobs = assignment.auto_assign(self.center)
+        self.assertEqual(len(jobs), 1000)
+
+    def test_single_booking_view(self):
+        booking = self.add_pending(1)[0]
+        self.client.force_login(self.center.user)
+        response = self.client.post(reverse("auto_assign", args=[booking.pk]))
+        self.assertRedirects(response, reverse("view_bookings"), fetch_redirect_response=False)
+        self.assertEqual(JobAssignment.objects.get(booking=booking).staff, self.dave)
+        self.assertEqual(self.client.get(reverse("auto_assign_pending")).status_code, 405)
+
+
+# ---------------------------
+# Bulk status transitions
+# ---------------------------
+class BulkStatusTests(ServiceDataMixin, TestCase):
+
+    def setUp(self):
+        dashboard_cache.get_cache().clear()
+        self.client.force_login(self.center.user)
+
+    def post(self, bookings, status="Completed"):
+        return self.client.post(reverse("bulk_update_status"), {
+            "bookings": [b.pk for b in bookings], "status": status, "remarks": "End of day",
+        })
+
+    def test_many_bookings_in_a_fixed_number_of_queries(self):
+        self.add_rows(5)
+        DashboardCounter.objects.filter(service_center=self.center).delete()
+        counters.counters_for(self.center)
+        bookings = list(ServiceBooking.objects.filter(service_center=self.center))
+        self.client.get(reverse("servicecenter_dashboard"))
+        before = ServiceBooking.objects.get(pk=self.bookings[0].pk).updated_at
+        # session, user with its center, ownership check, savepoint, locked re-read, counter row check,
+        # insert statuses, update bookings, assignment counts, counters, change log, release
+        with self.assertNumQueries(12):
+            response = self.post(bookings)
+        self.assertRedirects(response, reverse("view_bookings"), fetch_redirect_response=False)
+
+        self.assertFalse(ServiceBooking.objects.filter(service_center=self.center).exclude(status="Completed").exists())
+        self.assertEqual(ServiceStatus.objects.filter(current_status="Completed", remarks="End of day").count(), 8)
+        self.assertGreater(ServiceBooking.objects.get(pk=self.bookings[0].pk).updated_at, before)
+        stored = DashboardCounter.objects.get(service_center=self.center)
+        fresh = counters.compute_counts([self.center.id])[self.center.id]
+        self.assertEqual({f: getattr(stored, f) for f in counters.COUNTER_FIELDS}, fresh)
+        self.assertEqual(stored.open_assignments, 0)
+        self.assertContains(self.client.get(reverse("servicecenter_dashboard")), "Completed")
+
+    def test_form_offers_one_page_of_bookings(self):
+        self.add_rows(5)
+        response = self.client.get(reverse("bulk_update_status"), {"size": 3})
+        self.assertEqual(len(response.context["form"].fields["bookings"].widget.choices), 3)
+        self.assertContains(response, 'type="checkbox"', count=3)
+        self.assertTrue(response.context["bookings"].has_next)
+        second = self.client.get(reverse("bulk_update_status") + "?" + response.context["bookings"].next_query)
+        shown = {pk for pk, _ in response.context["form"].fields["bookings"].widget.choices}
+        self.assertFalse(shown & {pk for pk, _ in second.context["form"].fields["bookings"].widget.choices})
+
+        # any open booking of the center is accepted, not just the ones on the page
+        hidden = ServiceBooking.objects.filter(service_center=self.center).exclude(pk__in=shown).first()
+        self.post([hidden])
+        hidden.refresh_from_db()
+        self.assertEqual(hidden.status, "Completed")
+
+    def test_more_than_a_page_of_ids_is_rejected(self):
+        with mock.patch("vehicle.forms.MAX_PAGE_SIZE", 2):
+            response = self.post(self.bookings[:3])
+        self.assertIn("bookings", response.context["form"].errors)
+        self.assertFalse(ServiceBooking.objects.filter(status="Completed").exists())
+
+    def test_bookings_of_other_centers_are_rejected(self):
+        other = make_servicecenter("elsewhere")
+        foreign = make_booking(self.customer, self.spare_vehicle, other)
+        response = self.post([self.bookings[0], foreign])
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("bookings", response.context["form"].errors)
+        self.assertFalse(ServiceBooking.objects.filter(status="Completed").exists())
+
+    def test_cancelling_frees_slots(self):
+        day = self.bookings[0].scheduled_date
+        booked = scheduling.booked_on(self.center, day)
+        self.post(self.bookings[:2], "Cancelled")
+        self.assertEqual(scheduling.booked_on(self.center, day), booked - 2)
+
+    def test_stale_bookings_are_moved_once(self):
+        day = self.bookings[0].scheduled_date
+        booked = scheduling.booked_on(self.center, day)
+        # both requests read the bookings as Pending; the second commits after the first
+        stale = list(ServiceBooking.objects.filter(pk__in=[b.pk for b in self.bookings[:2]]))
+        self.assertEqual(transitions.bulk_transition(self.center, stale, "Cancelled"), 2)
+        self.assertEqual(transitions.bulk_transition(self.center, stale, "Cancelled"), 0)
+        self.assertEqual(scheduling.booked_on(self.center, day), booked - 2)
+        stored = DashboardCounter.objects.get(service_center=self.center)
+        self.assertEqual({f: getattr(stored, f) for f in counters.COUNTER_FIELDS},
+                         counters.compute_counts([self.center.id])[self.center.id])
+        self.assertEqual(ServiceStatus.objects.filter(current_status="Cancelled").count(), 2)
+
+    def test_single_update_writes_only_changed_columns(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(reverse("update_booking_status", args=[self.bookings[0].pk]),
+                             {"current_status": "In Progress"})
+        update = next(q["sql"] for q in queries if q["sql"].startswith('UPDATE "vehicle_servicebooking"'))
+        self.assertIn('"status"', update)
+        self.assertNotIn('"description"', update)
+
+
+# ---------------------------
+# Row locks on SQLite (BEGIN IMMEDIATE)
+# ---------------------------
+class WriteLockTests(TransactionTestCase):
+
+    def setUp(self):
+        customer = make_customer("alice")
+        self.booking = make_booking(customer, make_vehicle(customer, "KA01AB0000"), make_servicecenter("autofix"))
+
+    def in_thread(self, work):
+        def run():
+            try:
+                work()
+            finally:
+                connection.close()
+        thread = threading.Thread(target=run)
+        thread.start()
+        return thread
+
+    def test_status_reads_wait_for_the_writer_holding_the_lock(self):
+        read, commit = threading.Event(), threading.Event()
+        seen = []
+
+        def cancel():
+            with transaction.atomic():
+                seen.append(views.locked_status(self.booking))
+                read.set()
+                commit.wait(5)
+                ServiceBooking.objects.filter(pk=self.booking.pk).update(status="Cancelled")
+
+        def read_status():
+            try:
+                with transaction.atomic():
+                    seen.append(views.locked_status(self.booking))
+            except OperationalError:
+                seen.append("locked")
+
+        writer = self.in_thread(cancel)
+        read.wait(5)
+        # the in-memory test database reports the lock at once; a database file waits out the timeout
+        self.in_thread(read_status).join()
+        commit.set()
+        writer.join()
+        self.in_thread(read_status).join()
+        self.assertEqual(seen, ["Pending", "locked", "Cancelled"])
+
+
+# ---------------------------
+# Daily revenue / throughput rollups
+# ---------------------------
+class RollupTests(ServiceDataMixin, TestCase):
+
+    def complete(self, booking, amount, hours):
+        status = ServiceStatus.objects.create(booking=booking, current_status="Completed")
+        ServiceStatus.objects.filter(pk=status.pk).update(updated_on=booking.booking_date + timedelta(hours=hours))
+        Invoice.objects.create(booking=booking, service_center=self.center, total_amount=Decimal(amount))
+
+    def rollup(self):
+        return DailyRollup.objects.get(service_center=self.center, date=date.today())
+
+    def test_full_refresh(self):
+        self.complete(self.bookings[0], "1000.00", 2)
+        self.complete(self.bookings[1], "3000.00", 4)
+        call_command("refresh_rollups", stdout=StringIO())
+        row = self.rollup()
+        self.assertEqual((row.bookings, row.services, row.invoices, row.completed), (3, 3, 2, 2))
+        self.assertEqual(row.revenue, Decimal("4000.00"))
+        self.assertEqual(row.turnaround_seconds, 6 * 3600)
+        self.assertIsNotNone(RollupWatermark.objects.get(name=rollups.WATERMARK).processed_until)
+
+    def test_incremental_refresh_only_touches_changed_days(self):
+        rollups.refresh()
+        old_day = date.today() - timedelta(days=40)
+        stale = DailyRollup.objects.create(service_center=self.center, date=old_day, bookings=99)
+        RollupWatermark.objects.update(processed_until=timezone.now())
+
+        self.complete(self.bookings[2], "500.00", 1)
+        self.assertEqual(rollups.changed_keys(RollupWatermark.objects.get().processed_until),
+                         {(self.center.id, date.today())})
+        rollups.refresh()
+        row = self.rollup()
+        self.assertEqual((row.invoices, row.revenue, row.completed), (1, Decimal("500.00"), 1))
+        # days outside the changed span are not recomputed
+        stale.refresh_from_db()
+        self.assertEqual(stale.bookings, 99)
+        rollups.refresh(full=True)
+        self.assertFalse(DailyRollup.objects.filter(date=old_day).exists())
+
+    def test_incremental_refresh_picks_up_edited_old_invoices(self):
+        self.complete(self.bookings[0], "1000.00", 2)
+        old_day = date.today() - timedelta(days=40)
+        Invoice.objects.update(issue_date=old_day)
+        rollups.refresh()
+        RollupWatermark.objects.update(processed_until=timezone.now() - timedelta(seconds=1))
+
+        invoice = Invoice.objects.get()
+        invoice.total_amount = Decimal("1500.00")
+        invoice.save()
+        rollups.refresh()
+        row = DailyRollup.objects.get(service_center=self.center, date=old_day)
+        self.assertEqual((row.invoices, row.revenue), (1, Decimal("1500.00")))
+
+    def test_full_refresh_commits_chunk_by_chunk(self):
+        self.complete(self.bookings[0], "1000.00", 2)
+        old_day = date.today() - timedelta(days=40)
+        Invoice.objects.update(issue_date=old_day)
+        DailyRollup.objects.create(service_center=self.center, date=old_day - timedelta(days=400), bookings=99)
+        with mock.patch.object(rollups, "compute", wraps=rollups.compute) as compute:
+            rollups.refresh(full=True)
+        # two chunks of at most FULL_CHUNK_DAYS, each in its own transaction
+        split = old_day + timedelta(days=rollups.FULL_CHUNK_DAYS)
+        self.assertEqual([call.kwargs for call in compute.call_args_list], [
+            {"start": old_day, "end": split - timedelta(days=1)},
+            {"start": split, "end": date.today()},
+        ])
+        self.assertEqual(set(DailyRollup.objects.values_list("date", flat=True)), {old_day, date.today()})
+        self.assertEqual(DailyRollup.objects.get(date=old_day).revenue, Decimal("1000.00"))
+        self.assertIsNotNone(RollupWatermark.objects.get(name=rollups.WATERMARK).processed_until)
+
+    def test_invoiced_bookings_count_as_completed(self):
+        invoiced, completed_first = self.bookings[:2]
+        invoiced.refresh_from_db()  # booking_date as stored
+        self.client.force_login(self.center.user)
+        self.client.post(reverse("update_booking_status", args=[completed_first.pk]), {"current_status": "Completed"})
+        for booking in (invoiced, completed_first):
+            self.client.post(reverse("generate_invoice", args=[booking.pk]),
+                             {"total_amount": "1000.00", "payment_status": "Paid"})
+        rollups.refresh()
+        row = self.rollup()
+        # invoicing an already completed booking adds no second completion
+        self.assertEqual((row.invoices, row.revenue, row.completed), (2, Decimal("2000.00"), 2))
+        self.assertEqual(ServiceStatus.objects.filter(current_status="Completed").count(), 2)
+        done = ServiceStatus.objects.get(booking=invoiced, current_status="Completed").updated_on
+        self.assertGreaterEqual(row.turnaround_seconds, int((done - invoiced.booking_date).total_seconds()))
+
+    def test_report_reads_only_rollups(self):
+        self.complete(self.bookings[0], "1200.00", 3)
+        rollups.refresh()
+        self.client.force_login(self.center.user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("revenue_report"), {"days": 30})
+        tables = " ".join(q["sql"] for q in queries)
+        self.assertNotIn("vehicle_invoice", tables)
+        self.assertNotIn("vehicle_servicebooking", tables)
+        self.assertEqual(response.context["totals"]["average_ticket"], Decimal("1200.00"))
+        self.assertEqual(response.context["totals"]["turnaround"], timedelta(hours=3))
+        self.assertContains(response, "<rect", count=1)
+
+
+# ---------------------------
+# Full-text search (SQLite FTS5)
+# ---------------------------
+class SearchTests(ServiceDataMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.bookings[0].description = "Brake pads squeaking on the white Swift"
+        cls.bookings[0].save()
+        cls.other = make_customer("zed")
+        other_vehicle = make_vehicle(cls.other, "DL05QQ0001")
+        make_booking(cls.other, other_vehicle, make_servicecenter("farshop"))
+        ServiceBooking.objects.filter(vehicle=other_vehicle).update(description="Brake job")
+
+    def found(self, owner, query):
+        return [(kind, obj.pk) for kind, obj in search.search(owner, query)]
+
+    def test_ranked_and_scoped_to_owner(self):
+        owner = search.owner_token(customer=self.customer)
+        self.assertEqual(self.found(owner, "brakes"), [("booking", self.bookings[0].pk)])
+        # the title (vehicle number / model) outranks a body-only match
+        results = self.found(owner, "swift")
+        self.assertEqual(results[0][0], "vehicle")
+        self.assertIn(("booking", self.bookings[0].pk), results)
+        # another customer's brake job is invisible, as is everything to a center that never saw it
+        self.assertEqual(self.found(search.owner_token(customer=self.other), "brake"), [
+            ("booking", ServiceBooking.objects.get(customer=self.other).pk),
+        ])
+        self.assertEqual(self.found(search.owner_token(service_center=self.center), "DL05QQ0001"), [])
+
+    def test_triggers_follow_updates_and_deletes(self):
+        owner = search.owner_token(customer=self.customer)
+        Vehicle.objects.filter(pk=self.vehicles[1].pk).update(vehicle_number="MH99RENAMED")
+        self.assertIn(("booking", self.bookings[1].pk), self.found(owner, "mh99renamed"))
+        Customer.objects.filter(pk=self.customer.pk).update(name="Alicia")
+        self.assertEqual(len(self.found(owner, "alicia")), 10)
+        self.bookings[0].delete()
+        self.assertEqual(self.found(owner, "squeaking"), [])
+
+    def test_view_and_rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute("DELETE FROM vehicle_search")
+        out = StringIO()
+        call_command("rebuild_search_index", stdout=out)
+        self.assertIn("Indexed 12 document(s).", out.getvalue())
+        self.client.force_login(self.center.user)
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse("search_records"), {"q": "squeak swift"})
+        self.assertEqual([kind for kind, _ in response.context["results"]], ["booking"])
+        self.assertContains(response, "Brake pads squeaking")
+
+    def test_latest_migration_copy_matches_the_schema(self):
+        # the DDL is frozen once, in 0009, and later migrations import it; an edit to search_schema needs a
+        # migration that freezes the new version, which is then the one compared here and imported after it
+        latest = importlib.import_module("vehicle.migrations.0009_search_index")
+        for name in ("0010_vehicle_plate_key", "0014_profile_updated_at"):
+            self.assertIs(importlib.import_module(f"vehicle.migrations.{name}").frozen_schema, latest)
+        self.assertEqual(latest.CREATE, search_schema.CREATE)
+        self.assertEqual(latest.DROP, search_schema.DROP)
+        self.assertEqual(latest.fill_statements(), search_schema.fill_statements())
+
+
+# ---------------------------
+# Plate keys / autocomplete
+# ---------------------------
+class PlateAutocompleteTests(ServiceDataMixin, TestCase):
+
+    def test_plate_key_is_normalized_on_save(self):
+        vehicle = make_vehicle(self.customer, "mh 12-ef 3456")
+        self.assertEqual(vehicle.plate_key, "MH12EF3456")
+        vehicle.vehicle_number = "MH12 EF 3457"
+        vehicle.save(update_fields=["vehicle_number"])
+        vehicle.refresh_from_db()
+        self.assertEqual(vehicle.plate_key, "MH12EF3457")
+
+    def test_prefix_range(self):
+        from .plates import prefix_range
+        self.assertEqual(prefix_range("KA01AB"), ("KA01AB", "KA01AC"))
+        self.assertEqual(prefix_range("KA9"), ("KA9", "KA:"))
+
+    def test_autocomplete_for_center_with_open_bookings(self):
+        self.bookings[1].status = "Completed"
+        self.bookings[1].save()
+        other = make_customer("ola")
+        make_vehicle(other, "KA01AB7777")  # never booked at this center
+        self.client.force_login(self.center.user)
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse("api_plate_autocomplete"), {"q": "ka 01 ab", "limit": 2})
+        results = response.json()["results"]
+        self.assertEqual([r["vehicle_number"] for r in results], ["KA01AB0000", "KA01AB0001"])
+        self.assertEqual([b["id"] for b in results[0]["open_bookings"]], [self.bookings[0].pk])
+        self.assertEqual(results[1]["open_bookings"], [])
+
+    def test_autocomplete_for_customer(self):
+        self.client.force_login(self.customer.user)
+        results = self.client.get(reverse("api_plate_autocomplete"), {"q": "ka01-zz"}).json()["results"]
+        self.assertEqual([r["vehicle_number"] for r in results], ["KA01ZZ9999"])
+        self.assertEqual(self.client.get(reverse("api_plate_autocomplete"), {"q": " - "}).json()["results"], [])
+
+
+# ---------------------------
+# Read replica routing
+# ---------------------------
+@override_settings(STICKY_PRIMARY_SECONDS=10)
+class ReplicaRoutingTests(TransactionTestCase):
+    """
+    The replica is a copy of the primary taken with SQLite's backup API, so
+    reads that reach it see the data as of the copy.
+    """
+    databases = {"default", "replica"}
+
+    def setUp(self):
+        self.customer = make_customer("alice")
+        make_vehicle(self.customer, "KA01AB0001")
+        replica = connections["replica"]
+        workdir = tempfile.TemporaryDirectory()
+        old_name = replica.settings_dict["NAME"]
+        replica.close()
+        replica.settings_dict["NAME"] = os.path.join(workdir.name, "replica.sqlite3")
+
+        def restore():
+            replica.close()
+            replica.settings_dict["NAME"] = old_name
+            workdir.cleanup()
+        self.addCleanup(restore)
+        replica.ensure_connection()
+        connection.ensure_connection()
+        connection.connection.backup(replica.connection)
+        # written after the copy: only the primary has these
+        make_vehicle(self.customer, "KA01AB0002")
+        self.client.force_login(self.customer.user)
+        db_router.pin_cache().clear()
+        self.addCleanup(db_router.pin_cache().clear)
+
+    def plates(self):
+        return [v["vehicle_number"] for v in self.client.get(reverse("api_vehicles")).json()["results"]]
+
+    def test_get_reads_from_replica(self):
+        # the session only exists on the primary, yet the request is authenticated
+        self.assertEqual(self.plates(), ["KA01AB0001"])
+        self.assertNotIn(db_router.STICKY_COOKIE, self.client.cookies)
+
+    def test_write_pins_user_to_primary(self):
+        response = self.client.post(reverse("add_vehicle"), {
+            "vehicle_number": "KA01AB0003", "model": "Swift", "manufacturer": "Maruti", "year": 2020, "fuel_type": "Petrol",
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertNotIn(db_router.STICKY_COOKIE, response.cookies)
+        self.assertEqual(sorted(self.plates()), ["KA01AB0001", "KA01AB0002", "KA01AB0003"])
+        # the pin follows the user, not the browser
+        self.client = self.client_class()
+        self.client.force_login(self.customer.user)
+        self.assertEqual(len(self.plates()), 3)
+        db_router.pin_cache().delete(db_router.STICKY_KEY.format(self.customer.user_id))
+        self.assertEqual(self.plates(), ["KA01AB0001"])
+
+    async def test_asgi_write_pins_user_to_primary(self):
+        client = AsyncClient()
+        await client.aforce_login(self.customer.user)
+        response = await client.post(reverse("add_vehicle"), {
+            "vehicle_number": "KA01AB0003", "model": "Swift", "manufacturer": "Maruti", "year": 2020, "fuel_type": "Petrol",
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertNotIn(db_router.STICKY_COOKIE, response.cookies)
+        self.assertTrue(await db_router.pin_cache().aget(db_router.STICKY_KEY.format(self.customer.user_id)))
+
+    def test_anonymous_write_pins_client_by_cookie(self):
+        self.client.logout()
+        response = self.client.post(reverse("register_customer"), {
+            "username": "bob", "email": "bob@example.com", "password": "s3cret-pass", "confirm_password": "s3cret-pass",
+            "name": "Bob", "address": "2 Road", "phone": "555",
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response.cookies[db_router.STICKY_COOKIE]["max-age"], 10)
+
+    def test_outside_requests_use_primary(self):
+        self.assertEqual(Vehicle.objects.count(), 2)
+
+
+# ---------------------------
+# Server-Timing / slow-request log
+# ---------------------------
+@override_settings(SERVER_TIMING_HEADER=True)
+class ServerTimingTests(ServiceDataMixin, TestCase):
+
+    def metrics(self, response):
+        return {
+            metric.split(";")[0]: dict(part.split("=", 1) for part in metric.split(";")[1:])
+            for metric in response["Server-Timing"].split(", ")
+        }
+
+    def test_header_counts_the_requests_queries(self):
+        self.client.force_login(self.customer.user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("view_vehicle"))
+        metrics = self.metrics(response)
+        self.assertEqual(set(metrics), {"total", "view", "sql", "template"})
+        self.assertEqual(metrics["sql"]["desc"], f'"{len(queries)} queries (0 duplicate)"')
+        self.assertGreater(float(metrics["template"]["dur"]), 0)
+        self.assertGreaterEqual(float(metrics["total"]["dur"]), float(metrics["view"]["dur"]))
+
+    def test_duplicates_are_same_sql_and_parameters(self):
+        timings = timing.RequestTimings()
+        timings.record_query("SELECT 1 WHERE id = %s", (1,), 0.001)
+        timings.record_query("SELECT 1 WHERE id = %s", (2,), 0.001)
+        timings.record_query("SELECT 1 WHERE id = %s", [1], 0.001)
+        timings.record_query("INSERT INTO t VALUES (%s)", [[1], [2]], 0.001)
+        self.assertEqual((timings.queries, timings.duplicates), (4, 1))
+
+    @override_settings(SLOW_REQUEST_MS=0)
+    def test_slow_request_log(self):
+        self.client.force_login(self.center.user)
+        with self.assertLogs("vehicle.slow_requests", "WARNING") as logs:
+            self.client.get(reverse("view_bookings"))
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record["url_name"], "view_bookings")
+        self.assertEqual(record["view"], "vehicle.views.view_bookings")
+        self.assertEqual(record["status"], 200)
+        self.assertGreater(record["queries"], 0)
+
+    @override_settings(SLOW_REQUEST_MS=0)
+    def test_header_is_off_by_default_outside_debug(self):
+        self.client.force_login(self.customer.user)
+        with override_settings(), self.assertLogs("vehicle.slow_requests", "WARNING"):
+            del settings.SERVER_TIMING_HEADER
+            response = self.client.get(reverse("view_vehicle"))
+        self.assertNotIn("Server-Timing", response)
+
+    @override_settings(SLOW_REQUEST_MS=None)
+    async def test_asgi_requests_are_timed(self):
+        client = AsyncClient()
+        await client.aforce_login(self.customer.user)
+        response = await client.get(reverse("view_history"))
+        metrics = self.metrics(response)
+        self.assertNotEqual(metrics["sql"]["desc"], '"0 queries (0 duplicate)"')
+        self.assertGreater(float(metrics["view"]["dur"]), 0)
+
+
+# ---------------------------
+# Route benchmarks
+# ---------------------------
+class BenchmarkTests(TestCase):
+
+    def setUp(self):
+        self.enterContext(override_settings(INVOICE_DOCUMENT_DIR=self.enterContext(tempfile.TemporaryDirectory())))
+
+    def test_every_route_is_benchmarked(self):
+        names = {p.name for p in vehicle_urls.urlpatterns if isinstance(p, URLPattern)}
+        self.assertEqual(names, {route.name for route in benchmarks.ROUTES})
+
+    def test_run_covers_every_route_without_errors(self):
+        dataset = benchmarks.seed(**benchmarks.SCALES["tiny"])
+        results = benchmarks.run(dataset, requests=1)
+        self.assertEqual(results["meta"]["scale"], benchmarks.SCALES["tiny"])
+        self.assertEqual(len(results["routes"]), sum(len(route.who) for route in benchmarks.ROUTES))
+        for key, row in results["routes"].items():
+            with self.subTest(route=key):
+                self.assertLess(row["status"], 500)
+                self.assertLessEqual(row["p50_ms"], row["p95_ms"])
+        self.assertEqual(results["routes"]["view_vehicle[customer]"]["queries"], 3)
+        self.assertEqual(results["routes"]["home[anonymous]"]["queries"], 0)
+
+        # a regression is measured again, alone, and still reported when it persists
+        baseline = {**results, "routes": {"view_vehicle[customer]": {**results["routes"]["view_vehicle[customer]"],
+                                                                     "queries": 2}}}
+        with mock.patch.object(benchmarks, "run", wraps=benchmarks.run) as rerun:
+            again = benchmarks.remeasure(dataset, results, baseline)
+        self.assertEqual([route.name for route in rerun.call_args.args[2]], ["view_vehicle"])
+        self.assertEqual(benchmarks.compare(again, baseline), ["view_vehicle[customer]: queries 2 -> 3"])
+
+    def test_compare(self):
+        row = {"status": 200, "p50_ms": 10.0, "p95_ms": 20.0, "queries": 4, "peak_kib": 100.0}
+        baseline = {"routes": {"a[customer]": row, "b[center]": row}}
+        noisy = {"routes": {"a[customer]": {**row, "p95_ms": 21.9}, "b[center]": {**row, "p50_ms": 12.4}}}
+        self.assertEqual(benchmarks.compare(noisy, baseline), [])
+        worse = {"routes": {"a[customer]": {**row, "queries": 5, "p95_ms": 30.0}}}
+        self.assertEqual(benchmarks.compare(worse, baseline), [
+            "a[customer]: queries 4 -> 5",
+            "a[customer]: p95_ms 20.0 -> 30.0",
+            "b[center]: not measured",
+        ])
+
+    def test_compare_scales_latency_by_calibration(self):
+        row = {"status": 200, "p50_ms": 10.0, "p95_ms": 20.0, "queries": 4, "peak_kib": 100.0}
+        baseline = {"meta": {"calibration_ms": 10.0}, "routes": {"a[customer]": row}}
+        # twice as slow a machine: twice the latency is no regression, one more query still is
+        slower = {"meta": {"calibration_ms": 20.0}, "routes": {"a[customer]": {**row, "p50_ms": 20.0, "p95_ms": 40.0}}}
+        self.assertEqual(benchmarks.compare(slower, baseline), [])
+        slower["routes"]["a[customer]"]["queries"] = 5
+        self.assertEqual(benchmarks.compare(slower, baseline), ["a[customer]: queries 4 -> 5"])
+        # below the absolute floor a large relative jump is noise
+        tiny = {"routes": {"a[customer]": {**row, "p50_ms": 1.0, "p95_ms": 2.0}}}
+        jumpy = {"routes": {"a[customer]": {**row, "p50_ms": 4.0, "p95_ms": 6.0}}}
+        self.assertEqual(benchmarks.compare(jumpy, tiny), [])
+
+    def test_merge_replaces_only_the_rerecorded_routes(self):
+        row = {"status": 200, "p50_ms": 10.0, "p95_ms": 20.0, "queries": 4, "peak_kib": 100.0}
+        baseline = {"meta": {"calibration_ms": 10.0}, "routes": {"a[customer]": row, "b[center]": row}}
+        rerun = {"meta": {"calibration_ms": 20.0}, "routes": {"b[center]": {**row, "p50_ms": 30.0, "queries": 3}}}
+        merged = benchmarks.merge(rerun, baseline)
+        self.assertEqual(merged["meta"], baseline["meta"])
+        self.assertEqual(merged["routes"]["a[customer]"], row)
+        self.assertEqual(merged["routes"]["b[center]"], {**row, "p50_ms": 15.0, "p95_ms": 10.0, "queries": 3})
+
+
+# ---------------------------
+# Synthetic data generator
+# ---------------------------
+class SyntheticDataTests(TestCase):
+
+    def generate(self, seed=0):
+        plan = synthetic.Plan(2, 20, 2, 3, seed=seed, days=60, password_hash=self.password_hash)
+        synthetic.generate(plan)
+        return plan
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.password_hash = make_password(synthetic.DEFAULT_PASSWORD)
+
+    def test_rows_are_consistent(self):
+        plan = self.generate()
+        self.assertEqual(Customer.objects.count(), 20)
+        self.assertEqual(Vehicle.objects.count(), 40)
+        self.assertEqual(ServiceBooking.objects.count(), 120)
+        self.assertEqual(Staff.objects.count(), 2 * synthetic.STAFF_PER_CENTER)
+        self.assertFalse(ServiceBooking.objects.exclude(customer=F("vehicle__customer")).exists())
+        for booking in ServiceBooking.objects.prefetch_related("statuses"):
+            trail = sorted(booking.statuses.all(), key=lambda s: s.updated_on)
+            self.assertEqual(trail[-1].current_status, booking.status)
+            self.assertLess(booking.booking_date.date(), booking.scheduled_date)
+        completed = ServiceBooking.objects.filter(status="Completed")
+        self.assertEqual(Invoice.objects.count(), completed.count())
+        self.assertEqual(ServiceHistory.objects.count(), completed.count())
+        self.assertFalse(JobAssignment.objects.exclude(staff__service_center=F("booking__service_center")).exists())
+
+        # derived rows agree with the source tables
+        expected = counters.compute_counts(plan.center_ids)
+        for counter in DashboardCounter.objects.all():
+            self.assertEqual(counter.completed, expected[counter.service_center_id]["completed"])
+        self.assertEqual(
+            sum(BookingSlot.objects.values_list("booked", flat=True)),
+            ServiceBooking.objects.exclude(status="Cancelled").count(),
+        )
+        self.assertEqual(sum(DailyRollup.objects.values_list("invoices", flat=True)), Invoice.objects.count())
+        customer = Customer.objects.first()
+        self.assertTrue(search.ranked_ids(search.owner_token(customer=customer), customer.name.split()[0]))
+
+        # generated users log in with the shared password, and new rows get fresh ids
+        self.assertTrue(self.client.login(username=customer.user.username, password=synthetic.DEFAULT_PASSWORD))
+        make_vehicle(customer, "NEW 01 AA 0001")
+
+    def test_same_seed_same_rows(self):
+        def snapshot():
+            return list(
+                ServiceBooking.objects.order_by("id")
+                .values_list("status", "scheduled_date", "description", "vehicle__model")
+            )
+        self.generate(seed=7)
+        first = snapshot()
+        User.objects.all().delete()
+        self.generate(seed=7)
+        self.assertEqual(snapshot(), first)
+        User.objects.all().delete()
+        self.generate(seed=8)
+        self.assertNotEqual(snapshot(), first)
+
+
+# ---------------------------
+# Per-request role / profile
+# ---------------------------
+class UserRoleTests(ServiceDataMixin, TestCase):
+
+    def request_as(self, user, name="home"):
+        if user is not None:
+            self.client.force_login(user)
+        return self.client.get(reverse(name)).wsgi_request
+
+    def test_role_and_profile(self):
+        for user, role, profile in (
+            (self.customer.user, "customer", self.customer),
+            (self.center.user, "servicecenter", self.center),
+            (User.objects.create_user("nobody"), None, None),
+            (None, None, None),
+        ):
+            with self.subTest(role=role, user=user):
+                request = self.request_as(user)
+                self.assertEqual(request.role, role)
+                self.assertEqual(request.profile or None, profile)
+                self.client.logout()
+
+    def test_profile_comes_with_the_user(self):
+        self.client.force_login(self.center.user)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse("view_bookings"))
+        lookups = ('SELECT "vehicle_customer"', 'SELECT "vehicle_servicecenter"')
+        self.assertEqual([q["sql"] for q in queries if q["sql"].startswith(lookups)], [])
+
+    def test_profile_is_fresh_on_every_request(self):
+        self.request_as(self.center.user)
+        ServiceCenter.objects.filter(pk=self.center.pk).update(name="Renamed")
+        self.assertEqual(self.request_as(self.center.user).profile.name, "Renamed")
+
+    def test_requests_that_skip_the_user_skip_the_lookup(self):
+        self.client.force_login(self.center.user)
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse("auto_assign_pending"))
+        self.assertEqual(response.status_code, 405)
+
+    def test_sessions_from_the_model_backend_still_work(self):
+        self.client.force_login(self.customer.user, backend="django.contrib.auth.backends.ModelBackend")
+        response = self.client.get(reverse("view_vehicle"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.wsgi_request.profile, self.customer)
+
+    async def test_asgi_requests_get_the_role(self):
+        client = AsyncClient()
+        await client.aforce_login(self.center.user)
+        response = await client.get(reverse("view_bookings"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.asgi_request.role, "servicecenter")
+        self.assertEqual(response.asgi_request.profile, self.center)
+
+    async def test_asgi_sessions_from_the_model_backend_still_work(self):
+        client = AsyncClient()
+        await client.aforce_login(self.customer.user, backend="django.contrib.auth.backends.ModelBackend")
+        response = await client.get(reverse("view_history"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.asgi_request.profile, self.customer)
+
+
+# ---------------------------
+# Recording service history
+# ---------------------------
+class RecordHistoryTests(ServiceDataMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.other = make_customer("mallory")
+        cls.other_booking = make_booking(cls.other, make_vehicle(cls.other, "DL01ZZ0001"), make_servicecenter("elsewhere"))
+
+    def post(self, user, booking, vehicle=None):
+        self.client.force_login(user)
+        return self.client.post(reverse("record_history"), {
+            "vehicle": (vehicle or booking.vehicle).pk, "booking": booking.pk,
+            "service_date": date.today().isoformat(), "details": "Brake pads", "cost": "900.00",
+        })
+
+    def test_form_offers_only_the_owners_rows(self):
+        booked = [b.vehicle for b in self.bookings]
+        for user, bookings, vehicles in (
+            (self.customer.user, self.bookings, [*booked, self.spare_vehicle]),
+            (self.center.user, self.bookings, booked),
+            (self.other.user, [self.other_booking], [self.other_booking.vehicle]),
+        ):
+            with self.subTest(user=user.username):
+                self.client.force_login(user)
+                form = self.client.get(reverse("record_history")).context["form"]
+                self.assertCountEqual(form.fields["booking"].queryset, bookings)
+                self.assertCountEqual(form.fields["vehicle"].queryset, vehicles)
+
+    def test_another_owners_booking_is_rejected(self):
+        count = ServiceHistory.objects.count()
+        for user in (self.customer.user, self.center.user):
+            with self.subTest(user=user.username):
+                response = self.post(user, self.other_booking)
+                self.assertEqual(response.status_code, 200)
+                self.assertIn("booking", response.context["form"].errors)
+        response = self.post(self.customer.user, self.bookings[0], vehicle=self.vehicles[1])
+        self.assertIn("booking", response.context["form"].errors)
+        self.assertEqual(ServiceHistory.objects.count(), count)
+
+    def test_history_is_recorded_for_the_bookings_customer(self):
+        self.post(self.center.user, self.bookings[1])
+        history = ServiceHistory.objects.latest("id")
+        self.assertEqual((history.customer, history.service_center, history.booking),
+                         (self.customer, self.center, self.bookings[1]))
+
+
+# ---------------------------
+# Archive of closed bookings
+# ---------------------------
+class ArchiveTests(ServiceDataMixin, TestCase):
+
+    def setUp(self):
+        self.done, self.cancelled, self.open = self.bookings
+        Invoice.objects.create(booking=self.done, service_center=self.center, total_amount=900, payment_status="Paid")
+        ServiceStatus.objects.create(booking=self.done, current_status="Completed")
+        ServiceBooking.objects.filter(pk=self.done.pk).update(status="Completed")
+        ServiceBooking.objects.filter(pk=self.cancelled.pk).update(status="Cancelled")
+        self.age(self.bookings, days=400)
+        DashboardCounter.objects.all().delete()
+        counters.counters_for(self.center)
+
+    def age(self, bookings, days):
+        ServiceBooking.objects.filter(pk__in=[b.pk for b in bookings]).update(
+            updated_at=timezone.now() - timedelta(days=days)
+        )
+
+    def stored_counts(self):
+        counter = DashboardCounter.objects.get(service_center=self.center)
+        return {field: getattr(counter, field) for field in counters.COUNTER_FIELDS}
+
+    def test_moves_closed_bookings_with_their_rows(self):
+        last_changed = ServiceBooking.objects.get(pk=self.done.pk).updated_at
+        moved = archive.archive(days=365)
+        archived_ids = {self.done.pk, self.cancelled.pk}
+        self.assertEqual(set(ArchivedBooking.objects.values_list("id", flat=True)), archived_ids)
+        self.assertEqual(list(ServiceBooking.objects.values_list("id", flat=True)), [self.open.pk])
+        self.assertEqual(moved["vehicle.ArchivedBooking"], 2)
+        self.assertEqual(moved["vehicle.ArchivedHistory"], 2)
+        self.assertEqual(ArchivedInvoice.objects.get().booking_id, self.done.pk)
+        self.assertEqual(
+            sorted(ArchivedStatus.objects.values_list("current_status", flat=True)), ["Completed", "Pending", "Pending"]
+        )
+        self.assertEqual(ArchivedAssignment.objects.count(), 2)
+        self.assertFalse(ServiceHistory.objects.filter(booking_id__in=archived_ids).exists())
+        self.assertEqual(ArchivedBooking.objects.get(pk=self.done.pk).updated_at, last_changed)
+
+    def test_recent_unpaid_and_reopened_bookings_stay(self):
+        Invoice.objects.filter(booking=self.done).update(payment_status="Unpaid")
+        self.age([self.cancelled], days=30)
+        self.assertEqual(archive.archive(days=365), {})
+        self.assertEqual(ServiceBooking.objects.count(), 3)
+
+        # reopened after the batch was picked: the transaction re-checks
+        before = timezone.now() - timedelta(days=365)
+        ServiceBooking.objects.filter(pk=self.done.pk).update(status="Pending")
+        self.assertEqual(archive.archive_batch([self.done.pk], before), {})
+
+    def test_counters_and_rollups_count_the_archive(self):
+        counts = self.stored_counts()
+        rollup_rows = rollups.compute()
+        archive.archive(days=365)
+        self.assertEqual(counters.compute_counts()[self.center.pk], counts)
+        self.assertEqual(rollups.compute(), rollup_rows)
+
+        # the vehicle cascade takes archived bookings along
+        self.client.force_login(self.customer.user)
+        self.client.post(reverse("delete_vehicle", kwargs={"pk": self.done.vehicle_id}))
+        self.assertFalse(ArchivedBooking.objects.filter(pk=self.done.pk).exists())
+        self.assertEqual(self.stored_counts(), counters.compute_counts()[self.center.pk])
+
+    def test_history_and_exports_read_the_archive_when_asked(self):
+        archive.archive(days=365)
+        self.client.force_login(self.customer.user)
+        current = self.client.get(reverse("view_history")).context["histories"]
+        self.assertEqual([h.vehicle.vehicle_number for h in current], [self.open.vehicle.vehicle_number])
+        response = self.client.get(reverse("view_history"), {"archived": "1"})
+        self.assertTrue(response.context["archived"])
+        self.assertEqual(len(response.context["histories"]), 2)
+
+        export = b"".join(self.client.get(reverse("export_history"), {"archived": "1"}).streaming_content).decode()
+        self.assertEqual(len(export.splitlines()), 3)
+        self.client.force_login(self.center.user)
+        export = b"".join(self.client.get(
+            reverse("export_invoices"), {"archived": "1", "format": "ndjson"},
+        ).streaming_content)
+        self.assertEqual(json.loads(export)["booking_id"], self.done.pk)
+
+    def test_command_works_in_batches(self):
+        out = StringIO()
+        with mock.patch.object(archive, "archive_batch", wraps=archive.archive_batch) as batch:
+            call_command("archive_bookings", "--days", "365", "--batch-size", "1", stdout=out)
+        self.assertEqual(batch.call_count, 2)
+        self.assertIn("Archived 2 booking(s).", out.getvalue())
+
+
+# ---------------------------
+# Invoice documents
+# ---------------------------
+class InvoiceDocumentTests(ServiceDataMixin, TestCase):
+
+    def setUp(self):
+        self.use_temporary_document_dir()
+        self.invoice = self.make_invoice()
+        self.url = reverse("invoice_document", kwargs={"pk": self.invoice.pk})
+
+    def test_pdf_and_html(self):
+        self.client.force_login(self.center.user)
+        response = self.client.get(self.url, {"format": "pdf"})
+        pdf = b"".join(response.streaming_content)
+        self.assertEqual(response["Content-Type"], "application/pdf")
+        self.assertIn(f'filename="invoice-{self.invoice.pk}.pdf"', response["Content-Disposition"])
+        self.assertTrue(pdf.startswith(b"%PDF-1.4\n") and pdf.endswith(b"%%EOF\n"))
+        self.assertIn(self.vehicles[0].vehicle_number.encode(), pdf)
+        # every xref entry points at its object
+        xref = int(pdf.rsplit(b"startxref\n", 1)[1].split()[0])
+        self.assertTrue(pdf[xref:].startswith(b"xref\n"))
+        offsets = [int(line[:10]) for line in pdf[xref:].splitlines()[3:8]]
+        for number, offset in enumerate(offsets, start=1):
+            self.assertTrue(pdf[offset:].startswith(b"%d 0 obj" % number))
+
+        html = b"".join(self.client.get(self.url).streaming_content).decode()
+        self.assertIn("Invoice #%d" % self.invoice.pk, html)
+        self.assertIn(self.customer.name, html)
+        self.assertEqual(self.client.get(self.url, {"format": "doc"}).status_code, 400)
+
+    def test_only_the_center_and_the_customer(self):
+        for user, status in ((self.customer.user, 200), (make_customer("mallory").user, 403),
+                             (make_servicecenter("rival").user, 403)):
+            with self.subTest(user=user.username):
+                self.client.force_login(user)
+                self.assertEqual(self.client.get(self.url).status_code, status)
+
+    def test_unchanged_documents_are_not_rendered_again(self):
+        self.client.force_login(self.customer.user)
+        with mock.patch.object(invoices, "render", wraps=invoices.render) as render:
+            first = self.client.get(self.url, {"format": "pdf"})
+            self.client.get(self.url, {"format": "pdf"})
+            self.assertEqual(render.call_count, 1)
+            revalidated = self.client.get(self.url, {"format": "pdf"}, HTTP_IF_NONE_MATCH=first["ETag"])
+            self.assertEqual(revalidated.status_code, 304)
+
+            Customer.objects.filter(pk=self.customer.pk).update(address="9 New Street")
+            changed = self.client.get(self.url, {"format": "pdf"})
+            self.assertEqual(render.call_count, 2)
+            self.assertNotEqual(changed["ETag"], first["ETag"])
+            self.assertIn(b"9 New Street", b"".join(changed.streaming_content))
+
+    def test_deleted_or_failed_files_are_rendered_again(self):
+        data = invoices.document_data(invoices.document_rows(Invoice.objects.all()).get(pk=self.invoice.pk))
+        key, document, rendered = invoices.cached_document(data, "pdf")
+        self.assertTrue(rendered)
+        content = document.read()
+        _, document, rendered = invoices.cached_document(data, "pdf")
+        with document:
+            self.assertEqual((document.read(), rendered), (content, False))
+
+        invoices.stored_document(data, "pdf")[1].unlink()  # cleaned up between requests
+        _, document, rendered = invoices.cached_document(data, "pdf")
+        self.assertEqual((document.read(), rendered), (content, True))
+
+        with mock.patch.object(invoices.os, "replace", side_effect=OSError("disk full")):
+            with self.assertRaises(OSError):
+                invoices.cached_document({**data, "total_amount": "1.00"}, "pdf")
+        root = invoices.stored_document(data, "pdf")[1].parent.parent
+        self.assertEqual([p.suffix for p in root.rglob("*") if p.is_file()], [".pdf"])
+
+    def test_long_descriptions_wrap_onto_more_pages(self):
+        words = " ".join(f"part{i:03d}" for i in range(600))
+        ServiceBooking.objects.filter(pk=self.invoice.booking_id).update(description=words)
+        data = invoices.document_data(invoices.document_rows(Invoice.objects.all()).get(pk=self.invoice.pk))
+        pdf = invoices.render_pdf(data)
+        pages = int(pdf.split(b"/Count ", 1)[1].split()[0])
+        self.assertGreater(pages, 1)
+        self.assertEqual(pdf.count(b"/Type /Page "), pages)
+        lines = re.findall(rb"\((.*?)\) Tj", pdf)
+        self.assertLessEqual(max(len(line) for line in lines), invoices.LINE_WIDTH)
+        for i in (0, 299, 599):
+            self.assertIn(b"part%03d" % i, pdf)
+        # every xref entry points at its object
+        xref = int(pdf.rsplit(b"startxref\n", 1)[1].split()[0])
+        offsets = [int(line[:10]) for line in pdf[xref:].splitlines()[3:3 + 3 + 2 * pages]]
+        for number, offset in enumerate(offsets, start=1):
+            self.assertTrue(pdf[offset:].startswith(b"%d 0 obj" % number))
+
+    def test_archived_invoices_are_served(self):
+        booking = self.invoice.booking
+        ServiceBooking.objects.filter(pk=booking.pk).update(
+            status="Completed", updated_at=timezone.now() - timedelta(days=400)
+        )
+        archive.archive(days=365)
+        self.client.force_login(self.customer.user)
+        response = self.client.get(self.url, {"format": "pdf"})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(self.vehicles[0].vehicle_number.encode(), b"".join(response.streaming_content))
+        detail = self.client.get(reverse("booking_detail", kwargs={"pk": booking.pk}), {"archived": "1"})
+        self.assertContains(detail, self.url)
+
+    def test_batch_reads_invoices_as_it_renders(self):
+        self.add_rows(12)
+        for booking in ServiceBooking.objects.filter(invoice__isnull=True):
+            self.make_invoice(booking)
+        names = [f"invoice-{pk}.html" for pk in Invoice.objects.order_by("id").values_list("pk", flat=True)]
+        for workers, queued in ((1, 1), (2, 2 * invoices.IN_FLIGHT)):
+            with self.subTest(workers=workers):
+                with mock.patch.object(invoices, "document_data", wraps=invoices.document_data) as read:
+                    batch = invoices.render_batch(Invoice.objects.order_by("id"), "html", workers)
+                    first = next(batch)
+                    self.assertEqual(read.call_count, queued)
+                    rest = list(batch)
+                self.assertEqual([name for name, _, _ in [first, *rest]], names)
+
+    def test_month_batch_streams_into_one_archive(self):
+        second = self.make_invoice(self.bookings[1])
+        Invoice.objects.filter(pk=second.pk).update(issue_date=date(2026, 8, 31))
+        Invoice.objects.filter(pk=self.invoice.pk).update(issue_date=date(2026, 9, 30))
+        self.make_invoice(self.bookings[2])  # issued today, another month
+
+        with tempfile.TemporaryDirectory() as tmp:
+            output = os.path.join(tmp, "september.zip")
+            for run in ("1 rendered, 0 from the cache", "0 rendered, 1 from the cache"):
+                out = StringIO()
+                call_command("render_invoices", self.center.pk, "--month", "2026-09", "--workers", "2",
+                             "--output", output, stdout=out)
+                self.assertIn(run, out.getvalue())
+            with zipfile.ZipFile(output) as archive:
+                self.assertEqual(archive.namelist(), [f"invoice-{self.invoice.pk}.pdf"])
+                self.assertTrue(archive.read(archive.namelist()[0]).startswith(b"%PDF"))
+
+
+# ---------------------------
+# Booking detail
+# ---------------------------
+class BookingDetailTests(ServiceDataMixin, TestCase):
+
+    def lengthen_timelines(self, count):
+        for booking in self.bookings:
+            ServiceStatus.objects.bulk_create(
+                ServiceStatus(booking=booking, current_status="In Progress", remarks=f"step {i}") for i in range(count)
+            )
+            JobAssignment.objects.bulk_create(JobAssignment(booking=booking, staff=self.staff) for _ in range(count))
+            if count and not Invoice.objects.filter(booking=booking).exists():
+                self.make_invoice(booking)
+
+    def test_query_count_does_not_grow_with_the_timeline(self):
+        self.client.force_login(self.center.user)
+        detail = reverse("booking_detail", kwargs={"pk": self.bookings[0].pk})
+        bulk = reverse("booking_details")
+        ids = ",".join(str(b.pk) for b in self.bookings)
+        timeline = 1
+        for extra in (0, 1, 25):
+            with self.subTest(extra=extra):
+                self.lengthen_timelines(extra)
+                timeline += extra
+                # session, user with its center, bookings with vehicle/customer/center/invoice, statuses, assignments
+                with self.assertNumQueries(5):
+                    response = self.client.get(detail)
+                with self.assertNumQueries(5):
+                    bulk_response = self.client.get(bulk, {"ids": ids})
+                self.assertEqual(len(response.context["bookings"][0].statuses.all()), timeline)
+                self.assertEqual(len(bulk_response.context["bookings"]), 3)
+                # the prefetched rows know their booking: __str__ walks booking.vehicle without a query
+                with self.assertNumQueries(0):
+                    for booking in bulk_response.context["bookings"]:
+                        [str(row) for row in [*booking.statuses.all(), *booking.assignments.all()]]
+                        if timeline > 1:
+                            str(booking.invoice)
+
+    def test_owners_only_in_the_order_asked(self):
+        other = make_customer("mallory")
+        theirs = make_booking(other, make_vehicle(other, "KA09ZZ0001"), self.center)
+        self.client.force_login(self.customer.user)
+        self.assertEqual(self.client.get(reverse("booking_detail", kwargs={"pk": theirs.pk})).status_code, 404)
+        first, second = self.bookings[2], self.bookings[0]
+        response = self.client.get(reverse("booking_details"), {"ids": f"{first.pk},{theirs.pk},{second.pk},{first.pk}"})
+        self.assertEqual([b.pk for b in response.context["bookings"]], [first.pk, second.pk])
+
+        self.assertEqual(self.client.get(reverse("booking_details"), {"ids": "1,x"}).status_code, 400)
+        too_many = ",".join(str(i) for i in range(1, views.MAX_DETAIL_BOOKINGS + 2))
+        self.assertEqual(self.client.get(reverse("booking_details"), {"ids": too_many}).status_code, 400)
+
+    def test_archived_booking(self):
+        booking = self.bookings[0]
+        ServiceBooking.objects.filter(pk=booking.pk).update(
+            status="Completed", updated_at=timezone.now() - timedelta(days=400)
+        )
+        archive.archive(days=365)
+        self.client.force_login(self.center.user)
+        url = reverse("booking_detail", kwargs={"pk": booking.pk})
+        self.assertEqual(self.client.get(url).status_code, 404)
+        with self.assertNumQueries(5):
+            response = self.client.get(url, {"archived": "1"})
+        archived = response.context["bookings"][0]
+        self.assertEqual([s.current_status for s in archived.statuses.all()], ["Pending"])
+        self.assertEqual([a.staff.name for a in archived.assignments.all()], ["Bob"])
+        self.assertContains(response, "(archived)")
+
+
+# ---------------------------
+# Change feed
+# ---------------------------
+class ChangeFeedTests(ServiceDataMixin, TestCase):
+
+    def sync(self, user, after=0, limit=None):
+        """Every entry ``user`` gets after ``after``, page by page, and the final cursor."""
+        self.client.force_login(user)
+        results = []
+        while True:
+            params = {"after": after} if limit is None else {"after": after, "limit": limit}
+            body = self.client.get(reverse("api_changes"), params).json()
+            results += body["results"]
+            after = body["cursor"]
+            if not body["has_more"]:
+                return results, after
+
+    def summary(self, results):
+        return [(r["kind"], r["action"]) for r in results]
+
+    def test_view_writes_are_logged_for_each_owner(self):
+        booking = self.bookings[0]
+        self.client.force_login(self.customer.user)
+        self.client.post(reverse("booking_service"), {
+            "vehicle": self.vehicles[1].pk, "service_center": self.center.pk,
+            "scheduled_date": date.today().isoformat(), "description": "Brakes",
+        })
+        self.client.post(reverse("edit_vehicle", args=[self.vehicles[1].pk]), {
+            "vehicle_number": "KA01AB7777", "model": "Swift", "manufacturer": "Maruti", "year": 2021,
+            "fuel_type": "Petrol",
+        })
+        self.client.force_login(self.center.user)
+        self.client.post(reverse("update_booking_status", args=[booking.pk]), {"current_status": "In Progress"})
+        self.client.post(reverse("assign_job", args=[booking.pk]), {"staff": self.staff.pk})
+        self.client.post(reverse("generate_invoice", args=[booking.pk]),
+                         {"total_amount": "2500.00", "payment_status": "Unpaid"})
+        self.client.force_login(self.customer.user)
+        self.client.post(reverse("record_history"), {
+            "vehicle": booking.vehicle_id, "booking": booking.pk, "service_date": date.today().isoformat(),
+            "details": "Brake pads", "cost": "900.00",
+        })
+
+        shared = [
+            ("booking", "created"), ("status", "created"), ("booking", "updated"), ("assignment", "created"),
+            ("invoice", "created"), ("status", "created"), ("booking", "updated"),
+        ]
+        customer_feed, _ = self.sync(self.customer.user)
+        center_feed, _ = self.sync(self.center.user)
+        # a vehicle is its customer's, and so is history the customer records
+        self.assertEqual(
+            self.summary(customer_feed), [shared[0], ("vehicle", "updated"), *shared[1:], ("history", "created")],
+        )
+        self.assertEqual(self.summary(center_feed), shared)
+        # snapshots are taken after the change
+        invoice = customer_feed[-4]
+        self.assertEqual((invoice["data"]["total_amount"], invoice["data"]["payment_status"]), ("2500.00", "Unpaid"))
+        self.assertEqual(customer_feed[-2]["data"]["status"], "Completed")
+        self.assertEqual(customer_feed[1]["data"]["vehicle_number"], "KA01AB7777")
+
+    def test_bulk_paths_are_logged(self):
+        changes_before = ChangeLog.objects.count()
+        self.client.force_login(self.center.user)
+        self.client.post(reverse("bulk_update_status"), {
+            "bookings": [b.pk for b in self.bookings[:2]], "status": "In Progress", "remarks": "Started",
+        })
+        self.assertEqual(ChangeLog.objects.count() - changes_before, 8)
+        center_feed, cursor = self.sync(self.center.user)
+        self.assertEqual(self.summary(center_feed), [("status", "created")] * 2 + [("booking", "updated")] * 2)
+        self.assertEqual({r["data"]["status"] for r in center_feed[2:]}, {"In Progress"})
+
+        pending = make_booking(self.customer, self.spare_vehicle, self.center)
+        assignment.auto_assign(self.center, [pending.pk])
+        center_feed, _ = self.sync(self.center.user, cursor)
+        self.assertEqual(self.summary(center_feed), [("assignment", "created")])
+        self.assertEqual(center_feed[0]["data"]["booking_id"], pending.pk)
+
+    def test_entries_commit_with_the_write(self):
+        booking = self.bookings[0]
+        self.client.force_login(self.center.user)
+        with mock.patch.object(changes, "write", side_effect=RuntimeError("log unavailable")):
+            with self.assertRaises(RuntimeError):
+                self.client.post(reverse("update_booking_status", args=[booking.pk]), {"current_status": "Cancelled"})
+        booking.refresh_from_db()
+        self.assertEqual(booking.status, "Pending")
+        self.assertEqual(ServiceStatus.objects.filter(booking=booking).count(), 1)
+        self.assertFalse(ChangeLog.objects.exists())
+
+    def test_feed_is_scoped_and_paged_by_cursor(self):
+        other = make_customer("mallory")
+        make_vehicle(other, "KA09ZZ0001")
+        for i in range(5):
+            self.client.force_login(self.customer.user)
+            self.client.post(reverse("edit_vehicle", args=[self.vehicles[0].pk]), {
+                "vehicle_number": f"KA01AB900{i}", "model": "Swift", "manufacturer": "Maruti", "year": 2020,
+                "fuel_type": "Petrol",
+            })
+        everything, cursor = self.sync(self.customer.user)
+        paged, paged_cursor = self.sync(self.customer.user, limit=2)
+        self.assertEqual(len(everything), 5)
+        self.assertEqual(paged, everything)
+        self.assertEqual(paged_cursor, cursor)
+        self.assertEqual([r["cursor"] for r in everything], sorted(r["cursor"] for r in everything))
+        self.assertEqual(self.sync(self.customer.user, cursor), ([], cursor))
+        # nothing of alice's reaches another customer or the center
+        self.assertEqual(self.sync(other.user)[0], [])
+        self.assertEqual(self.sync(self.center.user)[0], [])
+
+        self.client.force_login(self.customer.user)
+        self.assertEqual(self.client.get(reverse("api_changes"), {"after": "x"}).status_code, 400)
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse("api_changes")).status_code, 401)
+
+    def test_sync_cost_does_not_grow_with_the_log(self):
+        owner = changes.owner_token("servicecenter", self.center.pk)
+        self.client.force_login(self.center.user)
+        for backlog in (10, 2000):
+            with self.subTest(backlog=backlog):
+                ChangeLog.objects.bulk_create(
+                    ChangeLog(owner=owner if i % 2 else "customer:0", kind="booking", object_id=i, action="updated",
+                              data={"id": i})
+                    for i in range(backlog)
+                )
+                cursor = ChangeLog.objects.filter(owner=owner).order_by("-id").values_list("id", flat=True)[3]
+                # session, user with its center, entries after the cursor
+                with self.assertNumQueries(3):
+                    body = self.client.get(reverse("api_changes"), {"after": cursor}).json()
+                self.assertEqual(len(body["results"]), 3)
+
+    def test_compaction_keeps_the_newest_entry_per_row(self):
+        self.client.force_login(self.customer.user)
+        _, start = self.sync(self.customer.user)
+        for i in range(3):
+            self.client.post(reverse("edit_vehicle", args=[self.vehicles[0].pk]), {
+                "vehicle_number": f"KA01AB800{i}", "model": "Swift", "manufacturer": "Maruti", "year": 2020,
+                "fuel_type": "Petrol",
+            })
+        self.client.force_login(self.center.user)
+        self.client.post(reverse("update_booking_status", args=[self.bookings[0].pk]), {"current_status": "Cancelled"})
+        self.client.post(reverse("update_booking_status", args=[self.bookings[0].pk]), {"current_status": "Pending"})
+        before, _ = self.sync(self.customer.user, start)
+
+        out = StringIO()
+        call_command("compact_changes", "--batch-size", "1", stdout=out)
+        # two of the vehicle's entries, and the first booking update in each owner's feed
+        self.assertIn("Deleted 4 superseded", out.getvalue())
+        after, _ = self.sync(self.customer.user, start)
+        self.assertEqual(self.summary(after), [("vehicle", "updated"), ("status", "created"), ("status", "created"),
+                                               ("booking", "updated")])
+        self.assertEqual(after[0]["data"]["vehicle_number"], "KA01AB8002")
+        self.assertEqual(after[-1]["data"]["status"], "Pending")
+        self.assertEqual(after, [r for r in before if r in after])
+        self.assertEqual(changes.compact(), 0)
+
+    def test_deleting_a_vehicle_logs_its_bookings(self):
+        booking = self.bookings[0]
+        self.client.force_login(self.customer.user)
+        self.client.get(reverse("delete_vehicle", args=[booking.vehicle_id]))
+        customer_feed, _ = self.sync(self.customer.user)
+        center_feed, _ = self.sync(self.center.user)
+        self.assertEqual(
+            [(r["kind"], r["id"], r["action"]) for r in customer_feed],
+            [("booking", booking.pk, "deleted"), ("vehicle", booking.vehicle_id, "deleted")],
+        )
+        self.assertEqual([(r["kind"], r["id"], r["action"]) for r in center_feed], [("booking", booking.pk, "deleted")])
 
-# Create your tests here.
@@ -0,0 +1,165 @@
+"""
+Per-request timings: SQL, templates and the view.
+
+vehicle.middleware.server_timing starts a RequestTimings for each request in
+a context variable, which also reaches the threads sync_to_async runs ORM
+calls in. Two cheap hooks fill it in:
+
+- an execute wrapper installed on every database connection as it opens
+  (vehicle.signals), timing each query and counting repeats of the same
+  SQL with the same parameters;
+- the TimedDjangoTemplates backend, timing each top-level template render
+  (includes and inheritance happen inside it).
+
+Outside a request the hooks only look up the context variable. Queries run
+while a template renders count towards both ``sql`` and ``template``;
+those run while a streaming response is consumed are not counted.
+
+The middleware logs a JSON line to the ``vehicle.slow_requests`` logger for
+requests slower than ``settings.SLOW_REQUEST_MS``, always. It reports the
+totals in a ``Server-Timing`` header only when ``settings.SERVER_TIMING_HEADER``
+is on, which defaults to ``DEBUG``: the header tells any client how many
+queries a page makes and where its time goes.
+"""
+import contextvars
+import json
+import logging
+import time
+
+from django.conf import settings
+from django.template.backends.django import DjangoTemplates, Template, reraise
+from django.template.exceptions import TemplateDoesNotExist
+
+logger = logging.getLogger('vehicle.slow_requests')
+
+_current = contextvars.ContextVar('request_timings', default=None)
+
+
+class RequestTimings:
+    """Mutated in place, so ORM calls run in worker threads add to it too."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.total = None
+        self.view_started = None
+        self.view = 0.0
+        self.sql = 0.0
+        self.queries = 0
+        self.duplicates = 0
+        self.template = 0.0
+        self.view_func = None
+        self._seen = set()
+
+    def record_query(self, sql, params, elapsed):
+        self.queries += 1
+        self.sql += elapsed
+        try:
+            key = hash((sql, tuple(params) if isinstance(params, list) else params))
+        except TypeError:
+            # executemany() or unhashable parameters: judge by the SQL alone
+            key = hash(sql)
+        if key in self._seen:
+            self.duplicates += 1
+        else:
+            self._seen.add(key)
+
+    def finish(self):
+        self.total = time.perf_counter() - self.started
+        if self.view_started is not None:
+            self.view = time.perf_counter() - self.view_started
+
+    def header(self):
+        def ms(seconds):
+            return f'{seconds * 1000:.1f}'
+
+        return ', '.join([
+            f'total;dur={ms(self.total)}',
+            f'view;dur={ms(self.view)}',
+            f'sql;dur={ms(self.sql)};desc="{self.queries} queries ({self.duplicates} duplicate)"',
+            f'template;dur={ms(self.template)}',
+        ])
+
+    def as_dict(self, request, response):
+        match = request.resolver_match
+        view = self.view_func
+        return {
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'url_name': match.view_name if match else None,
+            'view': f'{view.__module__}.{view.__qualname__}' if view is not None else None,
+            'total_ms': round(self.total * 1000, 1),
+            'view_ms': round(self.view * 1000, 1),
+            'sql_ms': round(self.sql * 1000, 1),
+            'queries': self.queries,
+            'duplicate_queries': self.duplicates,
+            'template_ms': round(self.template * 1000, 1),
+        }
+
+
+def start():
+    """Begin timing a request; returns (timings, token) for ``stop``."""
+    timings = RequestTimings()
+    return timings, _current.set(timings)
+
+
+def stop(timings, token, request, response):
+    """Stop timing; adds the header when enabled and logs the request if it was slow."""
+    _current.reset(token)
+    timings.finish()
+    if getattr(settings, 'SERVER_TIMING_HEADER', settings.DEBUG):
+        response['Server-Timing'] = timings.header()
+    threshold = getattr(settings, 'SLOW_REQUEST_MS', None)
+    if threshold is not None and timings.total * 1000 >= threshold:
+        logger.warning(json.dumps(timings.as_dict(request, response)))
+    return response
+
+
+def view_started(view_func):
+    timings = _current.get()
+    if timings is not None:
+        timings.view_started = time.perf_counter()
+        timings.view_func = view_func
+
+
+def _time_query(execute, sql, params, many, context):
+    timings = _current.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.record_query(sql, params, time.perf_counter() - started)
+
+
+def instrument(connection):
+    """Time every query run on ``connection`` (idempotent: it may reconnect)."""
+    if _time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_time_query)
+
+
+class TimedTemplate(Template):
+
+    def render(self, context=None, request=None):
+        timings = _current.get()
+        if timings is None:
+            return super().render(context, request)
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            timings.template += time.perf_counter() - started
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """The Django template backend with render times added to the request's timings."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return TimedTemplate(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
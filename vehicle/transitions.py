@@ -0,0 +1,88 @@
+"""
+Status changes for many bookings at once.
+
+``bulk_transition`` writes one ServiceStatus row per booking with
+``bulk_create`` and sets ``ServiceBooking.status`` with a single UPDATE,
+all in one transaction. Neither sends model signals, so the work the
+single-booking path gets from ``save()`` and the signal receivers is done
+here explicitly: ``updated_at`` is set in the UPDATE (auto_now only runs
+on save), the dashboard counters and the slot index get their deltas, the
+affected dashboards are invalidated and the changes are logged for the
+change feed (vehicle.changes). Every delta comes from the rows as read,
+locked, inside the transaction, not from what the caller loaded earlier,
+so racing requests never apply the same change twice. On SQLite, which
+ignores select_for_update, the lock is the database write lock the
+transaction takes when it begins (transaction_mode IMMEDIATE).
+"""
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from . import changes, counters, dashboard_cache, scheduling
+from .models import JobAssignment, ServiceBooking, ServiceStatus
+
+
+def bulk_transition(service_center, bookings, status, remarks=''):
+    """
+    Move ``bookings`` (rows of ``service_center``, already ownership-checked)
+    to ``status``. Bookings already in that status are left alone. Returns
+    the number of bookings changed.
+    """
+    ids = [b.id for b in bookings]
+    if not ids:
+        return 0
+    now = timezone.now()
+
+    with transaction.atomic():
+        # the current rows, locked: another request may have moved some since ``bookings`` was read
+        changed = list(
+            ServiceBooking.objects.select_for_update()
+            .filter(id__in=ids, service_center=service_center).exclude(status=status)
+            .only(*changes.FIELDS[ServiceBooking][1]).order_by('id')
+        )
+        if not changed:
+            return 0
+        ids = [b.id for b in changed]
+        counters.ensure_rows([service_center.id])
+        statuses = ServiceStatus.objects.bulk_create(
+            ServiceStatus(booking_id=booking_id, current_status=status, remarks=remarks) for booking_id in ids
+        )
+        ServiceBooking.objects.filter(id__in=ids).update(status=status, updated_at=now)
+
+        # open assignments only move when a booking crosses between open and closed
+        crossing = [b.id for b in changed if counters.is_open(b.status) != counters.is_open(status)]
+        assignment_counts = Counter()
+        if crossing:
+            assignment_counts.update(dict(
+                JobAssignment.objects.filter(booking_id__in=crossing)
+                .values_list('booking_id').annotate(n=Count('id')).order_by()
+            ))
+        deltas = defaultdict(int)
+        for booking in changed:
+            for field, delta in counters.status_deltas(booking.status, status, assignment_counts[booking.id]).items():
+                deltas[field] += delta
+        counters.apply_deltas(service_center.id, **deltas)
+
+        slot_changes = Counter()
+        for booking in changed:
+            if (booking.status == scheduling.CANCELLED) != (status == scheduling.CANCELLED):
+                slot_changes[booking.scheduled_date] += 1
+        for day, count in slot_changes.items():
+            if status == scheduling.CANCELLED:
+                scheduling.release(service_center.id, day, count)
+            else:
+                scheduling.occupy(service_center.id, day, count)
+
+        dashboard_cache.invalidate('servicecenter', service_center.id)
+        for customer_id in {b.customer_id for b in changed}:
+            dashboard_cache.invalidate('customer', customer_id)
+
+        for booking in changed:
+            booking.status, booking.updated_at = status, now
+        changes.write(
+            changes.entries(statuses, changes.CREATED, {b.id: b for b in changed})
+            + changes.entries(changed, changes.UPDATED)
+        )
+    return len(changed)
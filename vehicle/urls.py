@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import api, views
 
 urlpatterns = [
     # Authentication
@@ -14,6 +14,7 @@ urlpatterns = [
     # dashboards
     path('dashboard/customer/', views.customer_dashboard, name='customer_dashboard'),
     path('dashboard/servicecenter/', views.servicecenter_dashboard, name='servicecenter_dashboard'),
+    path('dashboard/cache-stats/', views.dashboard_cache_stats, name='dashboard_cache_stats'),
 
     # vehicles
     path('vehicles/', views.view_vehicle, name='view_vehicle'),
@@ -24,17 +25,37 @@ urlpatterns = [
     # bookings
     path('bookings/new/', views.booking_service, name='booking_service'),
     path('bookings/', views.view_bookings, name='view_bookings'),
+    path('bookings/<int:pk>/', views.booking_detail, name='booking_detail'),
+    path('bookings/details/', views.booking_details, name='booking_details'),
 
     # service center operations
     path('servicecenter/staff/add/', views.add_staff, name='add_staff'),
     path('servicecenter/assign/<int:booking_id>/', views.assign_job, name='assign_job'),
+    path('servicecenter/assign/<int:booking_id>/auto/', views.auto_assign, name='auto_assign'),
+    path('servicecenter/assign/auto/', views.auto_assign, name='auto_assign_pending'),
     path('servicecenter/status/<int:pk>/update/', views.update_booking_status, name='update_booking_status'),
+    path('servicecenter/status/bulk/', views.bulk_update_status, name='bulk_update_status'),
     path('servicecenter/invoice/<int:booking_id>/generate/', views.generate_invoice, name='generate_invoice'),
+    path('servicecenter/reminders/', views.send_reminders, name='send_reminders'),
+    path('servicecenter/reports/revenue/', views.revenue_report, name='revenue_report'),
 
     # history & reminders
     path('history/', views.view_history, name='view_history'),
     path('history/record/', views.record_history, name='record_history'),
     path('history/record/<int:booking_id>/', views.record_history, name='record_history_booking'),
+    path('history/export/', views.export_history, name='export_history'),
+    path('invoices/export/', views.export_invoices, name='export_invoices'),
+    path('invoices/<int:pk>/document/', views.invoice_document, name='invoice_document'),
+    path('search/', views.search_records, name='search_records'),
+
+    # read-only JSON API (conditional GET)
+    path('api/bookings/', api.bookings, name='api_bookings'),
+    path('api/bookings/<int:pk>/statuses/', api.booking_statuses, name='api_booking_statuses'),
+    path('api/vehicles/', api.vehicles, name='api_vehicles'),
+    path('api/vehicles/autocomplete/', api.plate_autocomplete, name='api_plate_autocomplete'),
+    path('api/history/', api.history, name='api_history'),
+    path('api/servicecenters/<int:pk>/available-dates/', api.available_dates, name='api_available_dates'),
+    path('api/changes/', api.change_feed, name='api_changes'),
 
 
 
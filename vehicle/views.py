@@ -2,22 +2,36 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.models import User
-from django.http import HttpResponseForbidden
+from django.http import FileResponse, HttpResponseBadRequest, HttpResponseForbidden, JsonResponse
+from django.utils.cache import get_conditional_response
+from django.template.loader import render_to_string
 from django.db import transaction
+from django.db.models import Prefetch
+from datetime import date, timedelta
+from django.views.decorators.http import require_POST
 from functools import wraps
 
 from .models import (
     ServiceCenter, Customer, Vehicle, Staff,
     ServiceBooking, JobAssignment, ServiceStatus,
-    Invoice, ServiceHistory, ReminderOffer
+    Invoice, ServiceHistory, ReminderOffer, ArchivedAssignment, ArchivedBooking, ArchivedHistory, ArchivedInvoice,
+    ArchivedStatus
 )
 from .forms import (
     UserRegisterForm, CustomerForm, ServiceCenterForm,
     VehicleForm, StaffForm, ServiceBookingForm,
     JobAssignmentForm, ServiceStatusForm, InvoiceForm,
-    ServiceHistoryForm, ReminderOfferForm
+    ServiceHistoryForm, ReminderOfferForm, ExportFilterForm,
+    ReminderCampaignForm, BulkStatusForm, full_day_message, open_bookings
 )
+from . import assignment, changes, exports, invoices, reminders, roles, rollups, scheduling, search, transitions
+from .pagination import keyset_paginate
+from .roles import CUSTOMER, SERVICE_CENTER
+from . import counters
+from . import dashboard_cache
+from .dashboard_cache import DashboardFragments
 
 
 # ---------------------------
@@ -26,13 +40,76 @@ from .forms import (
 def require_servicecenter(view_func):
     @wraps(view_func)
     def _wrapped(request, *args, **kwargs):
-        if not hasattr(request.user, 'servicecenter'):
+        if request.role != SERVICE_CENTER:
             messages.error(request, "Access denied.")
             return redirect('login')
         return view_func(request, *args, **kwargs)
     return _wrapped
 
 
+# ---------------------------
+# List querysets: join the related rows the templates render and
+# fetch only the columns they display, so each list is one query.
+# ---------------------------
+# keyset pagination sort keys; the trailing id breaks ties on the date
+BOOKING_KEYS = ('booking_date', 'id')
+VEHICLE_KEYS = ('id',)
+HISTORY_KEYS = ('service_date', 'id')
+
+
+def booking_rows(**filters):
+    return (
+        ServiceBooking.objects.filter(**filters)
+        .select_related('vehicle', 'customer', 'service_center')
+        .only(
+            'id', 'booking_date', 'scheduled_date', 'status',
+            'vehicle__vehicle_number', 'customer__name', 'service_center__name',
+        )
+    )
+
+
+def booking_detail_rows(archived=False, **filters):
+    """
+    Bookings with everything the detail page shows: vehicle, customer,
+    center and invoice joined, statuses and assignments (with staff)
+    prefetched. Three queries however many bookings and however long their
+    timelines; the prefetched rows keep their booking, so their __str__
+    doesn't query either.
+    """
+    if archived:
+        bookings, statuses, assignments = ArchivedBooking, ArchivedStatus, ArchivedAssignment
+    else:
+        bookings, statuses, assignments = ServiceBooking, ServiceStatus, JobAssignment
+    return (
+        bookings.objects.filter(**filters)
+        .select_related('vehicle', 'customer', 'service_center', 'invoice')
+        .prefetch_related(
+            Prefetch('statuses', queryset=statuses.objects.order_by('updated_on', 'id')),
+            Prefetch(
+                'assignments', queryset=assignments.objects.select_related('staff').order_by('assigned_date', 'id'),
+            ),
+        )
+    )
+
+
+def vehicle_rows(**filters):
+    return Vehicle.objects.filter(**filters).only('id', 'vehicle_number', 'model', 'manufacturer')
+
+
+def wants_archive(request):
+    """``?archived=1``: read the archive tables (vehicle.archive) instead of the hot ones."""
+    return request.GET.get("archived") in ("1", "true", "yes")
+
+
+def history_rows(archived=False, **filters):
+    model = ArchivedHistory if archived else ServiceHistory
+    return (
+        model.objects.filter(**filters)
+        .select_related('vehicle')
+        .only('id', 'service_date', 'details', 'cost', 'vehicle__vehicle_number')
+    )
+
+
 # ------------------------------------------------------------
 # 1. AUTHENTICATION VIEWS
 # ------------------------------------------------------------
@@ -108,9 +185,10 @@ def login_view(request):
             login(request, user)
             messages.success(request, f"Welcome, {user.username}!")
 
-            if hasattr(user, "customer"):
+            role, _ = roles.resolve(user)
+            if role == CUSTOMER:
                 return redirect("customer_dashboard")
-            elif hasattr(user, "servicecenter"):
+            elif role == SERVICE_CENTER:
                 return redirect("servicecenter_dashboard")
             else:
                 return redirect("home")
@@ -132,34 +210,64 @@ def logout_view(request):
 # ------------------------------------------------------------
 @login_required
 def customer_dashboard(request):
-    if not hasattr(request.user, "customer"):
+    if request.role != CUSTOMER:
         messages.error(request, "Access denied.")
         return redirect("home")
 
-    customer = request.user.customer
-    bookings = ServiceBooking.objects.filter(customer=customer).order_by('-booking_date')
-    vehicles = Vehicle.objects.filter(customer=customer)
-
-    context = {"customer": customer, "bookings": bookings, "vehicles": vehicles}
+    customer = request.profile
+    fragments = DashboardFragments("customer", customer.id)
+    booking_table = fragments.get(
+        "bookings",
+        lambda: render_to_string("customer_booking_table.html", {
+            "bookings": keyset_paginate(request, booking_rows(customer=customer), BOOKING_KEYS),
+        }),
+        vary_on=request.GET.urlencode(),
+    )
+    vehicle_table = fragments.get(
+        "vehicles",
+        lambda: render_to_string("vehicle_table.html", {"vehicles": vehicle_rows(customer=customer)}),
+    )
+
+    context = {"customer": customer, "booking_table": booking_table, "vehicle_table": vehicle_table}
     return render(request, "customer_dashboard.html", context)
 
 
 @login_required
 @require_servicecenter
 def servicecenter_dashboard(request):
-    service_center = request.user.servicecenter
-    bookings = ServiceBooking.objects.filter(service_center=service_center).order_by('-booking_date')
-    staff = Staff.objects.filter(service_center=service_center)
-    context = {"service_center": service_center, "bookings": bookings, "staff": staff}
+    service_center = request.profile
+    fragments = DashboardFragments("servicecenter", service_center.id)
+    booking_table = fragments.get(
+        "bookings",
+        lambda: render_to_string("servicecenter_booking_table.html", {
+            "bookings": keyset_paginate(request, booking_rows(service_center=service_center), BOOKING_KEYS),
+        }),
+        vary_on=request.GET.urlencode(),
+    )
+    staff_table = fragments.get(
+        "staff",
+        lambda: render_to_string("staff_table.html", {"staff": Staff.objects.filter(service_center=service_center)}),
+    )
+    context = {
+        "service_center": service_center,
+        "booking_table": booking_table,
+        "staff_table": staff_table,
+        "counters": counters.counters_for(service_center),
+    }
     return render(request, "servicecenter_dashboard.html", context)
 
 
+@staff_member_required
+def dashboard_cache_stats(request):
+    return JsonResponse(dashboard_cache.stats())
+
+
 # ------------------------------------------------------------
 # 3. VEHICLE MANAGEMENT (Customer)
 # ------------------------------------------------------------
 @login_required
 def add_vehicle(request):
-    if not hasattr(request.user, 'customer'):
+    if request.role != CUSTOMER:
         messages.error(request, "Only customers can add vehicles.")
         return redirect('home')
 
@@ -167,8 +275,10 @@ def add_vehicle(request):
         form = VehicleForm(request.POST)
         if form.is_valid():
             vehicle = form.save(commit=False)
-            vehicle.customer = request.user.customer
-            vehicle.save()
+            vehicle.customer = request.profile
+            with transaction.atomic():
+                vehicle.save()
+                changes.record(vehicle, changes.CREATED)
             messages.success(request, "Vehicle added successfully.")
             return redirect("view_vehicle")
     else:
@@ -178,11 +288,16 @@ def add_vehicle(request):
 
 @login_required
 def edit_vehicle(request, pk):
-    vehicle = get_object_or_404(Vehicle, pk=pk, customer=request.user.customer)
+    if request.role != CUSTOMER:
+        messages.error(request, "Access denied.")
+        return redirect('home')
+    vehicle = get_object_or_404(Vehicle, pk=pk, customer=request.profile)
     if request.method == "POST":
         form = VehicleForm(request.POST, instance=vehicle)
         if form.is_valid():
-            form.save()
+            with transaction.atomic():
+                form.save()
+                changes.record(vehicle, changes.UPDATED)
             messages.success(request, "Vehicle updated successfully.")
             return redirect("view_vehicle")
     else:
@@ -192,18 +307,28 @@ def edit_vehicle(request, pk):
 
 @login_required
 def delete_vehicle(request, pk):
-    vehicle = get_object_or_404(Vehicle, pk=pk, customer=request.user.customer)
-    vehicle.delete()
+    if request.role != CUSTOMER:
+        messages.error(request, "Access denied.")
+        return redirect('home')
+    vehicle = get_object_or_404(Vehicle, pk=pk, customer=request.profile)
+    with transaction.atomic():
+        counters.bookings_removed(ServiceBooking.objects.filter(vehicle=vehicle))
+        scheduling.bookings_removed(ServiceBooking.objects.filter(vehicle=vehicle))
+        # archived bookings go with the vehicle too, and still count on the dashboard and the slots
+        counters.archived_bookings_removed(ArchivedBooking.objects.filter(vehicle=vehicle))
+        scheduling.bookings_removed(ArchivedBooking.objects.filter(vehicle=vehicle))
+        changes.vehicle_deleted(vehicle)
+        vehicle.delete()
     messages.success(request, "Vehicle deleted successfully.")
     return redirect("view_vehicle")
 
 
 @login_required
 def view_vehicle(request):
-    if not hasattr(request.user, 'customer'):
+    if request.role != CUSTOMER:
         messages.error(request, "Access denied.")
         return redirect('home')
-    vehicles = Vehicle.objects.filter(customer=request.user.customer)
+    vehicles = keyset_paginate(request, vehicle_rows(customer=request.profile), VEHICLE_KEYS, descending=False)
     return render(request, "vehicle_list.html", {"vehicles": vehicles})
 
 
@@ -212,7 +337,7 @@ def view_vehicle(request):
 # ------------------------------------------------------------
 @login_required
 def booking_service(request):
-    if not hasattr(request.user, 'customer'):
+    if request.role != CUSTOMER:
         messages.error(request, "Only customers can book services.")
         return redirect('home')
 
@@ -220,11 +345,21 @@ def booking_service(request):
         form = ServiceBookingForm(request.POST, user=request.user)
         if form.is_valid():
             booking = form.save(commit=False)
-            booking.customer = request.user.customer
+            booking.customer = request.profile
             booking.status = "Pending"
-            booking.save()
-            messages.success(request, "Service booked successfully.")
-            return redirect("view_bookings")
+            try:
+                with transaction.atomic():
+                    counters.ensure_rows([booking.service_center_id])
+                    scheduling.reserve(booking.service_center, booking.scheduled_date)
+                    booking.save()
+                    counters.booking_created(booking)
+                    changes.record(booking, changes.CREATED)
+            except scheduling.SlotUnavailable:
+                # the last slot went to a concurrent booking after the form was validated
+                form.add_error("scheduled_date", full_day_message(booking.service_center, booking.scheduled_date))
+            else:
+                messages.success(request, "Service booked successfully.")
+                return redirect("view_bookings")
     else:
         form = ServiceBookingForm(user=request.user)
     return render(request, "booking_service.html", {"form": form})
@@ -232,15 +367,56 @@ def booking_service(request):
 
 @login_required
 def view_bookings(request):
-    if hasattr(request.user, "customer"):
-        bookings = ServiceBooking.objects.filter(customer=request.user.customer)
-    elif hasattr(request.user, "servicecenter"):
-        bookings = ServiceBooking.objects.filter(service_center=request.user.servicecenter)
+    if request.role == CUSTOMER:
+        bookings = keyset_paginate(request, booking_rows(customer=request.profile), BOOKING_KEYS)
+    elif request.role == SERVICE_CENTER:
+        bookings = keyset_paginate(request, booking_rows(service_center=request.profile), BOOKING_KEYS)
     else:
         bookings = []
     return render(request, "booking_list.html", {"bookings": bookings})
 
 
+MAX_DETAIL_BOOKINGS = 50
+
+
+def _booking_owner_filters(request):
+    if request.role == CUSTOMER:
+        return {"customer": request.profile}
+    if request.role == SERVICE_CENTER:
+        return {"service_center": request.profile}
+    return None
+
+
+@login_required
+def booking_detail(request, pk):
+    owner_filters = _booking_owner_filters(request)
+    if owner_filters is None:
+        messages.error(request, "Access denied.")
+        return redirect("home")
+    archived = wants_archive(request)
+    booking = get_object_or_404(booking_detail_rows(archived, **owner_filters), pk=pk)
+    return render(request, "booking_detail.html", {"bookings": [booking], "archived": archived})
+
+
+@login_required
+def booking_details(request):
+    """The detail of several bookings at once: ``?ids=3,5,8``, in that order; others' bookings are left out."""
+    owner_filters = _booking_owner_filters(request)
+    if owner_filters is None:
+        messages.error(request, "Access denied.")
+        return redirect("home")
+    try:
+        ids = list(dict.fromkeys(int(i) for i in request.GET.get("ids", "").split(",") if i.strip()))
+    except ValueError:
+        return HttpResponseBadRequest("ids must be a comma-separated list of booking ids.")
+    if len(ids) > MAX_DETAIL_BOOKINGS:
+        return HttpResponseBadRequest(f"At most {MAX_DETAIL_BOOKINGS} bookings at a time.")
+    archived = wants_archive(request)
+    found = {b.id: b for b in booking_detail_rows(archived, id__in=ids, **owner_filters)} if ids else {}
+    bookings = [found[i] for i in ids if i in found]
+    return render(request, "booking_detail.html", {"bookings": bookings, "archived": archived})
+
+
 # ------------------------------------------------------------
 # 5. SERVICE CENTER OPERATIONS
 # ------------------------------------------------------------
@@ -251,7 +427,7 @@ def add_staff(request):
         form = StaffForm(request.POST)
         if form.is_valid():
             staff = form.save(commit=False)
-            staff.service_center = request.user.servicecenter
+            staff.service_center = request.profile
             staff.save()
             messages.success(request, "Staff added successfully.")
             return redirect("servicecenter_dashboard")
@@ -263,15 +439,19 @@ def add_staff(request):
 @login_required
 @require_servicecenter
 def assign_job(request, booking_id):
-    booking = get_object_or_404(ServiceBooking, id=booking_id)
-    if booking.service_center != request.user.servicecenter:
+    booking = get_object_or_404(ServiceBooking.objects.select_related('vehicle'), id=booking_id)
+    if booking.service_center_id != request.profile.id:
         return HttpResponseForbidden("Not your booking.")
     if request.method == "POST":
         form = JobAssignmentForm(request.POST, booking=booking)
         if form.is_valid():
             job = form.save(commit=False)
             job.booking = booking
-            job.save()
+            with transaction.atomic():
+                counters.ensure_rows([booking.service_center_id])
+                job.save()
+                counters.assignment_created(booking)
+                changes.record(job, changes.CREATED)
             messages.success(request, "Job assigned successfully.")
             return redirect("view_bookings")
     else:
@@ -279,20 +459,56 @@ def assign_job(request, booking_id):
     return render(request, "assign_job.html", {"form": form, "booking": booking})
 
 
+@require_POST
+@login_required
+@require_servicecenter
+def auto_assign(request, booking_id=None):
+    """Assign one booking, or every unassigned pending booking, to the least-loaded staff."""
+    service_center = request.profile
+    jobs = assignment.auto_assign(service_center, None if booking_id is None else [booking_id])
+    if jobs:
+        messages.success(request, f"{len(jobs)} job(s) assigned.")
+    elif not service_center.staff.exists():
+        messages.error(request, "Add staff before assigning jobs.")
+    else:
+        messages.info(request, "No unassigned pending bookings.")
+    return redirect("servicecenter_dashboard" if booking_id is None else "view_bookings")
+
+
+def locked_status(booking):
+    """
+    ``booking``'s committed status, with its row locked until the current
+    transaction ends: concurrent changes to one booking then apply their
+    counter and slot deltas one after the other, each from the status the
+    previous one left (no deltas when the status doesn't change). SQLite
+    has no row locks; there the transaction already holds the database
+    write lock (transaction_mode IMMEDIATE in settings.DATABASES).
+    """
+    return ServiceBooking.objects.select_for_update().values_list('status', flat=True).get(pk=booking.pk)
+
+
 @login_required
 @require_servicecenter
 def update_booking_status(request, pk):
-    booking = get_object_or_404(ServiceBooking, id=pk)
-    if booking.service_center != request.user.servicecenter:
+    booking = get_object_or_404(ServiceBooking.objects.select_related('vehicle'), id=pk)
+    if booking.service_center_id != request.profile.id:
         return HttpResponseForbidden("Not your booking.")
     if request.method == "POST":
         form = ServiceStatusForm(request.POST)
         if form.is_valid():
             status_obj = form.save(commit=False)
             status_obj.booking = booking
-            status_obj.save()
-            booking.status = status_obj.current_status
-            booking.save()
+            with transaction.atomic():
+                old_status = locked_status(booking)
+                counters.ensure_rows([booking.service_center_id])
+                status_obj.save()
+                booking.status = status_obj.current_status
+                booking.save(update_fields=["status", "updated_at"])
+                counters.booking_status_changed(booking, old_status)
+                scheduling.booking_status_changed(booking, old_status)
+                changes.write(
+                    changes.entries([status_obj], changes.CREATED) + changes.entries([booking], changes.UPDATED)
+                )
             messages.success(request, "Service status updated successfully.")
             return redirect("view_bookings")
     else:
@@ -300,26 +516,80 @@ def update_booking_status(request, pk):
     return render(request, "update_status.html", {"form": form, "booking": booking})
 
 
+@login_required
+@require_servicecenter
+def bulk_update_status(request):
+    service_center = request.profile
+    if request.method == "POST":
+        form = BulkStatusForm(request.POST, service_center=service_center)
+        if form.is_valid():
+            changed = transitions.bulk_transition(
+                service_center, form.cleaned_data["bookings"],
+                form.cleaned_data["status"], form.cleaned_data["remarks"],
+            )
+            messages.success(request, f"{changed} booking(s) updated.")
+            return redirect("view_bookings")
+    else:
+        form = BulkStatusForm(service_center=service_center)
+    bookings = keyset_paginate(request, open_bookings(service_center), BOOKING_KEYS)
+    form.show_page(bookings)
+    return render(request, "bulk_status.html", {"form": form, "bookings": bookings})
+
+
+@login_required
+@require_servicecenter
+def send_reminders(request):
+    if request.method == "POST":
+        form = ReminderCampaignForm(request.POST)
+        if form.is_valid():
+            service_center = request.profile
+            customer_ids = reminders.segment_customer_ids(service_center, form.cleaned_data["months"])
+            queued = reminders.queue_campaign(
+                service_center, form.cleaned_data["title"], form.cleaned_data["message"],
+                customer_ids.iterator(),
+            )
+            messages.success(request, f"{queued} reminder(s) queued for delivery.")
+            return redirect("servicecenter_dashboard")
+    else:
+        form = ReminderCampaignForm()
+    return render(request, "reminder_offer.html", {"form": form})
+
+
 # ------------------------------------------------------------
 # 6. INVOICE AND HISTORY
 # ------------------------------------------------------------
 @login_required
 @require_servicecenter
 def generate_invoice(request, booking_id):
-    booking = get_object_or_404(ServiceBooking, id=booking_id)
-    if booking.service_center != request.user.servicecenter:
+    booking = get_object_or_404(ServiceBooking.objects.select_related('vehicle'), id=booking_id)
+    if booking.service_center_id != request.profile.id:
         return HttpResponseForbidden("Not your booking.")
 
     if request.method == "POST":
         form = InvoiceForm(request.POST)
         if form.is_valid():
             with transaction.atomic():
+                # before the invoice is saved: a counter row built after it would count it, then get its delta too
+                counters.ensure_rows([booking.service_center_id])
                 invoice = form.save(commit=False)
                 invoice.booking = booking
-                invoice.service_center = request.user.servicecenter
+                invoice.service_center = request.profile
                 invoice.save()
+                old_status = locked_status(booking)
+                created = [invoice]
+                if old_status != 'Completed':
+                    # the timeline, and the completion rollups, read the Completed status row
+                    created.append(ServiceStatus.objects.create(
+                        booking=booking, current_status='Completed', remarks="Invoice generated.",
+                    ))
                 booking.status = 'Completed'
-                booking.save()
+                booking.save(update_fields=["status", "updated_at"])
+                counters.booking_status_changed(booking, old_status)
+                scheduling.booking_status_changed(booking, old_status)
+                counters.invoice_created(invoice)
+                changes.write(
+                    changes.entries(created, changes.CREATED) + changes.entries([booking], changes.UPDATED)
+                )
             messages.success(request, "Invoice generated successfully.")
             return redirect("view_bookings")
     else:
@@ -329,9 +599,10 @@ def generate_invoice(request, booking_id):
 
 @login_required
 def view_history(request):
-    if hasattr(request.user, "customer"):
-        histories = ServiceHistory.objects.filter(customer=request.user.customer).order_by('-service_date')
-        return render(request, "history_list.html", {"histories": histories})
+    if request.role == CUSTOMER:
+        archived = wants_archive(request)
+        histories = keyset_paginate(request, history_rows(archived, customer=request.profile), HISTORY_KEYS)
+        return render(request, "history_list.html", {"histories": histories, "archived": archived})
     else:
         messages.error(request, "Access denied.")
         return redirect("home")
@@ -343,25 +614,138 @@ def record_history(request, booking_id=None):
     Record service history after completion.
     booking_id optional — if present, ensure the booking belongs to the user or service center.
     """
+    owner = {}
+    if request.role == CUSTOMER:
+        owner = {"customer": request.profile}
+    elif request.role == SERVICE_CENTER:
+        owner = {"service_center": request.profile}
     if request.method == "POST":
-        form = ServiceHistoryForm(request.POST)
+        # the form only offers the owner's vehicles and bookings, so another owner's booking is an invalid choice
+        form = ServiceHistoryForm(request.POST, **owner)
         if form.is_valid():
             history = form.save(commit=False)
-            # assign customer/service_center based on current user or booking
-            if hasattr(request.user, 'customer'):
-                history.customer = request.user.customer
-                # if booking provided ensure it matches
-                if history.booking and history.booking.customer != request.user.customer:
-                    messages.error(request, "Booking mismatch.")
-                    return redirect("view_history")
-            elif hasattr(request.user, 'servicecenter'):
-                history.service_center = request.user.servicecenter
-                if history.booking and history.booking.service_center != request.user.servicecenter:
-                    messages.error(request, "Booking mismatch.")
-                    return redirect("servicecenter_dashboard")
-            history.save()
+            if request.role == CUSTOMER:
+                history.customer = request.profile
+            elif request.role == SERVICE_CENTER:
+                history.customer_id = history.booking.customer_id
+                history.service_center = request.profile
+            with transaction.atomic():
+                history.save()
+                changes.record(history, changes.CREATED)
             messages.success(request, "Service history recorded successfully.")
             return redirect("view_history")
     else:
-        form = ServiceHistoryForm()
+        form = ServiceHistoryForm(**owner)
     return render(request, "record_history.html", {"form": form})
+
+
+@login_required
+def search_records(request):
+    if request.role == CUSTOMER:
+        owner = search.owner_token(customer=request.profile)
+    elif request.role == SERVICE_CENTER:
+        owner = search.owner_token(service_center=request.profile)
+    else:
+        messages.error(request, "Access denied.")
+        return redirect("home")
+    query = request.GET.get("q", "").strip()
+    results = search.search(owner, query) if query else []
+    return render(request, "search_results.html", {"query": query, "results": results})
+
+
+# ------------------------------------------------------------
+# 7. EXPORTS (streamed CSV / NDJSON)
+# ------------------------------------------------------------
+def _export(request, filename, columns, build_rows, owner_filters):
+    if owner_filters is None:
+        messages.error(request, "Access denied.")
+        return redirect("home")
+    form = ExportFilterForm(request.GET)
+    if not form.is_valid():
+        return HttpResponseBadRequest(form.errors.as_text())
+    data = form.cleaned_data
+    rows = build_rows(owner_filters, data['date_from'], data['date_to'], data['vehicle'], data['archived'])
+    return exports.stream_export(filename, columns, rows, data['format'])
+
+
+@login_required
+def export_history(request):
+    if request.role == CUSTOMER:
+        owner_filters = {"customer": request.profile}
+    elif request.role == SERVICE_CENTER:
+        owner_filters = {"service_center": request.profile}
+    else:
+        owner_filters = None
+    return _export(request, "service-history", exports.HISTORY_COLUMNS, exports.history_export_rows, owner_filters)
+
+
+@login_required
+def export_invoices(request):
+    if request.role == CUSTOMER:
+        owner_filters = {"booking__customer": request.profile}
+    elif request.role == SERVICE_CENTER:
+        owner_filters = {"service_center": request.profile}
+    else:
+        owner_filters = None
+    return _export(request, "invoices", exports.INVOICE_COLUMNS, exports.invoice_export_rows, owner_filters)
+
+
+@login_required
+def invoice_document(request, pk):
+    """
+    The printable invoice (?format=html or pdf), served from the document
+    cache (vehicle.invoices). Archived invoices keep their ids, so one not
+    in the hot table is looked up in the archive.
+    """
+    fmt = request.GET.get("format") or "html"
+    if fmt not in invoices.FORMATS:
+        return HttpResponseBadRequest("Unknown format.")
+    invoice = invoices.document_rows(Invoice.objects.filter(pk=pk)).first()
+    if invoice is None:
+        invoice = get_object_or_404(invoices.document_rows(ArchivedInvoice.objects.all()), pk=pk)
+    if not (
+        request.role == SERVICE_CENTER and invoice.service_center_id == request.profile.id
+        or request.role == CUSTOMER and invoice.booking.customer_id == request.profile.id
+    ):
+        return HttpResponseForbidden("Not your invoice.")
+
+    data = invoices.document_data(invoice)
+    # the cache key is a hash of everything on the document, so it makes a strong ETag
+    etag = f'"{invoices.document_key(data, fmt)}"'
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        _, document, _ = invoices.cached_document(data, fmt)
+        response = FileResponse(document, content_type=invoices.FORMATS[fmt], filename=invoices.filename(data, fmt))
+    response["ETag"] = etag
+    response["Cache-Control"] = "private"
+    return response
+
+
+# ------------------------------------------------------------
+# 8. REPORTS (read from the daily rollups only)
+# ------------------------------------------------------------
+REPORT_SPANS = (30, 90, 365)
+
+
+@login_required
+@require_servicecenter
+def revenue_report(request):
+    try:
+        span = int(request.GET.get("days", 365))
+    except ValueError:
+        span = 365
+    if span not in REPORT_SPANS:
+        span = 365
+    end = date.today()
+    start = end - timedelta(days=span - 1)
+    days, totals = rollups.report(request.profile, start, end)
+    # one bar per day on a 0-100 scale, placed by its offset from the start of the span
+    peak = max((d.revenue for d in days), default=0) or 1
+    bars = [
+        {"x": (d.date - start).days, "height": round(float(d.revenue / peak) * 100, 2), "day": d}
+        for d in days
+    ]
+    context = {"days": days, "totals": totals, "bars": bars, "span": span, "spans": REPORT_SPANS,
+               "start": start, "end": end}
+    return render(request, "revenue_report.html", context)
+
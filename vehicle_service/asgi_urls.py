@@ -0,0 +1,11 @@
+"""
+URL configuration used for requests served through ASGI (see ASGI_URLCONF).
+Same routes as vehicle_service.urls, with the vehicle app's async views.
+"""
+from django.contrib import admin
+from django.urls import path,include
+
+urlpatterns = [
+    path('admin/', admin.site.urls),
+    path("",include("vehicle.async_urls"))
+]
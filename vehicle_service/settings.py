@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import sys
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -41,20 +42,27 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'vehicle.middleware.server_timing',
     'django.middleware.security.SecurityMiddleware',
+    'vehicle.middleware.replica_routing',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'vehicle.middleware.user_role',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'vehicle.middleware.asgi_urlconf',
 ]
 
 ROOT_URLCONF = 'vehicle_service.urls'
 
+# Requests served through ASGI use the async versions of the read-heavy views.
+ASGI_URLCONF = 'vehicle_service.asgi_urls'
+
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'vehicle.timing.TimedDjangoTemplates',
         'DIRS': [],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -77,9 +85,57 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
-    }
+        # SQLite ignores select_for_update, so transactions take the write
+        # lock when they begin (BEGIN IMMEDIATE): the status checks in
+        # vehicle.views.locked_status, vehicle.transitions and vehicle.archive
+        # then read rows no other writer can change before they commit. Other
+        # writers wait up to 'timeout' seconds for the lock.
+        'OPTIONS': {'transaction_mode': 'IMMEDIATE', 'timeout': 20},
+    },
+    # Read replica for GET/HEAD requests (see vehicle.db_router). Locally it
+    # is a second connection to the same file; in production point it at
+    # the replica. Tests mirror it onto the default test database.
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db.sqlite3',
+        'TEST': {'MIRROR': 'default'},
+    },
 }
 
+DATABASE_ROUTERS = ['vehicle.db_router.PrimaryReplicaRouter']
+REPLICA_DATABASE = 'replica'
+# after a write, the client reads from the primary for this long; signed-in
+# users are pinned in this cache alias, which must be shared by every web
+# worker in production (see CACHES)
+STICKY_PRIMARY_SECONDS = 10
+STICKY_PRIMARY_CACHE_ALIAS = 'sticky'
+
+# Request instrumentation (vehicle.timing): a JSON line on the
+# vehicle.slow_requests logger for requests taking longer than this many
+# milliseconds (None turns the log off). Set SERVER_TIMING_HEADER to add a
+# Server-Timing header to every response; unset, it follows DEBUG, since the
+# header exposes query counts and timings to any client.
+SLOW_REQUEST_MS = 500
+# the test suite's requests are not the ones to watch, and its output stays clean
+if sys.argv[1:2] == ['test']:
+    SLOW_REQUEST_MS = None
+
+# manage.py archive_bookings moves bookings closed longer ago than this many
+# days into the archive tables (vehicle.archive)
+ARCHIVE_AFTER_DAYS = 365
+
+# Rendered invoice documents, content-addressed (vehicle.invoices); safe to
+# delete at any time
+INVOICE_DOCUMENT_DIR = BASE_DIR / 'invoice_documents'
+
+
+# The session user is loaded with its customer / service center profile
+# (vehicle.roles). ModelBackend stays listed so sessions created before the
+# switch remain valid.
+AUTHENTICATION_BACKENDS = [
+    'vehicle.roles.ProfileBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -123,3 +179,58 @@ STATIC_URL = 'static/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 
+
+# Logging
+# https://docs.djangoproject.com/en/5.2/topics/logging/
+# Slow requests (vehicle.timing) go to stderr, one timestamped JSON line each,
+# for the process manager or log shipper to collect.
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'slow_requests': {'format': '{asctime} {message}', 'style': '{'},
+    },
+    'handlers': {
+        'slow_requests': {'class': 'logging.StreamHandler', 'formatter': 'slow_requests'},
+    },
+    'loggers': {
+        'vehicle.slow_requests': {'handlers': ['slow_requests'], 'level': 'WARNING', 'propagate': False},
+    },
+}
+
+# Email
+# https://docs.djangoproject.com/en/5.2/topics/email/
+# Reminders go through SMTP; for local development point this at a debugging
+# server, e.g. `python -m aiosmtpd -n -l localhost:1025`.
+
+EMAIL_HOST = 'localhost'
+EMAIL_PORT = 1025
+DEFAULT_FROM_EMAIL = 'no-reply@servicecenter.local'
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Rendered dashboard fragments live in their own alias so the backend can be
+# swapped (e.g. for Redis) without touching anything else. The sticky-primary
+# pins (vehicle.db_router) are only correct when every worker process sees
+# the same cache: LocMemCache is fine for runserver, production must point
+# 'sticky' at Redis, Memcached or the database cache.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'dashboards': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'dashboards',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+    'sticky': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'sticky',
+    },
+}
+
+DASHBOARD_CACHE_ALIAS = 'dashboards'
+DASHBOARD_CACHE_TIMEOUT = 300